@@ -1,5 +1,6 @@
 from __future__ import annotations
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Generator, Iterable, Iterator
 from tokenizer import Token, Tokenizer, TokenType
 
 
@@ -41,6 +42,8 @@ class Statement(TreeNode):
 @dataclass
 class ExprStatement(Statement):
     expr: Expr
+    lineno: int = field(default=0, compare=False)
+    """Source line the statement starts on, 0 if unknown."""
 
 
 class Parser:
@@ -48,7 +51,7 @@ class Parser:
     program := statement* EOF
 
     statement := expr_statement
-    expr_statement := computation NEWLINE
+    expr_statement := computation ( NEWLINE | EOF )
 
     computation := term ( (PLUS | MINUS) term )*
     term := unary ( (MUL | DIV | MOD) unary )*
@@ -57,8 +60,14 @@ class Parser:
     atom := LPAREN computation RPAREN | number
     number := INT | FLOAT
     """
-    def __init__(self, tokens: list[Token]) -> None:
-        self.tokens = tokens
+    def __init__(self, tokens: list[Token] | Iterable[Token]) -> None:
+        self.token_source: Iterator[Token] | None = None
+        """Where tokens are pulled from, one statement at a time, if the parser wasn't given a list."""
+        if isinstance(tokens, list):
+            self.tokens = tokens
+        else:
+            self.token_source = iter(tokens)
+            self.tokens = []
         self.next_token_index: int = 0
         """Points to the next token to be consumed."""
 
@@ -76,13 +85,20 @@ class Parser:
     
     def peek(self, skip: int = 0) -> TokenType | None:
         """Checks the type of an upcoming token without consuming it."""
-        peek_at = self.next_token_index + skip
-        return self.tokens[peek_at].type if peek_at < len(self.tokens) else None
+        try:
+            return self.tokens[self.next_token_index + skip].type
+        except IndexError:
+            return None
     
     def parse_expr_statement(self) -> ExprStatement:
-        """Parses a standalone expression."""
-        expr = ExprStatement(self.parse_computation())
-        self.eat(TokenType.NEWLINE)
+        """Parses a standalone expression.
+
+        The last statement of a program may be terminated by EOF instead of NEWLINE.
+        """
+        lineno = self.tokens[self.next_token_index].line
+        expr = ExprStatement(self.parse_computation(), lineno)
+        if self.peek() != TokenType.EOF:
+            self.eat(TokenType.NEWLINE)
         return expr
 
     def parse_statement(self) -> Statement:
@@ -91,11 +107,31 @@ class Parser:
     
     def parse(self) -> Program:
         """Parses the program."""
-        program = Program([])
-        while self.peek() != TokenType.EOF:
-            program.statements.append(self.parse_statement())
+        return Program(list(self.parse_statements()))
+
+    def parse_statements(self) -> Generator[Statement, None, None]:
+        """Parses the program one statement at a time.
+
+        If the parser was given an iterator of tokens (like a `Tokenizer`),
+        it only holds the tokens of the statement being parsed.
+        """
+        while True:
+            if self.token_source is not None and self.next_token_index == len(self.tokens):
+                self.pull_statement()
+            if self.peek() == TokenType.EOF:
+                break
+            yield self.parse_statement()
         self.eat(TokenType.EOF)
-        return program 
+
+    def pull_statement(self) -> None:
+        """Replaces the tokens with the next statement's, up to its NEWLINE (or EOF)."""
+        self.tokens = []
+        self.next_token_index = 0
+        for token in self.token_source:  # type: ignore[union-attr]
+            self.tokens.append(token)
+            # Statements don't span lines. Compares with `is`, because hashing enum members is slow.
+            if token.type is TokenType.NEWLINE or token.type is TokenType.EOF:
+                break
     
     def parse_number(self) -> Int | Float:
         """Parses an integer or a float.
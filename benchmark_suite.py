@@ -0,0 +1,198 @@
+"""A benchmark suite that times each stage of the pipeline on synthetic workloads.
+
+Every workload is generated from a seed, so runs are comparable. Results
+can be saved as JSON and compared against a saved baseline, to catch
+regressions:
+
+    python benchmark_suite.py --output baseline.json
+    python benchmark_suite.py --baseline baseline.json
+
+`--scale` multiplies the size of every workload; `--scale 10` gives the
+short statements workload a million statements.
+"""
+import json
+import platform
+import random
+import time
+from typing import Any, Callable
+
+from tokenizer import Tokenizer
+from Parser import Parser
+from compiler import Compiler
+from interpreter import Interpreter
+from benchmarks import generate_program
+from streaming import STAGES
+
+
+def generate_long_lines(rng: random.Random, lines: int, terms: int = 400) -> str:
+    """Lines that each hold a flat sum of hundreds of small products.
+
+    The compiler recurses once per operator of a flat sum, so much longer lines hit the recursion limit.
+    """
+    def term() -> str:
+        return f"{rng.randint(1, 99)} * {rng.randint(1, 99)}" if rng.random() < 0.3 else str(rng.randint(1, 999))
+
+    return "".join(
+        term() + "".join(f" {rng.choice('+-')} {term()}" for _ in range(terms - 1)) + "\n"
+        for _ in range(lines)
+    )
+
+
+def generate_deep_nesting(rng: random.Random, statements: int, depth: int = 60) -> str:
+    """Statements whose expressions nest parentheses `depth` levels deep."""
+    lines = []
+    for _ in range(statements):
+        expression = str(rng.randint(1, 9))
+        for _ in range(depth):
+            expression = f"({rng.randint(1, 9)} {rng.choice('+-*')} {expression})"
+        lines.append(f"-{expression} % 1000003\n")
+    return "".join(lines)
+
+
+def generate_short_statements(rng: random.Random, statements: int) -> str:
+    """Many tiny statements, like `12 + 7`."""
+    return "".join(f"{rng.randint(0, 99)} {rng.choice('+-*')} {rng.randint(0, 99)}\n" for _ in range(statements))
+
+
+def generate_big_ints(rng: random.Random, statements: int) -> str:
+    """Statements that compute ints with thousands of bits."""
+    return "".join(
+        f"{rng.randint(2, 99)} ** {rng.randint(200, 800)} * {rng.randint(2, 99)} ** {rng.randint(200, 800)} "
+        f"- {rng.randint(2, 99)} ** {rng.randint(100, 400)} % {rng.randint(2, 10**9)}\n"
+        for _ in range(statements)
+    )
+
+
+def generate_floats(rng: random.Random, statements: int) -> str:
+    """Random float expressions, without `**`."""
+    return generate_program(statements, seed=rng.randrange(1 << 32), floats=True)
+
+
+WORKLOADS: dict[str, tuple[Callable[[random.Random, int], str], int]] = {
+    "long_lines": (generate_long_lines, 100),
+    "deep_nesting": (generate_deep_nesting, 1_000),
+    "short_statements": (generate_short_statements, 100_000),
+    "big_ints": (generate_big_ints, 5_000),
+    "floats": (generate_floats, 20_000),
+}
+"""The generator of each workload, and its size at scale 1."""
+
+
+def generate_workload(name: str, scale: float = 1.0, seed: int = 0) -> str:
+    generate, size = WORKLOADS[name]
+    return generate(random.Random(seed), max(1, round(size * scale)))
+
+
+def time_stages(code: str, repeat: int = 3) -> dict[str, Any]:
+    """Returns the best time seen for each stage of the pipeline on `code`, and the size of its output."""
+    best = dict.fromkeys(STAGES, float("inf"))
+    for _ in range(repeat):
+        start = time.perf_counter()
+        tokens = list(Tokenizer(code))
+        tokenized = time.perf_counter()
+        tree = Parser(tokens).parse()
+        parsed = time.perf_counter()
+        bytecode = list(Compiler(tree).compile())
+        compiled = time.perf_counter()
+        Interpreter(bytecode).interpret()
+        interpreted = time.perf_counter()
+        for stage, elapsed in zip(
+            STAGES,
+            [tokenized - start, parsed - tokenized, compiled - parsed, interpreted - compiled],
+        ):
+            best[stage] = min(best[stage], elapsed)
+    return best | {
+        "bytes": len(code),
+        "statements": len(tree.statements),
+        "tokens": len(tokens),
+        "instructions": len(bytecode),
+    }
+
+
+def measure_memory(code: str) -> dict[str, dict[str, int]]:
+    """Returns the peak and retained memory of each stage on `code`."""
+    from memory import measure_pipeline
+
+    return {
+        stage: {"peak_bytes": measured["peak_bytes"], "retained_bytes": measured["retained_bytes"]}
+        for stage, measured in measure_pipeline(code, top=0)["stages"].items()
+    }
+
+
+def run_suite(
+    scale: float = 1.0,
+    seed: int = 0,
+    repeat: int = 3,
+    workloads: list[str] | None = None,
+    memory: bool = False,
+) -> dict[str, Any]:
+    """Times every workload, and with `memory`, measures its memory use too (in a separate, slower run)."""
+    results = {}
+    for name in workloads or WORKLOADS:
+        code = generate_workload(name, scale, seed)
+        results[name] = time_stages(code, repeat)
+        if memory:
+            results[name]["memory"] = measure_memory(code)
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "scale": scale,
+        "seed": seed,
+        "workloads": results,
+    }
+
+
+def compare(results: dict[str, Any], baseline: dict[str, Any], tolerance: float = 0.1) -> list[str]:
+    """Lists the stages that got more than `tolerance` slower, or use that much more memory, than in `baseline`."""
+    regressions = []
+    for name, stages in results["workloads"].items():
+        if (baseline_stages := baseline["workloads"].get(name)) is None:
+            continue
+        for stage in STAGES:
+            before, after = baseline_stages[stage], stages[stage]
+            if after > before * (1 + tolerance):
+                regressions.append(f"{name} {stage}: {before:.4f}s -> {after:.4f}s ({after / before - 1:+.0%})")
+        if "memory" in stages and "memory" in baseline_stages:
+            for stage, measured in stages["memory"].items():
+                for key, after in measured.items():
+                    before = baseline_stages["memory"][stage][key]
+                    if after > max(before, 1) * (1 + tolerance):
+                        regressions.append(f"{name} {stage} {key}: {before:,} -> {after:,}")
+    return regressions
+
+
+def format_results(results: dict[str, Any]) -> str:
+    lines = [f"{'workload':<18}" + "".join(f"{stage:>11}" for stage in STAGES) + f"{'instructions':>14}"]
+    for name, stages in results["workloads"].items():
+        lines.append(
+            f"{name:<18}" + "".join(f"{stages[stage]:>10.3f}s" for stage in STAGES) + f"{stages['instructions']:>14,}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Times each stage of the pipeline on synthetic workloads.")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies the size of every workload")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per workload; the best time is kept")
+    parser.add_argument("--workload", action="append", choices=list(WORKLOADS), help="run only these workloads")
+    parser.add_argument("--memory", action="store_true", help="also measure the memory of each stage")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against the results in this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="slowdown allowed before flagging a regression")
+    args = parser.parse_args()
+
+    results = run_suite(args.scale, args.seed, args.repeat, args.workload, args.memory)
+    print(format_results(results))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,159 @@
+"""Throughput benchmarks for the interpreter.
+
+Run with `python benchmarks.py [number_of_statements]`. Run it with a
+free-threaded build of CPython (e.g. `python3.13t`) to see thread pools scale.
+"""
+import random
+import sys
+import time
+
+from tokenizer import Tokenizer
+from Parser import Parser
+from compiler import Bytecode, Compiler
+from interpreter import FloatInterpreter, Interpreter, PreallocatedInterpreter
+from pool import InterpreterPool
+
+BENCHMARK_OPERATORS = ["+", "-", "*", "%", "/", "**"]
+FLOAT_BENCHMARK_OPERATORS = ["+", "-", "*", "%", "/"]
+
+
+def generate_literal(rng: random.Random, floats: bool) -> str:
+    return f"{rng.uniform(1, 99):.3f}" if floats else str(rng.randint(1, 99))
+
+
+def generate_expression(rng: random.Random, depth: int, floats: bool = False) -> str:
+    """Generates a random expression that can't raise when evaluated.
+
+    With `floats`, all literals are floats and `**` isn't used, so the
+    expression can run in a `FloatInterpreter`.
+    """
+    if depth == 0 or rng.random() < 0.3:
+        return generate_literal(rng, floats)
+    op = rng.choice(FLOAT_BENCHMARK_OPERATORS if floats else BENCHMARK_OPERATORS)
+    left = generate_expression(rng, depth - 1, floats)
+    if op == "**":
+        return f"({left}) ** {rng.randint(0, 3)}"
+    if op in {"/", "%"}:
+        return f"({left}) {op} {generate_literal(rng, floats)}"
+    right = generate_expression(rng, depth - 1, floats)
+    return f"({left}) {op} ({right})"
+
+
+def generate_program(statements: int, depth: int = 4, seed: int = 0, floats: bool = False) -> str:
+    """Generates a program with one random expression per line."""
+    rng = random.Random(seed)
+    return "\n".join(generate_expression(rng, depth, floats) for _ in range(statements)) + "\n"
+
+
+def generate_shaped_program(statements: int, template: str = "{} * {} + {} ** 2", seed: int = 0) -> str:
+    """Generates a program whose statements all share a shape, only the literals change."""
+    rng = random.Random(seed)
+    fields = template.count("{}")
+    lines = (template.format(*(rng.randint(1, 999) for _ in range(fields))) for _ in range(statements))
+    return "\n".join(lines) + "\n"
+
+
+def compile_program(code: str) -> list[Bytecode]:
+    return list(Compiler(Parser(list(Tokenizer(code))).parse()).compile())
+
+
+def time_interpreter(
+    bytecode: list[Bytecode],
+    interpreter_class: type[Interpreter] = Interpreter,
+    repeat: int = 5,
+) -> tuple[float, float]:
+    """Returns the best times seen to load `bytecode` into an interpreter and to run it."""
+    best_load = best_run = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        interpreter = interpreter_class(bytecode)
+        loaded = time.perf_counter()
+        interpreter.interpret()
+        best_load = min(best_load, loaded - start)
+        best_run = min(best_run, time.perf_counter() - loaded)
+    return best_load, best_run
+
+
+def time_requests(programs: list[list[Bytecode]], pool: InterpreterPool | None = None, repeat: int = 5) -> float:
+    """Returns the best time seen to run each program once, in a new interpreter or one from `pool`."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        if pool is None:
+            for bytecode in programs:
+                Interpreter(bytecode).interpret()
+        else:
+            for bytecode in programs:
+                pool.run(bytecode)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def time_thread_scaling(programs: list[str], thread_counts: list[int]) -> dict[int, float]:
+    """Returns the time `evaluate_programs_in_threads` takes to evaluate `programs`, by number of threads."""
+    from parallel import evaluate_programs_in_threads
+
+    times = {}
+    for threads in thread_counts:
+        start = time.perf_counter()
+        evaluate_programs_in_threads(programs, threads)
+        times[threads] = time.perf_counter() - start
+    return times
+
+
+def gil_enabled() -> bool:
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_gil_enabled is None or is_gil_enabled()
+
+
+if __name__ == "__main__":
+    statements = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    workloads = {
+        "mixed": (compile_program(generate_program(statements)), [Interpreter, PreallocatedInterpreter]),
+        "floats": (
+            compile_program(generate_program(statements, floats=True)),
+            [Interpreter, PreallocatedInterpreter, FloatInterpreter],
+        ),
+    }
+    shaped = compile_program(generate_shaped_program(statements))
+    workloads["shaped"] = (shaped, [Interpreter])
+    for workload, (bytecode, interpreter_classes) in workloads.items():
+        for interpreter_class in interpreter_classes:
+            load, run = time_interpreter(bytecode, interpreter_class)
+            print(
+                f"{workload:>6} {interpreter_class.__name__:>24}: {len(bytecode)} instructions, "
+                f"load {load:.3f}s, run {run:.3f}s, {len(bytecode) / run:,.0f} instructions/s "
+                f"({len(bytecode) / (load + run):,.0f} including load)",
+                file=sys.stderr,
+            )
+
+    requests = [compile_program(generate_program(3, seed=seed)) for seed in range(10_000)]
+    for label, pool in [("new interpreter", None), ("pooled", InterpreterPool())]:
+        elapsed = time_requests(requests, pool)
+        print(
+            f"requests {label:>22}: {1e6 * elapsed / len(requests):.2f}us per 3-statement request",
+            file=sys.stderr,
+        )
+
+    programs = [generate_program(100, seed=seed) for seed in range(128)]
+    times = time_thread_scaling(programs, [1, 2, 4, 8])
+    for threads, elapsed in times.items():
+        print(
+            f"threads {threads:>23}: {len(programs) / elapsed:,.0f} programs/s, "
+            f"{times[1] / elapsed:.2f}x one thread (GIL {'enabled' if gil_enabled() else 'disabled'})",
+            file=sys.stderr,
+        )
+
+    try:
+        from vectorized import evaluate_program
+    except ImportError:
+        print("NumPy isn't installed, skipping the vectorized benchmark.", file=sys.stderr)
+    else:
+        start = time.perf_counter()
+        evaluate_program(shaped)
+        elapsed = time.perf_counter() - start
+        print(
+            f"shaped {'evaluate_program':>24}: {len(shaped)} instructions, "
+            f"{elapsed:.3f}s, {len(shaped) / elapsed:,.0f} instructions/s",
+            file=sys.stderr,
+        )
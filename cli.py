@@ -0,0 +1,175 @@
+"""Evaluates programs from files or stdin and writes the value of each statement.
+
+    python cli.py program.txt other.txt -o values.txt --stats
+    generate_programs | python cli.py --format binary -o values.bin
+
+Input is read and evaluated one statement at a time and output is written
+in batches, so files of any size run in bounded memory. `--backend` picks
+the interpreter; `--workers` evaluates files in a process pool instead,
+split in byte ranges. `--vectorized` evaluates whole files with NumPy, and
+doesn't stream; neither does `--workers` on stdin.
+"""
+import argparse
+import sys
+import time
+from typing import Any
+
+from interpreter import FloatInterpreter, Interpreter, Limits, PreallocatedInterpreter, Sink
+from memo import ResultCache
+from metrics import PipelineMetrics, write_metrics
+from sinks import BinarySink, CSVSink, TextSink
+from specializing import SpecializingInterpreter
+from streaming import STAGES, PipelineStats, evaluate_lines
+from verifier import VerifiedInterpreter
+
+BACKENDS: dict[str, type[Interpreter]] = {
+    "interpreter": Interpreter,
+    "preallocated": PreallocatedInterpreter,
+    "float": FloatInterpreter,
+    "verified": VerifiedInterpreter,
+    "specializing": SpecializingInterpreter,
+}
+
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+
+def open_output(output_format: str, path: str | None) -> Any:
+    """Opens the file to write values to, or returns stdout (which the caller mustn't close)."""
+    if output_format == "binary":
+        return open(path, "wb", buffering=OUTPUT_BUFFER_SIZE) if path else sys.stdout.buffer
+    return open(path, "w", buffering=OUTPUT_BUFFER_SIZE, newline="") if path else sys.stdout
+
+
+def make_sink(output_format: str, file: Any) -> BinarySink | CSVSink | TextSink:
+    if output_format == "binary":
+        return BinarySink(file)
+    return CSVSink(file) if output_format == "csv" else TextSink(file)
+
+
+def evaluate_file(
+    path: str,
+    sink: Sink,
+    args: argparse.Namespace,
+    stats: PipelineStats | None,
+    cache: ResultCache | None = None,
+    metrics: PipelineMetrics | None = None,
+) -> None:
+    limits = Limits(args.max_instructions, args.max_seconds, args.max_int_bits)
+    if limits == Limits():
+        limits = None
+    if args.workers and path != "-":
+        from parallel import evaluate_file_sharded
+
+        start = time.perf_counter()
+        for value in evaluate_file_sharded(path, args.workers, limits=limits):
+            sink(value)
+            if stats is not None:
+                stats.statements += 1
+        if stats is not None:
+            # The stages run in the workers; only the total is known.
+            stats.seconds["interpret"] += time.perf_counter() - start
+        return
+    with open(path) if path != "-" else sys.stdin as source:
+        if not (args.vectorized or args.workers):
+            evaluate_lines(
+                source,
+                sink,
+                limits=limits,
+                interpreter_class=BACKENDS[args.backend],
+                stats=stats,
+                cache=cache,
+                metrics=metrics,
+            )
+            return
+        code = source.read()
+
+    if args.workers:
+        from parallel import evaluate_sharded
+
+        start = time.perf_counter()
+        values = evaluate_sharded(code, args.workers, limits=limits)
+        if stats is not None:
+            # The stages run in the workers; only the total is known.
+            stats.statements += len(values)
+            stats.seconds["interpret"] += time.perf_counter() - start
+    else:
+        values = evaluate_vectorized(code, limits, stats if stats is not None else PipelineStats())
+    for value in values:
+        sink(value)
+
+
+def evaluate_vectorized(code: str, limits: Limits | None, stats: PipelineStats) -> list[Any]:
+    from tokenizer import Tokenizer
+    from Parser import Parser
+    from compiler import Compiler
+    from streaming import count_nodes
+    from vectorized import evaluate_program
+
+    start = time.perf_counter()
+    tokens = list(Tokenizer(code))
+    tokenized = time.perf_counter()
+    tree = Parser(tokens).parse()
+    parsed = time.perf_counter()
+    bytecode = list(Compiler(tree).compile())
+    compiled = time.perf_counter()
+    values = evaluate_program(bytecode, limits=limits)
+    interpreted = time.perf_counter()
+    for stage, seconds in zip(
+        STAGES,
+        [tokenized - start, parsed - tokenized, compiled - parsed, interpreted - compiled],
+    ):
+        stats.seconds[stage] += seconds
+    stats.statements += len(tree.statements)
+    stats.tokens += len(tokens)
+    stats.nodes += sum(map(count_nodes, tree.statements))
+    stats.instructions += len(bytecode)
+    return values
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Evaluates programs and writes the value of each statement.")
+    parser.add_argument("files", nargs="*", default=["-"], help="source files; - or nothing reads stdin")
+    parser.add_argument("-o", "--output", help="file to write the values to, instead of stdout")
+    parser.add_argument("--format", choices=["text", "csv", "binary"], default="text")
+    parser.add_argument("--stats", action="store_true", help="print counts and time per stage to stderr")
+    parser.add_argument("--backend", choices=list(BACKENDS), default="interpreter", help="interpreter to stream statements through")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--vectorized", action="store_true", help="evaluate whole files with NumPy")
+    mode.add_argument("--workers", type=int, help="evaluate whole files in this many processes")
+    parser.add_argument("--max-instructions", type=int, help="instructions allowed per statement (per shard with --workers on stdin)")
+    parser.add_argument("--max-seconds", type=float, help="seconds allowed per statement (per shard with --workers on stdin)")
+    parser.add_argument("--max-int-bits", type=int, help="size allowed for ints built by * and **")
+    parser.add_argument("--cache-entries", type=int, default=0, help="memoize the values of up to this many distinct statements")
+    parser.add_argument("--cache-mb", type=float, default=64, help="memory the memoized values may take")
+    parser.add_argument("--metrics", help="write OpenMetrics counters and per-stage latencies to this file")
+    args = parser.parse_args(argv)
+
+    stats = PipelineStats() if args.stats else None
+    cache = ResultCache(args.cache_entries, int(args.cache_mb * (1 << 20))) if args.cache_entries else None
+    metrics = PipelineMetrics() if args.metrics else None
+    if metrics is not None and cache is not None:
+        metrics.track_cache(cache)
+    output = open_output(args.format, args.output)
+    try:
+        with make_sink(args.format, output) as sink:
+            for path in args.files:
+                try:
+                    evaluate_file(path, sink, args, stats, cache, metrics)
+                except Exception as error:
+                    notes = "".join(f"\n  {note}" for note in getattr(error, "__notes__", []))
+                    print(f"{path}: {type(error).__name__}: {error}{notes}", file=sys.stderr)
+                    return 1
+    finally:
+        if args.output:
+            output.close()
+        if stats is not None:
+            print(stats.report(), file=sys.stderr)
+            if cache is not None:
+                print(cache.report(), file=sys.stderr)
+        if metrics is not None:
+            write_metrics(metrics.registry, args.metrics)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
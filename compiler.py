@@ -1,6 +1,9 @@
 from dataclasses import dataclass
 from enum import auto, Enum
-from typing import Any, Generator
+from itertools import accumulate
+from operator import attrgetter
+from types import MappingProxyType
+from typing import Any, Generator, Iterable
 
 from Parser import TreeNode,BinOp, Int, Float, UnaryOp, Program, ExprStatement
 
@@ -23,15 +26,115 @@ class Bytecode:
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}({self.type.name}, {self.value!r})"
 
+STACK_EFFECTS = MappingProxyType({
+    BytecodeType.BINOP: -1,
+    BytecodeType.UNARYOP: 0,
+    BytecodeType.PUSH: 1,
+    BytecodeType.POP: -1,
+})
+"""How many values each bytecode type adds to (or removes from) the stack."""
+
+def max_stack_depth(bytecode: Iterable[Bytecode]) -> int:
+    """Returns the largest number of values the stack holds while running `bytecode`."""
+    effects = map(STACK_EFFECTS.__getitem__, map(attrgetter("type"), bytecode))
+    return max(accumulate(effects), default=0)
+
+def floats_only(bytecode: Iterable[Bytecode]) -> bool:
+    """Checks whether every value `bytecode` computes is guaranteed to be a float.
+
+    That holds when all constants are floats, since `+ - * / %` and the unary
+    operators keep floats as floats. `**` is excluded because a negative float
+    raised to a fractional power gives a complex number.
+    """
+    return all(
+        type(bc.value) is float if bc.type == BytecodeType.PUSH
+        else not (bc.type == BytecodeType.BINOP and bc.value == "**")
+        for bc in bytecode
+    )
+
+def split_statements(bytecode: Iterable[Bytecode]) -> Generator[list[Bytecode], None, None]:
+    """Splits a program's bytecode into the bytecode of each statement, which ends in a POP."""
+    statement: list[Bytecode] = []
+    for bc in bytecode:
+        statement.append(bc)
+        if bc.type == BytecodeType.POP:
+            yield statement
+            statement = []
+    if statement:
+        yield statement
+
+class LineTable:
+    """Maps bytecode offsets to source lines, delta-encoded like CPython's `co_lnotab`.
+
+    Each entry is a pair of bytes: how many instructions to advance and how many
+    lines to advance (as a signed byte). Increments that don't fit in one byte
+    are spread over several entries. The table is only decoded by `lookup`,
+    so keeping it around costs nothing while the bytecode runs.
+    """
+    def __init__(self, first_line: int = 0) -> None:
+        self.table = bytearray()
+        self.first_line = first_line
+        """Line the deltas start from, so that a statement deep in a file doesn't need a long run of entries."""
+        self._last_offset: int = 0
+        self._last_line: int = first_line
+
+    def add(self, offset: int, line: int) -> None:
+        """Records that the instructions from `offset` onwards come from `line`."""
+        offset_delta = offset - self._last_offset
+        line_delta = line - self._last_line
+        if offset_delta < 0:
+            raise RuntimeError(f"Offsets must be added in order, got {offset} after {self._last_offset}.")
+        self._last_offset, self._last_line = offset, line
+
+        while offset_delta > 255:
+            self.table += bytes((255, 0))
+            offset_delta -= 255
+        while not -128 <= line_delta <= 127:
+            step = 127 if line_delta > 0 else -128
+            self.table += bytes((offset_delta, step & 0xFF))
+            offset_delta, line_delta = 0, line_delta - step
+        self.table += bytes((offset_delta, line_delta & 0xFF))
+
+    def __iter__(self) -> Generator[tuple[int, int], None, None]:
+        """Yields the decoded `(offset, line)` pairs, in order."""
+        offset, line = 0, self.first_line
+        for i in range(0, len(self.table), 2):
+            offset_delta, line_delta = self.table[i], self.table[i + 1]
+            offset += offset_delta
+            line += line_delta - 256 if line_delta > 127 else line_delta
+            yield offset, line
+
+    def lookup(self, offset: int) -> int | None:
+        """Returns the source line of the instruction at `offset`, or None if unknown."""
+        result = None
+        for start, line in self:
+            if start > offset:
+                break
+            result = line
+        return result or None
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({list(self)})"
+
 class Compiler:
     def __init__(self, tree: TreeNode) -> None:
         self.tree = tree
+        self.linetable = LineTable(tree.lineno if isinstance(tree, ExprStatement) else 0)
+        """Filled in as the bytecode generator from `compile` is consumed."""
+        self.offset: int = 0
+        """Number of instructions emitted so far."""
 
     def compile(self) -> BytecodeGenerator:
-        return self._compile(self.tree)
+        for bc in self._compile(self.tree):
+            yield bc
+            self.offset += 1
 
     def _compile(self, tree: TreeNode) -> BytecodeGenerator:
         match tree:
+            case Program():
+                yield from self.compile_Program(tree)
+            case ExprStatement():
+                yield from self.compile_ExprStatement(tree)
             case BinOp(op, left, right):
                 yield from self._compile(left)
                 yield from self._compile(right)
@@ -53,6 +156,8 @@ class Compiler:
             yield from self._compile(statement)
 
     def compile_ExprStatement(self, expression: ExprStatement) -> BytecodeGenerator:
+        if expression.lineno:
+            self.linetable.add(self.offset, expression.lineno)
         yield from self._compile(expression.expr)
         yield Bytecode(BytecodeType.POP)
 
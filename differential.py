@@ -0,0 +1,327 @@
+"""Differential testing of every backend against Python's `eval`, which is also the baseline for speed.
+
+The language is a subset of Python's expressions, so `eval` on each line
+of a program gives the values it must produce, and the error it must stop
+at. The harness generates random programs (including ones that divide by
+zero, produce complex numbers, overflow floats to inf, nan or
+`OverflowError`, or build ints of tens of thousands of digits), runs them
+through every backend, checks
+that each produces the same values, of the same types, and raises the same
+type of error as `eval`, and times how many statements per second each one
+evaluates, relative to `eval`.
+
+    python differential.py --programs 500 --seed 1
+
+Backends are listed in `BACKENDS`; add new ones there to have them checked.
+"""
+import math
+import random
+import string
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from tokenizer import Tokenizer
+from Parser import Parser
+from compiler import Compiler, floats_only
+from incremental import IncrementalEvaluator
+from interpreter import FloatInterpreter, Interpreter, PreallocatedInterpreter, Sink
+from lowalloc import evaluate_lines_low_alloc
+from memo import ResultCache
+from parallel import evaluate_sharded
+from sinks import MAX_STR_INT_BITS
+from specializing import SpecializingInterpreter
+from streaming import evaluate_lines
+from tiered import TieredExecutor
+from verifier import VerifiedInterpreter
+
+
+@dataclass
+class Backend:
+    run: Callable[[str, Sink], None]
+    """Evaluates a program, sending the value of each statement to the sink."""
+    accepts: Callable[[str], bool] = lambda code: True
+    """Whether the backend can run a program at all, e.g. the float interpreter only runs float programs."""
+    values_before_errors: bool = True
+    """Whether the backend sends the values computed before an error; batch backends don't."""
+
+
+def run_interpreter(interpreter_class: type[Interpreter]) -> Callable[[str, Sink], None]:
+    def run(code: str, sink: Sink) -> None:
+        compiler = Compiler(Parser(list(Tokenizer(code))).parse())
+        bytecode = list(compiler.compile())
+        interpreter_class(bytecode, compiler.linetable, sink).interpret()
+
+    return run
+
+
+def run_tiered(code: str, sink: Sink) -> None:
+    """Runs the program promoted to generated Python, since it's promoted on its first run."""
+    compiler = Compiler(Parser(list(Tokenizer(code))).parse())
+    bytecode = list(compiler.compile())
+    TieredExecutor(threshold=1).run(bytecode, compiler.linetable, sink)
+
+
+def run_vectorized(code: str, sink: Sink) -> None:
+    from vectorized import evaluate_program
+
+    bytecode = list(Compiler(Parser(list(Tokenizer(code))).parse()).compile())
+    for value in evaluate_program(bytecode, min_group_size=1):
+        sink(value)
+
+
+def run_sharded(code: str, sink: Sink) -> None:
+    """Runs the program in a process pool, a few lines per shard."""
+    for value in evaluate_sharded(code, workers=2, lines_per_shard=5):
+        sink(value)
+
+
+def run_cached(code: str, sink: Sink) -> None:
+    """Streams the program through a `ResultCache` twice, so that the second run replays every statement."""
+    cache = ResultCache()
+    lines = code.splitlines(keepends=True)
+    try:
+        evaluate_lines(lines, lambda value: None, cache=cache)
+    except Exception:
+        pass
+    evaluate_lines(lines, sink, cache=cache)
+
+
+def run_incremental(code: str, sink: Sink) -> None:
+    """Evaluates an edit of the program, without its first line and with a line added, then the program itself."""
+    evaluator = IncrementalEvaluator()
+    lines = code.splitlines(keepends=True)
+    try:
+        evaluator.evaluate(lines[1:] + ["1\n"], lambda value: None)
+    except Exception:
+        pass
+    evaluator.evaluate(lines, sink)
+
+
+def accepts_floats_only(code: str) -> bool:
+    return floats_only(Compiler(Parser(list(Tokenizer(code))).parse()).compile())
+
+
+def numpy_available() -> bool:
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+BACKENDS: dict[str, Backend] = {
+    "interpreter": Backend(run_interpreter(Interpreter)),
+    "preallocated": Backend(run_interpreter(PreallocatedInterpreter)),
+    "float": Backend(run_interpreter(FloatInterpreter), accepts_floats_only),
+    "verified": Backend(run_interpreter(VerifiedInterpreter)),
+    "specializing": Backend(run_interpreter(SpecializingInterpreter)),
+    "tiered": Backend(run_tiered),
+    "streaming": Backend(lambda code, sink: evaluate_lines(code.splitlines(keepends=True), sink)),
+    "low_alloc": Backend(lambda code, sink: evaluate_lines_low_alloc(code.splitlines(keepends=True), sink)),
+    "cached": Backend(run_cached),
+    "incremental": Backend(run_incremental),
+    # Values are only returned once every shard has run.
+    "process_pool": Backend(run_sharded, values_before_errors=False),
+}
+if numpy_available():
+    BACKENDS["vectorized"] = Backend(run_vectorized, values_before_errors=False)
+
+
+def evaluate_with_python(code: str, sink: Sink) -> None:
+    """The oracle: `eval` on each line that holds a statement."""
+    for line in code.splitlines():
+        if line.strip():
+            sink(eval(line, {"__builtins__": {}}))
+
+
+def generate_literal(rng: random.Random, floats: bool) -> str:
+    roll = rng.random()
+    if roll < 0.02:
+        # Too big for a double, so it's inf; sums and products of infs are inf, their differences nan.
+        return "9" * rng.randint(309, 400) + "."
+    if roll < 0.04 and not floats:
+        # Thousands of digits, under the 4300 that `eval` parses.
+        return str(rng.randint(1, 9)) + "".join(rng.choices(string.digits, k=rng.randint(20, 4000)))
+    if floats or roll < 0.3:
+        return rng.choice(["{:.2f}", "{:.0f}.", "0.00{:.0f}", ".{:.0f}"]).format(rng.uniform(0, 99))
+    return str(rng.choice([0, 1, 2, rng.randint(3, 99), rng.randint(3, 99), rng.randint(100, 10**6)]))
+
+
+def generate_expression(rng: random.Random, depth: int, floats: bool = False) -> str:
+    """Generates a random expression, which may raise (by dividing by zero or overflowing) or produce a complex number."""
+    roll = rng.random()
+    if depth == 0 or roll < 0.25:
+        return generate_literal(rng, floats)
+    if roll < 0.35:
+        return rng.choice("+-") + generate_expression(rng, depth - 1, floats)
+    if roll < 0.45:
+        return f"({generate_expression(rng, depth - 1, floats)})"
+    op = rng.choice(["+", "-", "*", "/", "%"] if floats else ["+", "-", "*", "/", "%", "**"])
+    left = generate_expression(rng, depth - 1, floats)
+    if op == "**":
+        if rng.random() < 0.1:
+            # Big exponents of literals: ints of up to tens of thousands of digits, floats that overflow or underflow.
+            # Big ints mixed with floats raise `OverflowError` too, so the bigger ones are kept in a statement of their own.
+            base = rng.choice(["2", "3", "10", "(-7)", "1.5", "0.5", "(-2.5)"])
+            return f"{base} ** {rng.randint(100, 1000)}"
+        # Small exponents, so that ints stay small; negative or fractional ones give floats or complex numbers.
+        exponent = rng.choice(["0", "1", "2", "3", "-1", "0.5", "(-2)"])
+        return f"({left}) ** {exponent}"
+    if op in {"/", "%"} and rng.random() < 0.9:
+        # Mostly divide by literals that aren't zero, so that most programs run to the end.
+        divisor = f"{rng.uniform(0.5, 99):.2f}" if floats or rng.random() < 0.3 else str(rng.randint(1, 99))
+        return f"{left} {op} {divisor}"
+    return f"{left} {op} {generate_expression(rng, depth - 1, floats)}"
+
+
+def generate_program(rng: random.Random, statements: int = 20, depth: int = 5) -> str:
+    """Generates a program, a fifth of the time with floats only, with the odd blank line and the odd huge int."""
+    floats = rng.random() < 0.2
+    lines = []
+    for _ in range(statements):
+        if rng.random() < 0.05:
+            lines.append("")
+        if not floats and rng.random() < 0.05:
+            lines.append(f"{rng.choice(['2', '3', '10', '(-7)'])} ** {rng.randint(15_000, 100_000)} {rng.choice('+-*%')} {rng.randint(1, 99)}")
+        else:
+            lines.append(generate_expression(rng, depth, floats))
+    return "\n".join(lines) + "\n"
+
+
+@dataclass
+class Outcome:
+    values: list[Any]
+    error: str | None
+    """The type of the error the program stopped at."""
+
+
+def run_program(run: Callable[[str, Sink], None], code: str) -> Outcome:
+    values: list[Any] = []
+    try:
+        run(code, values.append)
+    except Exception as error:
+        return Outcome(values, type(error).__name__)
+    return Outcome(values, None)
+
+
+def same_value(left: Any, right: Any) -> bool:
+    if type(left) is not type(right):
+        return False
+    if isinstance(left, float) and math.isnan(left):
+        return math.isnan(right)
+    if isinstance(left, complex):
+        return same_value(left.real, right.real) and same_value(left.imag, right.imag)
+    return left == right
+
+
+def same_outcome(expected: Outcome, actual: Outcome, values_before_errors: bool = True) -> bool:
+    if expected.error != actual.error:
+        return False
+    if expected.error is not None and not values_before_errors:
+        # Only check the values the backend did send.
+        expected_values = expected.values[:len(actual.values)]
+    else:
+        expected_values = expected.values
+    return len(expected_values) == len(actual.values) and all(map(same_value, expected_values, actual.values))
+
+
+def describe_value(value: Any) -> str:
+    """Like `repr`, but for ints too long for it, gives their size."""
+    if type(value) is int and value.bit_length() > MAX_STR_INT_BITS:
+        return f"<int of {value.bit_length():,} bits>"
+    return repr(value)
+
+
+@dataclass
+class Mismatch:
+    backend: str
+    code: str
+    expected: Outcome
+    actual: Outcome
+
+    def describe(self) -> str:
+        for index, (expected, actual) in enumerate(zip(self.expected.values, self.actual.values)):
+            if not same_value(expected, actual):
+                return f"{self.backend}: statement {index} gave {describe_value(actual)}, eval gave {describe_value(expected)}"
+        return (
+            f"{self.backend}: {len(self.actual.values)} values and error {self.actual.error}, "
+            f"eval gave {len(self.expected.values)} values and error {self.expected.error}"
+        )
+
+
+@dataclass
+class Report:
+    programs: int = 0
+    statements: int = 0
+    """Statements `eval` evaluated, up to the first error of each program."""
+    mismatches: list[Mismatch] = field(default_factory=list)
+    seconds: dict[str, float] = field(default_factory=dict)
+    """Time each backend, and `eval`, took to run the programs it accepts that don't raise.
+
+    Programs that raise are left out, because `eval` stops at the error while
+    backends that compile whole programs have done the work for all of them.
+    """
+    statements_run: dict[str, int] = field(default_factory=dict)
+    """Statements in the programs timed for each backend."""
+
+    def throughput(self, backend: str) -> float:
+        return self.statements_run[backend] / self.seconds[backend] if self.seconds[backend] else 0.0
+
+    def format(self) -> str:
+        lines = [f"{self.programs:,} programs, {self.statements:,} statements, {len(self.mismatches)} mismatches"]
+        lines += [mismatch.describe() for mismatch in self.mismatches[:10]]
+        lines.append(f"{'backend':<14} {'statements/s':>14} {'vs eval':>9}")
+        baseline = self.throughput("eval")
+        for backend in self.seconds:
+            throughput = self.throughput(backend)
+            lines.append(f"{backend:<14} {throughput:>14,.0f} {throughput / baseline if baseline else 0:>8.2f}x")
+        return "\n".join(lines)
+
+
+def run_harness(programs: list[str], backends: dict[str, Backend] | None = None) -> Report:
+    """Checks every backend against `eval` on every program, timing them along the way."""
+    backends = BACKENDS if backends is None else backends
+    report = Report(programs=len(programs))
+    expected = [run_program(evaluate_with_python, code) for code in programs]
+    report.statements = sum(len(outcome.values) for outcome in expected)
+
+    for name, backend in {"eval": Backend(evaluate_with_python), **backends}.items():
+        seconds = 0.0
+        statements = 0
+        for code, outcome in zip(programs, expected):
+            if not backend.accepts(code):
+                continue
+            start = time.perf_counter()
+            actual = run_program(backend.run, code)
+            elapsed = time.perf_counter() - start
+            if outcome.error is None:
+                seconds += elapsed
+                statements += len(outcome.values)
+            if not same_outcome(outcome, actual, backend.values_before_errors):
+                report.mismatches.append(Mismatch(name, code, outcome, actual))
+        report.seconds[name] = seconds
+        report.statements_run[name] = statements
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Checks every backend against Python's eval on random programs.")
+    parser.add_argument("--programs", type=int, default=200)
+    parser.add_argument("--statements", type=int, default=20, help="statements per program")
+    parser.add_argument("--depth", type=int, default=5, help="maximum nesting of the generated expressions")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", action="append", choices=list(BACKENDS), help="check only these backends")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    programs = [generate_program(rng, args.statements, args.depth) for _ in range(args.programs)]
+    selected = {name: BACKENDS[name] for name in args.backend} if args.backend else BACKENDS
+    report = run_harness(programs, selected)
+    print(report.format())
+    for mismatch in report.mismatches[:1]:
+        print(f"\nFirst mismatching program:\n{mismatch.code}", file=sys.stderr)
+    sys.exit(1 if report.mismatches else 0)
@@ -0,0 +1,139 @@
+"""Re-evaluates edited programs, recomputing only the statements that changed.
+
+Statements are one per line and don't depend on each other, so a statement
+whose line is unchanged since the previous run has the same value. An
+`IncrementalEvaluator` diffs each new version of a program against the
+previous one, reuses the values of the unchanged lines, and only tokenizes,
+parses, compiles and runs the lines that are new or edited.
+
+Errors aren't kept: the statement that raised, and the ones after it that
+never ran, are evaluated on the next run.
+
+    python incremental.py program.txt --watch
+
+re-runs the file whenever it's saved and reports how many statements were
+recomputed and how many reused.
+"""
+import io
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from typing import Any, Iterable
+
+from tokenizer import tokenize_lines
+from Parser import Parser
+from compiler import Compiler
+from interpreter import Interpreter, Limits, Sink
+
+type Opcode = tuple[str, int, int, int, int]
+
+
+@dataclass
+class IncrementalStats:
+    recomputed: int = 0
+    """Statements evaluated in this run."""
+    reused: int = 0
+    """Statements whose value was kept from the previous run."""
+
+    def report(self) -> str:
+        return f"{self.recomputed:,} statements recomputed, {self.reused:,} reused"
+
+
+def diff_lines(old: list[str], new: list[str]) -> list[Opcode]:
+    """Like `SequenceMatcher.get_opcodes`, but only diffs what's between the common start and end.
+
+    In an edited file that's most of the lines, and comparing them one by one costs much less.
+    """
+    limit = min(len(old), len(new))
+    prefix = 0
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+
+    opcodes: list[Opcode] = [("equal", 0, prefix, 0, prefix)] if prefix else []
+    matcher = SequenceMatcher(None, old[prefix:len(old) - suffix], new[prefix:len(new) - suffix])
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        opcodes.append((tag, i1 + prefix, i2 + prefix, j1 + prefix, j2 + prefix))
+    if suffix:
+        opcodes.append(("equal", len(old) - suffix, len(old), len(new) - suffix, len(new)))
+    return opcodes
+
+
+class IncrementalEvaluator:
+    def __init__(self, limits: Limits | None = None, interpreter_class: type[Interpreter] = Interpreter) -> None:
+        self.limits = limits
+        self.interpreter_class = interpreter_class
+        self.interpreter: Interpreter | None = None
+        self.lines: list[str] = []
+        """The lines of the previous run, with their line endings."""
+        self.results: list[tuple[Any, ...] | None] = []
+        """For each line: a tuple with its value, an empty tuple if it holds no statement, or None if it wasn't evaluated."""
+        self.stats = IncrementalStats()
+        """What the latest run recomputed and reused."""
+
+    def evaluate(self, source: str | Iterable[str], sink: Sink) -> IncrementalStats:
+        """Evaluates a new version of the program, sending the value of each statement to `sink`."""
+        lines = list(io.StringIO(source, newline="\n")) if isinstance(source, str) else list(source)
+        results: list[tuple[Any, ...] | None] = [None] * len(lines)
+        for tag, i1, i2, j1, j2 in diff_lines(self.lines, lines):
+            if tag == "equal":
+                results[j1:j2] = self.results[i1:i2]
+        self.lines, self.results = lines, results
+
+        stats = self.stats = IncrementalStats()
+        for index, result in enumerate(results):
+            if result is None:
+                result = results[index] = self.evaluate_line(lines[index], index + 1)
+                stats.recomputed += len(result)
+            else:
+                stats.reused += len(result)
+            if result:
+                sink(result[0])
+        return stats
+
+    def evaluate_line(self, text: str, line: int) -> tuple[Any, ...]:
+        """Runs one line through the pipeline and returns a tuple with its value, or an empty one."""
+        statement = next(Parser(tokenize_lines([text], line)).parse_statements(), None)
+        if statement is None:
+            return ()
+        compiler = Compiler(statement)
+        bytecode = list(compiler.compile())
+        if self.interpreter is None:
+            self.interpreter = self.interpreter_class(bytecode, compiler.linetable, limits=self.limits)
+        else:
+            self.interpreter.reset(bytecode, compiler.linetable)
+        self.interpreter.interpret()
+        return (self.interpreter.last_value_popped,)
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    import sys
+    import time
+
+    parser = argparse.ArgumentParser(description="Evaluates a program, and re-evaluates what changed when it's saved.")
+    parser.add_argument("file")
+    parser.add_argument("--watch", action="store_true", help="re-run whenever the file changes")
+    parser.add_argument("--interval", type=float, default=0.5, help="seconds between checks for changes")
+    args = parser.parse_args()
+
+    evaluator = IncrementalEvaluator()
+    modified = None
+    failed = False
+    while True:
+        if (mtime := os.stat(args.file).st_mtime_ns) != modified:
+            modified = mtime
+            with open(args.file) as file:
+                source = file.read()
+            try:
+                evaluator.evaluate(source, print)
+                failed = False
+            except Exception as error:
+                failed = True
+                print(f"{type(error).__name__}: {error}", *getattr(error, "__notes__", []), sep="\n  ", file=sys.stderr)
+            print(evaluator.stats.report(), file=sys.stderr)
+        if not args.watch:
+            sys.exit(1 if failed else 0)
+        time.sleep(args.interval)
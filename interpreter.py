@@ -1,16 +1,92 @@
+import asyncio
+import math
 import operator
-from typing import Any
+import time
+from array import array
+from dataclasses import dataclass
+from functools import partial
+from types import MappingProxyType
+from typing import Any, Callable, Mapping
 
-from compiler import Bytecode, BytecodeType
+from compiler import Bytecode, BytecodeType, LineTable, floats_only, max_stack_depth
+from profiling import Profile, instruction_key
 
-BINOPS_TO_OPERATOR = {
+# The module-level tables are read-only, so that threads can share them safely.
+BINOPS_TO_OPERATOR = MappingProxyType({
     "**": operator.pow,
     "%": operator.mod,
     "/": operator.truediv,
     "*": operator.mul,
     "+": operator.add,
     "-": operator.sub,
-}
+})
+
+UNARYOPS_TO_OPERATOR = MappingProxyType({
+    "+": operator.pos,
+    "-": operator.neg,
+})
+
+type Sink = Callable[[Any], None]
+"""Receives the value of each statement, as it is popped."""
+
+type Trace = Callable[[int, Bytecode], None]
+"""Called with the offset of each instruction, and the instruction, right before it runs."""
+
+OPERATORS_BY_BYTECODE_TYPE = MappingProxyType({
+    BytecodeType.BINOP: BINOPS_TO_OPERATOR,
+    BytecodeType.UNARYOP: UNARYOPS_TO_OPERATOR,
+})
+"""Operator tables for the bytecode types whose value names an operator."""
+
+class ResourceLimitExceeded(RuntimeError):
+    """Raised when running a program would exceed one of its `Limits`."""
+
+class InstructionLimitExceeded(ResourceLimitExceeded):
+    pass
+
+class TimeLimitExceeded(ResourceLimitExceeded):
+    pass
+
+class IntSizeLimitExceeded(ResourceLimitExceeded):
+    pass
+
+@dataclass(frozen=True)
+class Limits:
+    """Resources a program may use. `None` means unlimited."""
+    max_instructions: int | None = None
+    max_seconds: float | None = None
+    """Wall time spent running, checked every `check_interval` instructions."""
+    max_int_bits: int | None = None
+    """Size of the biggest int `*` and `**` may produce, estimated before computing it."""
+    check_interval: int = 1024
+
+def checked_pow(max_bits: int, left: Any, right: Any) -> Any:
+    if type(left) is int and type(right) is int and right > 0 and abs(left) > 1:
+        # The result has more than `right` bits, and `right` may be too big to convert to a float, or to a string.
+        if right > max_bits:
+            raise IntSizeLimitExceeded(f"Power would have more than {max_bits} bits, the limit is {max_bits}.")
+        bits = right * math.log2(abs(left))
+        if bits > max_bits:
+            raise IntSizeLimitExceeded(f"Power would have about {bits:.0f} bits, the limit is {max_bits}.")
+    return left ** right
+
+def checked_mul(max_bits: int, left: Any, right: Any) -> Any:
+    if type(left) is int and type(right) is int:
+        bits = left.bit_length() + right.bit_length() - 1
+        if bits > max_bits:
+            raise IntSizeLimitExceeded(f"Product would have at least {bits} bits, the limit is {max_bits}.")
+    return left * right
+
+def operator_tables(limits: Limits | None) -> Mapping[BytecodeType, Mapping[str, Callable[..., Any]]]:
+    """Returns the operator tables to use under `limits`, guarding the operators that can blow up ints."""
+    if limits is None or limits.max_int_bits is None:
+        return OPERATORS_BY_BYTECODE_TYPE
+    binops = BINOPS_TO_OPERATOR | {
+        "**": partial(checked_pow, limits.max_int_bits),
+        "*": partial(checked_mul, limits.max_int_bits),
+    }
+    return OPERATORS_BY_BYTECODE_TYPE | {BytecodeType.BINOP: binops}
+
 class Stack:
     def __init__(self) -> None:
         self.stack: list[float] = []
@@ -24,69 +100,336 @@ class Stack:
     def peek(self) -> float:
         return self.stack[-1]
 
+    def clear(self) -> None:
+        self.stack.clear()
+
     def __repr__(self) -> str:
         return f"Stack({self.stack})"
-    
+
+class PreallocatedStack:
+    """A stack in a list allocated up front, with an explicit stack pointer."""
+    def __init__(self, size: int) -> None:
+        self.items: list[Any] | array[float] = [None] * size
+        self.sp: int = 0
+        """Index of the first free slot."""
+
+    def push(self, item: Any) -> None:
+        self.items[self.sp] = item
+        self.sp += 1
+
+    def pop(self) -> Any:
+        self.sp -= 1
+        return self.items[self.sp]
+
+    def peek(self) -> Any:
+        return self.items[self.sp - 1]
+
+    def clear(self, size: int = 0) -> None:
+        """Empties the stack, growing it if needed so that it holds at least `size` items."""
+        if (missing := size - len(self.items)) > 0:
+            self.items.extend(self.blank(missing))
+        self.sp = 0
+
+    def blank(self, size: int) -> list[Any] | array[float]:
+        return [None] * size
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({list(self.items[:self.sp])})"
+
+class FloatStack(PreallocatedStack):
+    """A preallocated stack that stores unboxed floats in an `array('d')`."""
+    def __init__(self, size: int) -> None:
+        super().__init__(0)
+        self.items = self.blank(size)
+
+    def blank(self, size: int) -> array[float]:
+        return array("d", bytes(8 * size))
+
 class Interpreter:
-    def __init__(self, bytecode: list[Bytecode]) -> None:
-        self.stack = Stack()
+    def __init__(
+        self,
+        bytecode: list[Bytecode],
+        linetable: LineTable | None = None,
+        sink: Sink | None = None,
+        limits: Limits | None = None,
+        profile: Profile | None = None,
+        trace: Trace | None = None,
+    ) -> None:
+        self.stack = self.make_stack(bytecode)
         self.bytecode = bytecode
+        self.linetable = linetable
+        self.sink = sink
+        """Called with the value of each statement, e.g. `list.append` or a `sinks` writer."""
+        self.limits = limits
+        self.profile = profile
+        self.trace = trace
+        self.operators = operator_tables(limits)
         self.ptr: int = 0
+        self.seconds_run: float = 0.0
+        """Time spent running under `Limits` so far, counted against `Limits.max_seconds`."""
         self.last_value_popped: Any = None
+        self.dispatch: dict[BytecodeType, Callable[[Any], None]] = {
+            bc_type: getattr(self, f"interpret_{bc_type.name}") for bc_type in BytecodeType
+        }
+        """Maps each bytecode type to its bound `interpret_*` method."""
+        self.methods: list[Callable[[Any], None]] = []
+        """The interpret method of each instruction."""
+        self.args: list[Any] = []
+        """The argument each interpret method is called with, with operators resolved."""
+        self.load(bytecode)
+        if profile is not None or trace is not None:
+            self.instrument(profile, trace)
+
+    def make_stack(self, bytecode: list[Bytecode]) -> Any:
+        return Stack()
+
+    def clear_stack(self, bytecode: list[Bytecode]) -> None:
+        """Empties the stack to run `bytecode`, like `make_stack` but reusing the stack."""
+        self.stack.clear()
+
+    def reset(
+        self,
+        bytecode: list[Bytecode] | None = None,
+        linetable: LineTable | None = None,
+        sink: Sink | None = None,
+    ) -> None:
+        """Rewinds the interpreter so it can run again, with `sink`.
+
+        If `bytecode` is given, it's loaded (with `linetable`) in place of the
+        current program. The stack and dispatch table are reused, so a reset
+        costs less than a new interpreter; limits, profile and trace are kept.
+        """
+        if bytecode is not None:
+            self.clear_stack(bytecode)
+            self.bytecode = bytecode
+            self.linetable = linetable
+            self.load(bytecode)
+            if self.profile is not None or self.trace is not None:
+                self.instrument(self.profile, self.trace)
+        else:
+            self.clear_stack(self.bytecode)
+        self.sink = sink
+        self.ptr = 0
+        self.seconds_run = 0.0
+        self.last_value_popped = None
+
+    def load(self, bytecode: list[Bytecode]) -> None:
+        """Resolves every instruction once, so the main loop doesn't have to."""
+        dispatch, operator_tables = self.dispatch, self.operators
+        try:
+            self.methods = [dispatch[bc.type] for bc in bytecode]
+            self.args = [
+                bc.value if (operators := operator_tables.get(bc.type)) is None
+                else operators[bc.value]
+                for bc in bytecode
+            ]
+        except KeyError:
+            # Go over the instructions again, slowly, to report the faulty one.
+            for offset, bc in enumerate(bytecode):
+                try:
+                    self.load_instruction(bc)
+                except Exception as error:
+                    self.add_location_note(error, offset)
+                    raise
+            raise
+
+    def load_instruction(self, bc: Bytecode) -> tuple[Callable[[Any], None], Any]:
+        """Returns the interpret method of an instruction and its resolved argument."""
+        interpret_method = self.dispatch.get(bc.type)
+        if interpret_method is None:
+            raise RuntimeError(f"Can't interpret {bc.type}.")
+
+        operators = self.operators.get(bc.type)
+        if operators is None:
+            return interpret_method, bc.value
+        if bc.value not in operators:
+            raise RuntimeError(f"Unknown operator {bc.value}.")
+        return interpret_method, operators[bc.value]
+
+    def instrument(self, profile: Profile | None, trace: Trace | None) -> None:
+        """Wraps the interpret method of every instruction to record `profile` and call `trace`.
+
+        The interpreter loops stay the same, so only instrumented
+        interpreters pay for instrumentation.
+        """
+        keys = [instruction_key(bc) for bc in self.bytecode]
+        wrappers: dict[str, Callable[[Any], None]] = {}
+        for key, method in zip(keys, self.methods):
+            if key not in wrappers:
+                wrappers[key] = self.make_instrumented(key, method, profile, trace)
+        self.methods = [wrappers[key] for key in keys]
+
+    def make_instrumented(
+        self,
+        key: str,
+        method: Callable[[Any], None],
+        profile: Profile | None,
+        trace: Trace | None,
+    ) -> Callable[[Any], None]:
+        bytecode = self.bytecode
+        clock = time.perf_counter_ns
 
+        def instrumented(arg: Any) -> None:
+            if trace is not None:
+                trace(self.ptr, bytecode[self.ptr])
+            if profile is None:
+                method(arg)
+            else:
+                start = clock()
+                method(arg)
+                profile.record(key, clock() - start)
+
+        return instrumented
 
     def interpret(self) -> None:
-        while self.ptr < len(self.bytecode):
-            bc = self.bytecode[self.ptr]
-            bc_type = bc.type
+        """Runs the program to completion."""
+        self.run()
+
+    def run(self, max_instructions: int | None = None) -> bool:
+        """Runs (at most) `max_instructions` more instructions and returns whether the program finished.
+
+        All the state lives on the interpreter, so a program can be run in
+        slices, interleaved with other work. `Limits` apply to the whole
+        program, over all slices: its time limit counts time spent running.
+        """
+        end = len(self.methods)
+        if max_instructions is not None:
+            end = min(end, self.ptr + max_instructions)
+        if self.limits is not None:
+            self.interpret_with_limits(self.limits, end)
+        else:
+            self.interpret_until(end)
+        return self.ptr == len(self.methods)
+
+    async def run_async(self, slice_size: int = 4096) -> None:
+        """Runs the program to completion, yielding to the event loop every `slice_size` instructions."""
+        while not self.run(slice_size):
+            await asyncio.sleep(0)
+
+    def interpret_until(self, end: int) -> None:
+        methods, args = self.methods, self.args
+        try:
+            while self.ptr < end:
+                methods[self.ptr](args[self.ptr])
+                self.ptr += 1
+        except Exception as error:
+            self.add_location_note(error, self.ptr)
+            raise
+
+    def interpret_with_limits(self, limits: Limits, end: int) -> None:
+        """Like `interpret_until`, but checks the instruction and time budgets between slices of instructions.
 
-            interpret_method = getattr(self, f"interpret_{bc_type.name}", None)
-            if interpret_method is None:
-                raise RuntimeError(f"Can't interpret {bc_type}.")
+        Kept apart so that runs without limits don't pay for the checks.
+        Instructions run at most once, so the instruction pointer counts the
+        instructions run so far.
+        """
+        methods, args = self.methods, self.args
+        stopped_by_limit = False
+        if limits.max_instructions is not None and limits.max_instructions < end:
+            end, stopped_by_limit = limits.max_instructions, True
+        started = time.monotonic()
+        deadline = started + limits.max_seconds - self.seconds_run if limits.max_seconds is not None else None
+        try:
+            while self.ptr < end:
+                stop = min(end, self.ptr + limits.check_interval)
+                while self.ptr < stop:
+                    methods[self.ptr](args[self.ptr])
+                    self.ptr += 1
+                if deadline is not None and time.monotonic() > deadline:
+                    raise TimeLimitExceeded(f"Ran for longer than {limits.max_seconds}s.")
+            if stopped_by_limit:
+                raise InstructionLimitExceeded(f"Ran more than {limits.max_instructions} instructions.")
+        except Exception as error:
+            self.add_location_note(error, self.ptr)
+            raise
+        finally:
+            self.seconds_run += time.monotonic() - started
 
-            interpret_method(bc)
-            self.ptr += 1
+    def source_line(self, offset: int) -> int | None:
+        """Returns the source line of the instruction at `offset`, if known."""
+        return self.linetable.lookup(offset) if self.linetable is not None else None
 
-        print("Done!")
-        print(self.stack)
+    def add_location_note(self, error: BaseException, offset: int) -> None:
+        """Annotates an error with the instruction (and line) where it was raised."""
+        location = f"bytecode offset {offset}"
+        if (line := self.source_line(offset)) is not None:
+            location = f"line {line}, {location}"
+        error.add_note(f"Raised at {location}.")
 
-    def interpret_PUSH(self, bc: Bytecode) -> None:
-        self.stack.push(bc.value)
+    def interpret_PUSH(self, value: Any) -> None:
+        self.stack.push(value)
 
-    def interpret_POP(self, bc: Bytecode) -> None:
+    def interpret_POP(self, _: Any) -> None:
         self.last_value_popped = self.stack.pop()
+        if self.sink is not None:
+            self.sink(self.last_value_popped)
 
-    def interpret_BINOP(self, bc: Bytecode) -> None:
-        result = self.stack.pop()
-        if bc.value == "-":
-            result = -result
-        elif bc.value != "+":
-            raise RuntimeError(f"Unknown unary operator {bc.value}.")
-        self.stack.push(result)
-
-    def interpret_UNARYOP(self, bc: Bytecode) -> None:
-        result = self.stack.pop()
-        if bc.value == "+":
-            pass
-        elif bc.value == "-":
-            result = -result
-        else:
-            raise RuntimeError(f"Unknown operator {bc.value}.")
-        self.stack.push(result)
+    def interpret_BINOP(self, op: Callable[[Any, Any], Any]) -> None:
+        right = self.stack.pop()
+        left = self.stack.pop()
+        self.stack.push(op(left, right))
+
+    def interpret_UNARYOP(self, op: Callable[[Any], Any]) -> None:
+        self.stack.push(op(self.stack.pop()))
+
+class PreallocatedInterpreter(Interpreter):
+    """An interpreter whose stack is allocated up front, to the program's maximum depth.
+
+    The interpret methods index the stack's items with its stack pointer
+    directly, instead of calling `push` and `pop`.
+    """
+    def make_stack(self, bytecode: list[Bytecode]) -> PreallocatedStack:
+        return PreallocatedStack(max_stack_depth(bytecode))
+
+    def clear_stack(self, bytecode: list[Bytecode]) -> None:
+        self.stack.clear(max_stack_depth(bytecode))
+
+    def interpret_PUSH(self, value: Any) -> None:
+        stack = self.stack
+        stack.items[stack.sp] = value
+        stack.sp += 1
+
+    def interpret_POP(self, _: Any) -> None:
+        stack = self.stack
+        stack.sp -= 1
+        self.last_value_popped = stack.items[stack.sp]
+        if self.sink is not None:
+            self.sink(self.last_value_popped)
+
+    def interpret_BINOP(self, op: Callable[[Any, Any], Any]) -> None:
+        stack = self.stack
+        items = stack.items
+        sp = stack.sp - 1
+        items[sp - 1] = op(items[sp - 1], items[sp])
+        stack.sp = sp
+
+    def interpret_UNARYOP(self, op: Callable[[Any], Any]) -> None:
+        items = self.stack.items
+        sp = self.stack.sp - 1
+        items[sp] = op(items[sp])
+
+class FloatInterpreter(PreallocatedInterpreter):
+    """A `PreallocatedInterpreter` whose stack holds unboxed floats.
+
+    Only accepts bytecode that `floats_only` proves never produces anything but floats.
+    """
+    def make_stack(self, bytecode: list[Bytecode]) -> FloatStack:
+        if not floats_only(bytecode):
+            raise RuntimeError("Bytecode may produce values that aren't floats.")
+        return FloatStack(max_stack_depth(bytecode))
+
+    def clear_stack(self, bytecode: list[Bytecode]) -> None:
+        if not floats_only(bytecode):
+            raise RuntimeError("Bytecode may produce values that aren't floats.")
+        super().clear_stack(bytecode)
 
 if __name__ == "__main__":
     import sys
 
-    from tokenizer import Tokenizer
-    from Parser import Parser
-    from compiler import Compiler
-    
+    from streaming import evaluate_lines
+
     if len(sys.argv) != 2:
         print("Usage: python your_script.py \"2 + 3\"")
         sys.exit(1)
 
-    code = sys.argv[1]
-    tokens = list(Tokenizer(code))
-    tree = Parser(tokens).parse()
-    bytecode = list(Compiler(tree).compile())
-    Interpreter(bytecode).interpret()
\ No newline at end of file
+    evaluate_lines(sys.argv[1].splitlines(keepends=True), print)
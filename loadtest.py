@@ -0,0 +1,91 @@
+"""Load-tests an evaluation server started with `server.py`.
+
+Opens a number of concurrent connections that each send random programs
+back to back, then reports latency percentiles and throughput.
+
+Run with `python loadtest.py --unix /tmp/eval.sock --connections 16 --requests 200`.
+"""
+import asyncio
+import random
+import statistics
+import time
+
+from benchmarks import generate_program
+from server import connect, request
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, round(fraction * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+async def run_connection(
+    programs: list[str],
+    requests: int,
+    latencies: list[float],
+    host: str,
+    port: int,
+    unix: str | None,
+) -> int:
+    """Sends `requests` programs over one connection, recording each latency. Returns the number of errors."""
+    reader, writer = await connect(host, port, unix)
+    errors = 0
+    try:
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = await request(reader, writer, random.choice(programs))
+            latencies.append(time.perf_counter() - start)
+            errors += not response["ok"]
+    finally:
+        writer.close()
+    return errors
+
+
+async def load_test(
+    connections: int,
+    requests: int,
+    statements: int,
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    unix: str | None = None,
+) -> dict[str, float]:
+    """Runs the load test and returns its report."""
+    programs = [generate_program(statements, seed=seed) for seed in range(32)]
+    latencies: list[float] = []
+    start = time.perf_counter()
+    errors = await asyncio.gather(
+        *(run_connection(programs, requests, latencies, host, port, unix) for _ in range(connections))
+    )
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": sum(errors),
+        "seconds": elapsed,
+        "requests_per_second": len(latencies) / elapsed,
+        "p50_ms": 1000 * percentile(latencies, 0.50),
+        "p99_ms": 1000 * percentile(latencies, 0.99),
+        "mean_ms": 1000 * statistics.fmean(latencies),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Load-tests an evaluation server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="path of the server's Unix socket")
+    parser.add_argument("--connections", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=100, help="requests per connection")
+    parser.add_argument("--statements", type=int, default=10, help="statements per program")
+    args = parser.parse_args()
+
+    report = asyncio.run(
+        load_test(args.connections, args.requests, args.statements, args.host, args.port, args.unix)
+    )
+    print(
+        f"{report['requests']} requests ({report['errors']} errors) in {report['seconds']:.2f}s: "
+        f"{report['requests_per_second']:,.0f} requests/s, "
+        f"p50 {report['p50_ms']:.2f}ms, p99 {report['p99_ms']:.2f}ms, mean {report['mean_ms']:.2f}ms"
+    )
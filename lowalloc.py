@@ -0,0 +1,266 @@
+"""Runs programs through the pipeline with less work for the cyclic garbage collector.
+
+Tokens, nodes and instructions are container objects, so allocating them
+counts towards CPython's collection thresholds, but none of them ever form
+a cycle. When a whole program is tokenized, parsed and compiled at once,
+they all stay alive until it has run, so thousands of young collections run
+that find nothing to free, and full collections traverse all of them. When
+a program is streamed, reference counting frees each statement's objects
+right after it runs, so collections are rare, but any that do run still
+traverse the long-lived objects of the process. This module's low
+allocation mode:
+
+- moves every object alive when it starts (modules, operator tables, the
+  caller's data) out of the collector's reach with `gc.freeze`;
+- disables the collector, or raises its threshold, while programs run, and
+  when streaming, collects the young generation itself between batches of
+  statements, for the rare cycles (like errors caught with their traceback);
+- compiles with `InterningCompiler`, which shares one instance of each
+  operator and POP instruction instead of allocating new ones.
+
+`AllocationStats` counts the objects the pipeline allocates and the
+collections that ran, per 1,000 statements; `python lowalloc.py program.txt`
+compares the default and low allocation modes of both pipelines.
+"""
+import gc
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Iterable, Iterator
+
+from tokenizer import Tokenizer, tokenize_lines
+from Parser import BinOp, ExprStatement, Parser, TreeNode, UnaryOp
+from compiler import Bytecode, BytecodeGenerator, BytecodeType, Compiler
+from interpreter import BINOPS_TO_OPERATOR, UNARYOPS_TO_OPERATOR, Interpreter, Limits, Sink
+from streaming import PipelineStats, evaluate_lines
+
+SHARED_BINOPS = MappingProxyType({op: Bytecode(BytecodeType.BINOP, op) for op in BINOPS_TO_OPERATOR})
+SHARED_UNARYOPS = MappingProxyType({op: Bytecode(BytecodeType.UNARYOP, op) for op in UNARYOPS_TO_OPERATOR})
+SHARED_POP = Bytecode(BytecodeType.POP)
+
+
+class InterningCompiler(Compiler):
+    """A compiler that yields shared instances of the instructions that don't hold a constant.
+
+    Nothing modifies instructions after they're compiled, so they can be shared; callers mustn't either.
+    """
+    def __init__(self, tree: TreeNode) -> None:
+        super().__init__(tree)
+        self.shared: int = 0
+        """Number of shared instructions yielded so far."""
+
+    def _compile(self, tree: TreeNode) -> BytecodeGenerator:
+        match tree:
+            case BinOp(op, left, right) if op in SHARED_BINOPS:
+                yield from self._compile(left)
+                yield from self._compile(right)
+                self.shared += 1
+                yield SHARED_BINOPS[op]
+            case UnaryOp(op, value) if op in SHARED_UNARYOPS:
+                yield from self._compile(value)
+                self.shared += 1
+                yield SHARED_UNARYOPS[op]
+            case _:
+                yield from super()._compile(tree)
+
+    def compile_ExprStatement(self, expression: ExprStatement) -> BytecodeGenerator:
+        if expression.lineno:
+            self.linetable.add(self.offset, expression.lineno)
+        yield from self._compile(expression.expr)
+        self.shared += 1
+        yield SHARED_POP
+
+
+@contextmanager
+def gc_control(threshold: int | None = None, freeze: bool = True) -> Iterator[None]:
+    """Disables the cyclic collector, or sets the threshold of its young generation to `threshold`.
+
+    With `freeze`, every object alive on entry is moved to a permanent
+    generation that collections ignore, and moved back on exit. If objects
+    are frozen already (by the caller before forking, or by the interpreter
+    itself on some versions, like 3.12.1), nothing is frozen or unfrozen,
+    because objects can't be unfrozen selectively. Everything is restored
+    on exit, so don't nest this.
+    """
+    was_enabled = gc.isenabled()
+    thresholds = gc.get_threshold()
+    freeze = freeze and gc.get_freeze_count() == 0
+    gc.disable()
+    if freeze:
+        gc.freeze()
+    if threshold is not None:
+        gc.set_threshold(threshold, *thresholds[1:])
+        if was_enabled:
+            gc.enable()
+    try:
+        yield
+    finally:
+        gc.disable()
+        gc.set_threshold(*thresholds)
+        if freeze:
+            gc.unfreeze()
+        if was_enabled:
+            gc.enable()
+
+
+@dataclass
+class AllocationStats:
+    statements: int = 0
+    tokens: int = 0
+    nodes: int = 0
+    instructions: int = 0
+    shared_instructions: int = 0
+    """Instructions that were shared instances rather than new objects."""
+    collections: list[int] = field(default_factory=lambda: [0, 0, 0])
+    """Collections of each generation, including the ones run between batches."""
+    seconds: float = 0.0
+
+    @property
+    def objects(self) -> int:
+        """Tokens, nodes and instructions allocated."""
+        return self.tokens + self.nodes + self.instructions - self.shared_instructions
+
+    @contextmanager
+    def measuring(self) -> Iterator[None]:
+        """Adds the time spent, and the collections run, in the `with` block."""
+        before = gc.get_stats()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds += time.perf_counter() - start
+            for generation, (start_stats, end_stats) in enumerate(zip(before, gc.get_stats())):
+                self.collections[generation] += end_stats["collections"] - start_stats["collections"]
+
+    def per_thousand(self) -> dict[str, float]:
+        scale = 1000 / self.statements if self.statements else 0.0
+        return {
+            "objects": self.objects * scale,
+            **{f"gen{generation}_collections": count * scale for generation, count in enumerate(self.collections)},
+        }
+
+    def report(self) -> str:
+        per_thousand = self.per_thousand()
+        collections = ", ".join(f"{per_thousand[f'gen{generation}_collections']:.2f}" for generation in range(3))
+        return (
+            f"{self.statements:,} statements in {self.seconds:.3f}s; per 1k statements: "
+            f"{per_thousand['objects']:,.0f} tokens, nodes and instructions allocated, {collections} collections of generations 0, 1, 2"
+        )
+
+
+def evaluate_lines_low_alloc(
+    lines: Iterable[str],
+    sink: Sink,
+    line: int = 1,
+    limits: Limits | None = None,
+    interpreter_class: type[Interpreter] = Interpreter,
+    batch_size: int = 10_000,
+    threshold: int | None = None,
+    stats: AllocationStats | None = None,
+) -> int:
+    """Like `streaming.evaluate_lines`, but under `gc_control(threshold)`, collecting the young generation every `batch_size` statements.
+
+    Returns the number of statements. Pass `stats` to have it filled in; counting costs nothing measurable.
+    """
+    if stats is None:
+        stats = AllocationStats()
+    statements = 0
+    with stats.measuring(), gc_control(threshold):
+        try:
+            parser = Parser(tokenize_lines(lines, line))
+            interpreter = None
+            for statement in parser.parse_statements():
+                compiler = InterningCompiler(statement)
+                bytecode = list(compiler.compile())
+                if interpreter is None:
+                    interpreter = interpreter_class(bytecode, compiler.linetable, sink, limits)
+                else:
+                    interpreter.reset(bytecode, compiler.linetable, sink)
+                interpreter.interpret()
+                # The parser holds the tokens of one statement, and the tree has one node per instruction.
+                stats.tokens += len(parser.tokens)
+                stats.nodes += len(bytecode)
+                stats.instructions += len(bytecode)
+                stats.shared_instructions += compiler.shared
+                statements += 1
+                if statements % batch_size == 0:
+                    gc.collect(0)
+        finally:
+            stats.statements += statements
+    return statements
+
+
+def evaluate_source_low_alloc(
+    code: str,
+    sink: Sink,
+    line: int = 1,
+    limits: Limits | None = None,
+    threshold: int | None = None,
+    stats: AllocationStats | None = None,
+) -> None:
+    """Like `parallel.evaluate_source`, tokenizing, parsing and compiling the whole program at once, but under `gc_control(threshold)`."""
+    if stats is None:
+        stats = AllocationStats()
+    with stats.measuring(), gc_control(threshold):
+        # The program's objects are freed when this returns, before the collector is turned back on.
+        evaluate_whole_program(code, sink, line, limits, InterningCompiler, stats)
+
+
+def evaluate_whole_program(
+    code: str,
+    sink: Sink,
+    line: int,
+    limits: Limits | None,
+    compiler_class: type[Compiler],
+    stats: AllocationStats | None,
+) -> None:
+    tokens = list(Tokenizer(code, line))
+    tree = Parser(tokens).parse()
+    compiler = compiler_class(tree)
+    bytecode = list(compiler.compile())
+    Interpreter(bytecode, compiler.linetable, sink, limits).interpret()
+    if stats is not None:
+        stats.statements += len(tree.statements)
+        stats.tokens += len(tokens)
+        # One node per instruction, and the program.
+        stats.nodes += len(bytecode) + 1
+        stats.instructions += len(bytecode)
+        stats.shared_instructions += getattr(compiler, "shared", 0)
+
+
+def compare_modes(code: str, batch_size: int = 10_000, threshold: int | None = None) -> dict[str, AllocationStats]:
+    """Runs `code` in the default and low allocation modes of both pipelines, discarding its values."""
+    def discard(value: Any) -> None:
+        pass
+
+    results = {name: AllocationStats() for name in ["streaming", "streaming, low allocation", "whole", "whole, low allocation"]}
+    pipeline = PipelineStats()
+    with results["streaming"].measuring():
+        evaluate_lines(code.splitlines(keepends=True), discard, stats=pipeline)
+    results["streaming"].statements = pipeline.statements
+    results["streaming"].tokens = pipeline.tokens
+    results["streaming"].nodes = pipeline.nodes
+    results["streaming"].instructions = pipeline.instructions
+    evaluate_lines_low_alloc(
+        code.splitlines(keepends=True), discard, batch_size=batch_size, threshold=threshold, stats=results["streaming, low allocation"]
+    )
+    with results["whole"].measuring():
+        evaluate_whole_program(code, discard, 1, None, Compiler, results["whole"])
+    evaluate_source_low_alloc(code, discard, threshold=threshold, stats=results["whole, low allocation"])
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compares the default and low allocation modes of the pipeline.")
+    parser.add_argument("file")
+    parser.add_argument("--batch-size", type=int, default=10_000, help="statements between young collections when streaming")
+    parser.add_argument("--threshold", type=int, help="raise the young generation's threshold instead of disabling the collector")
+    args = parser.parse_args()
+
+    with open(args.file) as file:
+        code = file.read()
+    for name, stats in compare_modes(code, args.batch_size, args.threshold).items():
+        print(f"{name:<26} {stats.report()}")
@@ -0,0 +1,163 @@
+"""Memoizes the results of programs, which are pure: the same bytecode always gives the same values.
+
+A `ResultCache` maps a hash of a program's bytecode, and the `Limits` it
+runs under, to the values of its statements, or to the error it raised.
+Running a program through the cache replays a cached result into the
+interpreter's sink, or runs the program and caches its result. Errors are
+raised again with the location of the statement that raised them. Time
+limit and memory errors depend on the machine, not on the program, so they
+aren't cached.
+
+The cache is bounded by a number of entries and by an estimate of the
+memory they hold, since a single int can take megabytes, and evicts the
+least recently used entries first. It can be shared by every run, and
+every thread, of a process.
+"""
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+from interpreter import Interpreter, TimeLimitExceeded
+from tiered import program_key
+
+ENTRY_OVERHEAD = 240
+"""Approximate size of an entry, without its values: its key, the entry itself and its slot in the cache."""
+
+
+@dataclass
+class CachedResult:
+    values: tuple[Any, ...]
+    """The values the program sent to its sink, up to its error if it raised one."""
+    error: tuple[type[Exception], tuple[Any, ...], int] | None
+    """The type and arguments of the error the program raised, and the offset of the instruction that raised it."""
+    size: int
+    """Approximate number of bytes the result holds."""
+
+
+def result_size(values: tuple[Any, ...], error_args: tuple[Any, ...] = ()) -> int:
+    return ENTRY_OVERHEAD + sum(map(sys.getsizeof, values)) + sum(map(sys.getsizeof, error_args))
+
+
+class ResultCache:
+    def __init__(self, max_entries: int = 1 << 16, max_bytes: int = 64 << 20) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[Any, CachedResult] = OrderedDict()
+        """Cached results, least recently used first."""
+        self.bytes: int = 0
+        """Approximate size of the cached results."""
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.lock = threading.Lock()
+        """Guards the entries and the counters, so that threads can share a cache."""
+
+    def run(self, interpreter: Interpreter) -> None:
+        """Runs the interpreter's program to completion, or replays its cached result.
+
+        The interpreter must be at the start of its program. Values are sent
+        to its sink, and the last one is left in `last_value_popped`, as if
+        the program had run; profiles and traces only see programs that run.
+        """
+        key = (interpreter.limits, program_key(interpreter.bytecode))
+        with self.lock:
+            result = self.entries.get(key)
+            if result is None:
+                self.misses += 1
+            else:
+                self.entries.move_to_end(key)
+                self.hits += 1
+        if result is None:
+            self.run_and_cache(interpreter, key)
+        else:
+            self.replay(interpreter, result)
+
+    def run_and_cache(self, interpreter: Interpreter, key: Any) -> None:
+        """Runs the program, sending each value to the sink as it's produced, and caches its result.
+
+        Errors raised by the sink aren't the program's, so they aren't cached.
+        """
+        sink = interpreter.sink
+        values: list[Any] = []
+        sink_errors: list[BaseException] = []
+        if sink is None:
+            interpreter.sink = values.append
+        else:
+            def forward(value: Any) -> None:
+                values.append(value)
+                try:
+                    sink(value)
+                except BaseException as error:
+                    sink_errors.append(error)
+                    raise
+
+            interpreter.sink = forward
+        try:
+            interpreter.interpret()
+        except (TimeLimitExceeded, MemoryError):
+            raise
+        except Exception as error:
+            if not sink_errors:
+                error_info = (type(error), error.args, interpreter.ptr)
+                self.add(key, CachedResult(tuple(values), error_info, result_size(tuple(values), error.args)))
+            raise
+        else:
+            self.add(key, CachedResult(tuple(values), None, result_size(tuple(values))))
+        finally:
+            interpreter.sink = sink
+
+    def replay(self, interpreter: Interpreter, result: CachedResult) -> None:
+        if interpreter.sink is not None:
+            for value in result.values:
+                interpreter.sink(value)
+        if result.values:
+            interpreter.last_value_popped = result.values[-1]
+        if result.error is None:
+            interpreter.ptr = len(interpreter.bytecode)
+            return
+        error_type, args, ptr = result.error
+        interpreter.ptr = ptr
+        error = error_type(*args)
+        interpreter.add_location_note(error, ptr)
+        raise error
+
+    def add(self, key: Any, result: CachedResult) -> None:
+        if result.size > self.max_bytes:
+            return
+        with self.lock:
+            if (previous := self.entries.pop(key, None)) is not None:
+                self.bytes -= previous.size
+            self.entries[key] = result
+            self.bytes += result.size
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.bytes -= evicted.size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "evictions": self.evictions,
+        }
+
+    def report(self) -> str:
+        return (
+            f"cache: {self.hits:,} hits, {self.misses:,} misses ({self.hit_rate:.1%} hit rate), "
+            f"{len(self.entries):,} entries, {self.bytes / 1024:.1f} KiB, {self.evictions:,} evictions"
+        )
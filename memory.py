@@ -0,0 +1,114 @@
+"""Measures the memory each stage of the pipeline allocates, with `tracemalloc`.
+
+For each stage, the report gives the peak memory allocated while it ran,
+the memory still held by its output afterwards (the tokens, the tree, the
+bytecode), that memory per token, node or instruction, and the lines of
+code that allocated the most of it.
+
+Run with `python memory.py program.txt --json report.json`. Tracing
+allocations slows everything down a lot, so only use this to compare
+memory use, not time.
+"""
+import gc
+import tracemalloc
+from typing import Any, Callable
+
+from tokenizer import Tokenizer
+from Parser import Parser
+from compiler import Compiler
+from interpreter import Interpreter
+from streaming import count_nodes
+
+
+def measure_stage(run: Callable[[], Any], items: Callable[[Any], int], top: int) -> tuple[Any, dict[str, Any]]:
+    """Runs one stage under `tracemalloc` (which must be tracing) and returns its output and its report.
+
+    `items` counts the items in the stage's output, to report memory per item.
+    """
+    tracemalloc.reset_peak()
+    before = tracemalloc.take_snapshot()
+    start, _ = tracemalloc.get_traced_memory()
+    output = run()
+    # Interpreters hold reference cycles (through their bound methods), so they're only freed by the collector.
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+
+    differences = after.compare_to(before, "lineno")
+    retained_blocks = sum(difference.count_diff for difference in differences)
+    count = items(output)
+    return output, {
+        "peak_bytes": peak - start,
+        "retained_bytes": current - start,
+        "retained_blocks": retained_blocks,
+        "items": count,
+        "bytes_per_item": (current - start) / count if count else None,
+        "blocks_per_item": retained_blocks / count if count else None,
+        "top_allocations": [
+            {
+                "location": f"{difference.traceback[0].filename}:{difference.traceback[0].lineno}",
+                "bytes": difference.size_diff,
+                "blocks": difference.count_diff,
+            }
+            for difference in differences[:top]
+            if difference.size_diff > 0
+        ],
+    }
+
+
+def measure_pipeline(code: str, top: int = 10) -> dict[str, Any]:
+    """Runs `code` through the pipeline, measuring the memory of each stage.
+
+    Each stage's output is kept alive while the following stages run, like in the non-streaming pipeline.
+    """
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    try:
+        tokens, tokenizer = measure_stage(lambda: list(Tokenizer(code)), len, top)
+        tree, parser = measure_stage(
+            lambda: Parser(tokens).parse(),
+            lambda tree: sum(map(count_nodes, tree.statements)),
+            top,
+        )
+        bytecode, compiler = measure_stage(lambda: list(Compiler(tree).compile()), len, top)
+        _, interpreter = measure_stage(lambda: Interpreter(bytecode).interpret(), lambda _: len(bytecode), top)
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+    return {
+        "source_bytes": len(code),
+        "stages": {"tokenizer": tokenizer, "parser": parser, "compiler": compiler, "interpreter": interpreter},
+    }
+
+
+def format_report(report: dict[str, Any]) -> str:
+    lines = [f"{'stage':<12} {'peak KiB':>10} {'retained KiB':>13} {'items':>10} {'B/item':>8} {'blocks/item':>12}"]
+    for stage, measured in report["stages"].items():
+        per_item = measured["bytes_per_item"]
+        blocks_per_item = measured["blocks_per_item"]
+        lines.append(
+            f"{stage:<12} {measured['peak_bytes'] / 1024:>10.1f} {measured['retained_bytes'] / 1024:>13.1f} "
+            f"{measured['items']:>10,} {per_item or 0:>8.1f} {blocks_per_item or 0:>12.2f}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import sys
+
+    parser = argparse.ArgumentParser(description="Measures the memory each stage of the pipeline allocates.")
+    parser.add_argument("file", help="source file, or - for stdin")
+    parser.add_argument("--json", help="write the report to this file, as JSON")
+    parser.add_argument("--top", type=int, default=10, help="allocation sites to list per stage")
+    args = parser.parse_args()
+
+    with (sys.stdin if args.file == "-" else open(args.file)) as source:
+        code = source.read()
+    report = measure_pipeline(code, args.top)
+    print(format_report(report))
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
@@ -0,0 +1,240 @@
+"""Operational metrics for the pipeline, exported in the OpenMetrics text format.
+
+A `MetricsRegistry` holds counters, gauges and histograms, optionally with
+one label. Recording is a plain increment, or a bisect and two increments
+for histograms, so that it can be done for every statement. Like
+`profiling.Profile`, metrics aren't locked, so each thread that records
+should have its own registry.
+
+`PipelineMetrics` defines the metrics of the pipeline: statements, tokens
+and instructions processed, latency per stage, errors by type and, when a
+`memo.ResultCache` is tracked, its hits and misses. Rates such as tokens per
+second are computed by the scraper from the counters, e.g. with
+`rate(pipeline_tokens_total[1m])`; the gauges give them over the process'
+lifetime too.
+
+Metrics can be written to a file with `write_metrics`, or served over
+HTTP with `serve_metrics`:
+
+    python cli.py big.txt --metrics metrics.txt
+    python server.py --unix /tmp/eval.sock --metrics-port 9464
+"""
+import bisect
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Iterator, Sequence
+
+from streaming import STAGES
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+DEFAULT_BUCKETS = (1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 0.1, 1.0, 10.0)
+"""Upper bounds of histogram buckets, in seconds: statements take from microseconds to seconds."""
+
+
+def format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+def format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """A metric, or a family of metrics that differ by the value of one label."""
+    type_name = "unknown"
+
+    def __init__(self, name: str, help: str, label: str | None = None) -> None:
+        self.name = name
+        self.help = help
+        self.label = label
+        self.children: dict[str, Any] = {}
+        """The metric for each value of the label, created as they're first used."""
+
+    def labels(self, value: str) -> Any:
+        """Returns the metric for one value of the label."""
+        child = self.children.get(value)
+        if child is None:
+            child = self.children[value] = self.make_child()
+        return child
+
+    def make_child(self) -> Any:
+        return type(self)(self.name, self.help)
+
+    def samples(self) -> Iterator[tuple[str, dict[str, str], float]]:
+        """Yields the name, labels and value of each sample."""
+        if self.label is None:
+            yield from self.own_samples({})
+            return
+        for value, child in self.children.items():
+            yield from child.own_samples({self.label: value})
+
+    def own_samples(self, labels: dict[str, str]) -> Iterator[tuple[str, dict[str, str], float]]:
+        """Yields the samples of this metric, with `labels`; a plain `Metric` has none."""
+        return iter(())
+
+    def expose(self) -> str:
+        lines = [f"# TYPE {self.name} {self.type_name}", f"# HELP {self.name} {self.help}"]
+        lines += [f"{name}{format_labels(labels)} {format_value(value)}" for name, labels, value in self.samples()]
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, help: str, label: str | None = None, function: Callable[[], float] | None = None) -> None:
+        super().__init__(name, help, label)
+        self.value: float = 0
+        self.function = function
+        """Reads the value from elsewhere, instead of `value`, e.g. from a counter kept by a cache."""
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def own_samples(self, labels: dict[str, str]) -> Iterator[tuple[str, dict[str, str], float]]:
+        yield f"{self.name}_total", labels, self.function() if self.function is not None else self.value
+
+
+class Gauge(Metric):
+    """A value read when the metrics are exposed."""
+    type_name = "gauge"
+
+    def __init__(self, name: str, help: str, function: Callable[[], float]) -> None:
+        super().__init__(name, help)
+        self.function = function
+
+    def own_samples(self, labels: dict[str, str]) -> Iterator[tuple[str, dict[str, str], float]]:
+        yield self.name, labels, self.function()
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, help: str, label: str | None = None, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, help, label)
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        """Observations per bucket, not cumulative; the last bucket is `+Inf`."""
+        self.sum: float = 0.0
+
+    def make_child(self) -> "Histogram":
+        return Histogram(self.name, self.help, buckets=self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def own_samples(self, labels: dict[str, str]) -> Iterator[tuple[str, dict[str, str], float]]:
+        cumulative = 0
+        for bound, count in zip([*map(repr, map(float, self.buckets)), "+Inf"], self.counts):
+            cumulative += count
+            yield f"{self.name}_bucket", labels | {"le": bound}, cumulative
+        yield f"{self.name}_count", labels, cumulative
+        yield f"{self.name}_sum", labels, self.sum
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self.metrics: dict[str, Metric] = {}
+
+    def register[M: Metric](self, metric: M) -> M:
+        if metric.name in self.metrics:
+            raise ValueError(f"A metric named {metric.name} is already registered.")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, label: str | None = None, function: Callable[[], float] | None = None) -> Counter:
+        return self.register(Counter(name, help, label, function))
+
+    def gauge(self, name: str, help: str, function: Callable[[], float]) -> Gauge:
+        return self.register(Gauge(name, help, function))
+
+    def histogram(self, name: str, help: str, label: str | None = None, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, label, buckets))
+
+    def expose(self) -> str:
+        """Returns every metric in the OpenMetrics text format."""
+        return "".join(metric.expose() + "\n" for metric in self.metrics.values()) + "# EOF\n"
+
+
+class PipelineMetrics:
+    """The metrics of the pipeline, recorded per statement by `streaming.evaluate_lines`."""
+    def __init__(self, registry: MetricsRegistry | None = None, prefix: str = "pipeline") -> None:
+        self.registry = registry if registry is not None else MetricsRegistry()
+        self.prefix = prefix
+        self.statements = self.registry.counter(f"{prefix}_statements", "Statements evaluated.")
+        self.tokens = self.registry.counter(f"{prefix}_tokens", "Tokens produced by the tokenizer.")
+        self.instructions = self.registry.counter(f"{prefix}_instructions", "Bytecode instructions compiled and run.")
+        self.errors = self.registry.counter(f"{prefix}_errors", "Statements that raised, by error type.", "type")
+        self.stage_seconds = self.registry.histogram(f"{prefix}_stage_seconds", "Time each stage spent on a statement.", "stage")
+        self.stages = [self.stage_seconds.labels(stage) for stage in STAGES]
+        """The histogram of each stage, in the order of `streaming.STAGES`."""
+        self.registry.gauge(
+            f"{prefix}_tokens_per_second", "Tokens processed per second of pipeline time, over its lifetime.", lambda: self.rate(self.tokens)
+        )
+        self.registry.gauge(
+            f"{prefix}_instructions_per_second",
+            "Instructions run per second of pipeline time, over its lifetime.",
+            lambda: self.rate(self.instructions),
+        )
+
+    def rate(self, counter: Counter) -> float:
+        seconds = sum(stage.sum for stage in self.stages)
+        return counter.value / seconds if seconds else 0.0
+
+    def record_statement(self, tokens: int, instructions: int, seconds: Sequence[float]) -> None:
+        """Records a statement, with the time each stage spent on it."""
+        self.statements.value += 1
+        self.tokens.value += tokens
+        self.instructions.value += instructions
+        for histogram, elapsed in zip(self.stages, seconds):
+            histogram.observe(elapsed)
+
+    def record_error(self, error: BaseException, tokens: int = 0, instructions: int = 0, seconds: Sequence[float] = ()) -> None:
+        """Records a statement that raised, with its tokens and instructions and the time of the stages it finished."""
+        self.errors.labels(type(error).__name__).value += 1
+        self.tokens.value += tokens
+        self.instructions.value += instructions
+        for histogram, elapsed in zip(self.stages, seconds):
+            histogram.observe(elapsed)
+
+    def track_cache(self, cache: Any) -> None:
+        """Exposes the hits and misses of a `memo.ResultCache`, read when the metrics are exposed."""
+        self.registry.counter(f"{self.prefix}_cache_hits", "Statements whose result was found in the cache.", function=lambda: cache.hits)
+        self.registry.counter(f"{self.prefix}_cache_misses", "Statements whose result wasn't in the cache.", function=lambda: cache.misses)
+        self.registry.gauge(f"{self.prefix}_cache_hit_ratio", "Share of cache lookups that hit.", lambda: cache.hit_rate)
+        self.registry.gauge(f"{self.prefix}_cache_bytes", "Approximate size of the cached results.", lambda: cache.bytes)
+
+
+def write_metrics(registry: MetricsRegistry, path: str) -> None:
+    """Writes the metrics to a file, replacing it at once so that readers never see half of it."""
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as file:
+        file.write(registry.expose())
+    os.replace(temporary, path)
+
+
+def serve_metrics(registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9464) -> ThreadingHTTPServer:
+    """Serves the metrics at `/metrics` from a background thread. Call `shutdown()` on the result to stop."""
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.expose().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,307 @@
+"""Evaluates batches of programs, or big programs split by statements, in a pool of processes.
+
+Each worker runs the whole pipeline on its piece of code and writes the
+values of its statements to a shared memory block, in the `BinarySink`
+format, so that the values don't have to be pickled one by one on their way
+back. Results are always returned in input order.
+
+`evaluate_file_sharded` splits a file, of any size, in byte ranges that end
+at newlines, so each worker reads its own range from the file and the
+parent never holds more than a few shards' values at a time.
+
+`evaluate_programs_in_threads` uses a pool of threads instead, which avoids
+the copies but only runs programs in parallel on free-threaded builds of
+CPython. The pipeline's objects are never shared between threads and its
+module-level tables are read-only, so it's safe either way.
+"""
+import io
+import os
+import re
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice, pairwise
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Generator
+
+from tokenizer import Tokenizer
+from Parser import Parser
+from compiler import Compiler
+from interpreter import Interpreter, Limits, Sink
+from sinks import BinarySink, TextSink, read_binary_results
+from streaming import evaluate_lines
+
+
+def evaluate_source(code: str, sink: Sink, line: int = 1, limits: Limits | None = None) -> None:
+    """Runs `code` through the whole pipeline, sending the value of each statement to `sink`.
+
+    `line` is the line `code` starts at, for error messages.
+    """
+    compiler = Compiler(Parser(list(Tokenizer(code, line))).parse())
+    bytecode = list(compiler.compile())
+    Interpreter(bytecode, compiler.linetable, sink=sink, limits=limits).interpret()
+
+
+def evaluate_to_shared_memory(code: str, line: int = 1, limits: Limits | None = None) -> tuple[str, int]:
+    """Evaluates `code` in a worker and returns the name and size of the block holding its values.
+
+    The caller is responsible for unlinking the block.
+    """
+    buffer = io.BytesIO()
+    with BinarySink(buffer) as sink:
+        evaluate_source(code, sink, line, limits)
+    return to_shared_memory(buffer.getbuffer())
+
+
+def to_shared_memory(data: memoryview) -> tuple[str, int]:
+    """Copies `data` to a new shared memory block and returns its name and size."""
+    shm = SharedMemory(create=True, size=max(len(data), 1))
+    # The parent unlinks the block, so this process mustn't clean it up too.
+    resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore[attr-defined]
+    try:
+        shm.buf[: len(data)] = data
+        return shm.name, len(data)
+    finally:
+        shm.close()
+
+
+def collect_from_shared_memory(name: str, size: int) -> list[Any]:
+    """Reads back the values written by `evaluate_to_shared_memory` and frees the block."""
+    shm = SharedMemory(name=name)
+    try:
+        return list(read_binary_results(io.BytesIO(shm.buf[:size])))
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def collect_in_order(
+    futures: list[Future[tuple[str, int]]],
+    label: str = "program",
+) -> Generator[list[Any], None, None]:
+    """Yields the values computed by each future, in order.
+
+    If one of them raised, its error is propagated, annotated with its `label` and index,
+    and the blocks of the futures that did finish are freed.
+    """
+    collected = 0
+    try:
+        for index, future in enumerate(futures):
+            try:
+                block = future.result()
+            except Exception as error:
+                error.add_note(f"Raised by {label} {index}.")
+                raise
+            collected += 1
+            yield collect_from_shared_memory(*block)
+    finally:
+        for future in futures[collected:]:
+            if not future.cancel() and future.exception() is None:
+                collect_from_shared_memory(*future.result())
+
+
+def evaluate_programs(
+    programs: list[str],
+    workers: int | None = None,
+    limits: Limits | None = None,
+) -> list[list[Any]]:
+    """Evaluates each program in a process pool and returns the values of each program's statements."""
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(evaluate_to_shared_memory, program, 1, limits) for program in programs]
+        return list(collect_in_order(futures))
+
+
+def evaluate_values(code: str, limits: Limits | None = None) -> list[Any]:
+    """Evaluates `code` and returns the value of each statement."""
+    values: list[Any] = []
+    evaluate_source(code, values.append, limits=limits)
+    return values
+
+
+def evaluate_programs_in_threads(
+    programs: list[str],
+    workers: int | None = None,
+    limits: Limits | None = None,
+) -> list[list[Any]]:
+    """Like `evaluate_programs`, but in a thread pool."""
+    with ThreadPoolExecutor(workers) as executor:
+        futures = [executor.submit(evaluate_values, program, limits) for program in programs]
+        results = []
+        for index, future in enumerate(futures):
+            try:
+                results.append(future.result())
+            except Exception as error:
+                error.add_note(f"Raised by program {index}.")
+                for pending in futures[index + 1:]:
+                    pending.cancel()
+                raise
+        return results
+
+
+def split_source(code: str, lines_per_shard: int) -> Generator[tuple[str, int], None, None]:
+    """Splits source code in pieces of (at most) `lines_per_shard` lines.
+
+    Statements end at newlines, so every piece holds whole statements.
+    Yields each piece with the line it starts at.
+    """
+    start, line = 0, 1
+    while start < len(code):
+        end = start
+        for _ in range(lines_per_shard):
+            end = code.find("\n", end) + 1
+            if end == 0:
+                end = len(code)
+                break
+        yield code[start:end], line
+        line += code.count("\n", start, end)
+        start = end
+
+
+def evaluate_sharded(
+    code: str,
+    workers: int | None = None,
+    lines_per_shard: int = 10_000,
+    limits: Limits | None = None,
+) -> list[Any]:
+    """Evaluates a big program in a process pool, split at statement boundaries.
+
+    `limits` apply to each shard separately.
+    """
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [
+            executor.submit(evaluate_to_shared_memory, shard, line, limits)
+            for shard, line in split_source(code, lines_per_shard)
+        ]
+        return [value for values in collect_in_order(futures, "shard") for value in values]
+
+
+def shard_boundaries(path: str, shard_bytes: int) -> list[int]:
+    """Splits a file in ranges of at least `shard_bytes` bytes that end right after a newline.
+
+    Returns the offsets where ranges start, followed by the size of the file.
+    Every range starts at the beginning of a line, so it holds whole statements
+    and tokenizes as it would as part of the whole file.
+    """
+    size = os.path.getsize(path)
+    boundaries = [0]
+    with open(path, "rb") as file:
+        while boundaries[-1] + shard_bytes < size:
+            file.seek(boundaries[-1] + shard_bytes - 1)
+            position = file.tell()
+            while chunk := file.read(1 << 16):
+                if (newline := chunk.find(b"\n")) >= 0:
+                    position += newline + 1
+                    break
+                position += len(chunk)
+            if position >= size:
+                break
+            boundaries.append(position)
+    boundaries.append(size)
+    return boundaries
+
+
+def count_lines(path: str, end: int) -> int:
+    """Counts the newlines in the first `end` bytes of a file."""
+    lines = 0
+    with open(path, "rb") as file:
+        while end > 0 and (chunk := file.read(min(end, 1 << 20))):
+            lines += chunk.count(b"\n")
+            end -= len(chunk)
+    return lines
+
+
+LOCATION_NOTE = re.compile(r"^Raised at line (\d+),")
+
+
+def shift_location_notes(error: BaseException, lines: int) -> None:
+    """Adds `lines` to the line of an error's location notes, for code that was evaluated apart from the lines before it."""
+    if notes := getattr(error, "__notes__", None):
+        error.__notes__ = [
+            LOCATION_NOTE.sub(lambda match: f"Raised at line {int(match[1]) + lines},", note) for note in notes
+        ]
+
+
+def evaluate_byte_range(path: str, start: int, end: int, limits: Limits | None = None) -> tuple[str, int]:
+    """Evaluates the statements in a range of a file in a worker, like `evaluate_to_shared_memory`."""
+    with open(path, "rb") as file:
+        file.seek(start)
+        text = file.read(end - start).decode()
+    buffer = io.BytesIO()
+    try:
+        with BinarySink(buffer) as sink:
+            evaluate_lines(io.StringIO(text, newline="\n"), sink, limits=limits)
+    except Exception as error:
+        # Only count the lines before the range when it's needed, since that reads the whole file up to there.
+        shift_location_notes(error, count_lines(path, start))
+        raise
+    return to_shared_memory(buffer.getbuffer())
+
+
+def evaluate_file_sharded(
+    path: str,
+    workers: int | None = None,
+    shard_bytes: int = 1 << 26,
+    limits: Limits | None = None,
+) -> Generator[Any, None, None]:
+    """Evaluates a file of any size in a process pool, split in byte ranges, and yields its values in order.
+
+    Only a couple of shards per worker are in flight at a time, so memory use
+    doesn't grow with the size of the file. `limits` apply to each statement.
+    """
+    ranges = pairwise(shard_boundaries(path, shard_bytes))
+    workers = workers if workers is not None else os.cpu_count() or 1
+    max_pending = 2 * workers
+    with ProcessPoolExecutor(workers) as executor:
+        pending: deque[tuple[Future[tuple[str, int]], int, int]] = deque()
+
+        def submit() -> None:
+            for start, end in islice(ranges, 1):
+                pending.append((executor.submit(evaluate_byte_range, path, start, end, limits), start, end))
+
+        try:
+            for _ in range(max_pending):
+                submit()
+            index = 0
+            while pending:
+                future, start, end = pending.popleft()
+                try:
+                    block = future.result()
+                except Exception as error:
+                    error.add_note(f"Raised by shard {index}, bytes {start} to {end}.")
+                    raise
+                submit()
+                yield from collect_from_shared_memory(*block)
+                index += 1
+        finally:
+            for future, _, _ in pending:
+                if not future.cancel() and future.exception() is None:
+                    collect_from_shared_memory(*future.result())
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Evaluates programs in a pool of processes.")
+    parser.add_argument("files", nargs="+", help="source files; a single file is split in byte ranges")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes")
+    parser.add_argument("--shard-bytes", type=int, default=1 << 26, help="size of the ranges a single file is split in")
+    parser.add_argument("--threads", action="store_true", help="evaluate several files in threads instead of processes")
+    args = parser.parse_args()
+
+    sink = TextSink(sys.stdout)
+    try:
+        if len(args.files) == 1:
+            for value in evaluate_file_sharded(args.files[0], args.workers, args.shard_bytes):
+                sink(value)
+        else:
+            sources = []
+            for path in args.files:
+                with open(path) as file:
+                    sources.append(file.read())
+            evaluate = evaluate_programs_in_threads if args.threads else evaluate_programs
+            for program in evaluate(sources, args.workers):
+                for value in program:
+                    sink(value)
+    finally:
+        sink.close()
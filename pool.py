@@ -0,0 +1,78 @@
+"""A thread-safe pool of interpreters, for services that run many small programs.
+
+Creating an interpreter builds its dispatch table and stack; taking one from
+the pool and resetting it with the next program reuses them instead.
+"""
+import threading
+from contextlib import contextmanager
+from typing import Any, Generator
+
+from compiler import Bytecode, LineTable
+from interpreter import Interpreter, Limits, Sink
+
+
+class InterpreterPool:
+    def __init__(
+        self,
+        interpreter_class: type[Interpreter] = Interpreter,
+        limits: Limits | None = None,
+        max_idle: int = 64,
+    ) -> None:
+        self.interpreter_class = interpreter_class
+        self.limits = limits
+        self.max_idle = max_idle
+        """Number of idle interpreters kept; interpreters released beyond that are dropped."""
+        self.idle: list[Interpreter] = []
+        self.lock = threading.Lock()
+        self.created: int = 0
+        self.reused: int = 0
+
+    def acquire(
+        self,
+        bytecode: list[Bytecode],
+        linetable: LineTable | None = None,
+        sink: Sink | None = None,
+    ) -> Interpreter:
+        """Returns an interpreter loaded with `bytecode`, ready to run. Only one thread may use it at a time."""
+        with self.lock:
+            interpreter = self.idle.pop() if self.idle else None
+            if interpreter is None:
+                self.created += 1
+            else:
+                self.reused += 1
+        if interpreter is None:
+            return self.interpreter_class(bytecode, linetable, sink, self.limits)
+        try:
+            interpreter.reset(bytecode, linetable, sink)
+        except Exception:
+            # The bytecode was rejected; the interpreter is still fine for the next program.
+            self.release(interpreter)
+            raise
+        return interpreter
+
+    def release(self, interpreter: Interpreter) -> None:
+        """Gives an interpreter back to the pool."""
+        # Don't keep the last program and its sink alive.
+        interpreter.reset([])
+        with self.lock:
+            if len(self.idle) < self.max_idle:
+                self.idle.append(interpreter)
+
+    @contextmanager
+    def interpreter(
+        self,
+        bytecode: list[Bytecode],
+        linetable: LineTable | None = None,
+        sink: Sink | None = None,
+    ) -> Generator[Interpreter, None, None]:
+        interpreter = self.acquire(bytecode, linetable, sink)
+        try:
+            yield interpreter
+        finally:
+            self.release(interpreter)
+
+    def run(self, bytecode: list[Bytecode], linetable: LineTable | None = None, sink: Sink | None = None) -> Any:
+        """Runs a program in a pooled interpreter and returns the value of its last statement."""
+        with self.interpreter(bytecode, linetable, sink) as interpreter:
+            interpreter.interpret()
+            return interpreter.last_value_popped
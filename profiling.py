@@ -0,0 +1,91 @@
+"""Execution statistics for the interpreter, collected per instruction kind.
+
+Pass a `Profile` to `Interpreter(..., profile=...)` (the same profile can be
+shared by many interpreters) and print `profile.report()` or save
+`profile.dump(file)` afterwards.
+"""
+import json
+from collections import Counter
+from typing import Any, TextIO
+
+from compiler import Bytecode, BytecodeType
+
+
+def instruction_key(bc: Bytecode) -> str:
+    """Names the kind of an instruction: its type, plus its operator for BINOP and UNARYOP."""
+    if bc.type in {BytecodeType.BINOP, BytecodeType.UNARYOP}:
+        return f"{bc.type.name} {bc.value}"
+    return bc.type.name
+
+
+class Profile:
+    """Counts are updated without locking: threads running instrumented interpreters need a profile each."""
+    def __init__(self) -> None:
+        self.counts: Counter[str] = Counter()
+        """How many times each kind of instruction ran."""
+        self.times: Counter[str] = Counter()
+        """Cumulative time spent running each kind of instruction, in nanoseconds."""
+        self.pairs: Counter[tuple[str, str]] = Counter()
+        """How many times each kind of instruction ran right after another."""
+        self.previous: str | None = None
+
+    def record(self, key: str, elapsed: int) -> None:
+        self.counts[key] += 1
+        self.times[key] += elapsed
+        if self.previous is not None:
+            self.pairs[self.previous, key] += 1
+        self.previous = key
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "instructions": {
+                key: {"count": count, "time_ns": self.times[key]} for key, count in self.counts.most_common()
+            },
+            "pairs": {f"{first} -> {second}": count for (first, second), count in self.pairs.most_common()},
+        }
+
+    def dump(self, file: TextIO) -> None:
+        """Writes the profile to `file` as JSON."""
+        json.dump(self.to_dict(), file, indent=2)
+
+    def report(self, top_pairs: int = 10) -> str:
+        """Formats the profile as a table, slowest kinds of instructions first."""
+        total_time = sum(self.times.values()) or 1
+        lines = [f"{'instruction':<12} {'count':>12} {'total ms':>10} {'ns/op':>8} {'time %':>7}"]
+        for key, elapsed in self.times.most_common():
+            count = self.counts[key]
+            lines.append(
+                f"{key:<12} {count:>12,} {elapsed / 1e6:>10.2f} {elapsed / count:>8.0f} "
+                f"{100 * elapsed / total_time:>6.1f}%"
+            )
+        if self.pairs:
+            lines.append("")
+            lines.append(f"{'pair':<26} {'count':>12}")
+            for (first, second), count in self.pairs.most_common(top_pairs):
+                lines.append(f"{first + ' -> ' + second:<26} {count:>12,}")
+        return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    from tokenizer import Tokenizer
+    from Parser import Parser
+    from compiler import Compiler
+    from interpreter import Interpreter
+
+    parser = argparse.ArgumentParser(description="Profiles the interpretation of a program.")
+    parser.add_argument("file", help="source file, or - for stdin")
+    parser.add_argument("--json", help="also write the profile to this file, as JSON")
+    args = parser.parse_args()
+
+    with (sys.stdin if args.file == "-" else open(args.file)) as source:
+        code = source.read()
+    compiler = Compiler(Parser(list(Tokenizer(code))).parse())
+    profile = Profile()
+    Interpreter(list(compiler.compile()), compiler.linetable, profile=profile).interpret()
+    print(profile.report())
+    if args.json:
+        with open(args.json, "w") as file:
+            profile.dump(file)
@@ -0,0 +1,211 @@
+"""A long-running asyncio server that evaluates programs sent over a local socket.
+
+Requests and responses are framed the same way: a 4-byte big-endian length
+followed by that many bytes. A request holds UTF-8 source code and its
+response holds a JSON object, either `{"ok": true, "values": [...]}` with the
+value of each statement or `{"ok": false, "error": ..., "message": ...}`.
+Values that JSON numbers can't hold are sent as strings: ints over 4300
+digits, which Python's `json` refuses to read or write, as decimal digits,
+and complex numbers as their `repr`, e.g. `"(1+2j)"`.
+
+Programs run in a pool of worker processes, so one slow program doesn't
+block the event loop, and every request is subject to a size limit, a
+timeout and a limit on how many requests may be pending at once. Workers
+enforce the interpreter's `Limits`, so runaway programs are stopped too.
+
+Run with `python server.py --unix /tmp/eval.sock` or `python server.py --port 8765`.
+Add `--metrics-port 9464` to serve OpenMetrics at `http://127.0.0.1:9464/metrics`.
+"""
+import asyncio
+import json
+import struct
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any
+
+from interpreter import Limits
+from metrics import MetricsRegistry, serve_metrics
+from parallel import evaluate_source
+from sinks import MAX_STR_INT_BITS, format_int
+
+HEADER = struct.Struct(">I")
+
+DEFAULT_MAX_INT_BITS = 1 << 24
+"""Size allowed for ints built by `*` and `**`, unless the server is given its own `Limits`."""
+
+
+def json_value(value: Any) -> Any:
+    """Returns the value to put in a response, which is a string if a JSON number can't hold it."""
+    if type(value) is int and value.bit_length() > MAX_STR_INT_BITS:
+        return format_int(value)
+    if type(value) is complex:
+        return repr(value)
+    return value
+
+
+def evaluate_request(code: str, limits: Limits | None = None) -> dict[str, Any]:
+    """Evaluates a program in a worker and builds the response to send back."""
+    values: list[Any] = []
+    try:
+        evaluate_source(code, lambda value: values.append(json_value(value)), limits=limits)
+    except Exception as error:
+        return error_response(error)
+    return {"ok": True, "values": values}
+
+
+def error_response(error: BaseException) -> dict[str, Any]:
+    return {
+        "ok": False,
+        "error": type(error).__name__,
+        "message": str(error),
+        "notes": getattr(error, "__notes__", []),
+    }
+
+
+async def read_frame(reader: asyncio.StreamReader, max_size: int) -> bytes | None:
+    """Reads one frame, or returns None if the connection was closed between frames."""
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError as error:
+        if error.partial:
+            raise
+        return None
+    (size,) = HEADER.unpack(header)
+    if size > max_size:
+        raise ValueError(f"Request of {size} bytes exceeds the limit of {max_size} bytes.")
+    return await reader.readexactly(size)
+
+
+def write_frame(writer: asyncio.StreamWriter, payload: bytes) -> None:
+    writer.write(HEADER.pack(len(payload)) + payload)
+
+
+class EvaluationServer:
+    def __init__(
+        self,
+        executor: Executor | None = None,
+        max_request_size: int = 1 << 20,
+        timeout: float = 10.0,
+        max_pending: int = 256,
+        limits: Limits | None = None,
+    ) -> None:
+        self.executor = executor if executor is not None else ProcessPoolExecutor()
+        self.max_request_size = max_request_size
+        """Largest request accepted, in bytes; bigger requests close the connection."""
+        self.timeout = timeout
+        """Seconds a request may take before it gets a `TimeoutError` response."""
+        self.pending = asyncio.Semaphore(max_pending)
+        """Bounds the number of requests queued for or running in the workers."""
+        self.limits = limits if limits is not None else Limits(max_seconds=timeout, max_int_bits=DEFAULT_MAX_INT_BITS)
+        """Enforced by the workers themselves, so that runaway programs free their worker."""
+        self.requests: int = 0
+        self.errors: int = 0
+        self.metrics = MetricsRegistry()
+        """Metrics of the requests, for `metrics.serve_metrics`. Only the event loop records them."""
+        self.metrics.counter("server_requests", "Requests answered.", function=lambda: self.requests)
+        self.statements = self.metrics.counter("server_statements", "Statements evaluated by successful requests.")
+        self.errors_by_type = self.metrics.counter("server_errors", "Requests that failed, by error type.", "type")
+        self.latency = self.metrics.histogram("server_request_seconds", "Time from reading a request to answering it.")
+
+    async def evaluate(self, code: str) -> dict[str, Any]:
+        """Evaluates a program in the worker pool, within the configured limits."""
+        loop = asyncio.get_running_loop()
+        async with self.pending:
+            try:
+                return await asyncio.wait_for(
+                    loop.run_in_executor(self.executor, evaluate_request, code, self.limits),
+                    self.timeout,
+                )
+            except TimeoutError:
+                return error_response(TimeoutError(f"Evaluation took longer than {self.timeout}s."))
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Answers the requests of one client, in order, until it disconnects."""
+        try:
+            while (request := await read_frame(reader, self.max_request_size)) is not None:
+                start = time.perf_counter()
+                response = await self.evaluate(request.decode())
+                try:
+                    payload = json.dumps(response).encode()
+                except (ValueError, TypeError) as error:
+                    # A value that `json_value` missed; fail the request, not the connection.
+                    response = error_response(error)
+                    payload = json.dumps(response).encode()
+                self.latency.observe(time.perf_counter() - start)
+                self.requests += 1
+                if response["ok"]:
+                    self.statements.value += len(response["values"])
+                else:
+                    self.errors += 1
+                    self.errors_by_type.labels(response["error"]).value += 1
+                write_frame(writer, payload)
+                await writer.drain()
+        except (ValueError, UnicodeDecodeError) as error:
+            self.errors_by_type.labels(type(error).__name__).value += 1
+            write_frame(writer, json.dumps(error_response(error)).encode())
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8765, unix: str | None = None) -> asyncio.Server:
+        """Starts listening on a Unix socket if `unix` is given, or on TCP otherwise."""
+        if unix is not None:
+            return await asyncio.start_unix_server(self.handle_connection, unix)
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    def close(self) -> None:
+        self.executor.shutdown(cancel_futures=True)
+
+
+async def connect(host: str = "127.0.0.1", port: int = 8765, unix: str | None = None) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    if unix is not None:
+        return await asyncio.open_unix_connection(unix)
+    return await asyncio.open_connection(host, port)
+
+
+async def request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, code: str) -> dict[str, Any]:
+    """Sends a program to a server and waits for its response."""
+    write_frame(writer, code.encode())
+    await writer.drain()
+    response = await read_frame(reader, max_size=1 << 31)
+    if response is None:
+        raise ConnectionError("The server closed the connection.")
+    return json.loads(response)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serves program evaluations over a local socket.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="path of a Unix socket to listen on instead of TCP")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--timeout", type=float, default=10.0, help="seconds allowed per request")
+    parser.add_argument("--max-request-size", type=int, default=1 << 20, help="bytes allowed per request")
+    parser.add_argument("--max-pending", type=int, default=256, help="requests allowed in flight")
+    parser.add_argument("--max-instructions", type=int, default=None, help="instructions allowed per request")
+    parser.add_argument("--max-int-bits", type=int, default=DEFAULT_MAX_INT_BITS, help="size allowed for ints built by * and **")
+    parser.add_argument("--metrics-port", type=int, help="serve OpenMetrics over HTTP on this local port")
+    args = parser.parse_args()
+
+    async def main() -> None:
+        limits = Limits(args.max_instructions, args.timeout, args.max_int_bits)
+        server = EvaluationServer(
+            ProcessPoolExecutor(args.workers), args.max_request_size, args.timeout, args.max_pending, limits
+        )
+        listener = await server.start(args.host, args.port, args.unix)
+        if args.metrics_port is not None:
+            serve_metrics(server.metrics, port=args.metrics_port)
+        try:
+            async with listener:
+                await listener.serve_forever()
+        finally:
+            server.close()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,168 @@
+"""Sinks that write the value of each statement to a file as the interpreter produces it.
+
+Any callable that takes a value is a sink: `results.append` collects values
+in a list and a plain function works as a callback. The writers here buffer
+their output, so they never do I/O per statement; close them (or use them as
+context managers) to flush what's left.
+"""
+import csv
+import math
+import struct
+from typing import Any, BinaryIO, Generator, TextIO
+
+FLOAT_TAG = b"d"
+COMPLEX_TAG = b"D"
+INT_TAG = b"q"
+BIG_INT_TAG = b"n"
+
+FLOAT_RECORD = struct.Struct("<cd")
+COMPLEX_RECORD = struct.Struct("<cdd")
+INT_RECORD = struct.Struct("<cq")
+BIG_INT_HEADER = struct.Struct("<cI")
+
+MAX_STR_INT_BITS = 14_000
+"""Ints with at most this many bits have fewer than the 4300 digits `str` is limited to by default."""
+
+
+def format_int(value: int) -> str:
+    """Formats an int in decimal, even past the digit limit of `str`.
+
+    Doesn't change the limit with `sys.set_int_max_str_digits`, which would
+    affect every thread, but formats halves of the digits separately.
+    """
+    if value < 0:
+        return "-" + format_int(-value)
+    if value.bit_length() <= MAX_STR_INT_BITS:
+        return str(value)
+    half = int(value.bit_length() * math.log10(2)) // 2
+    high, low = divmod(value, 10 ** half)
+    return format_int(high) + format_int(low).zfill(half)
+
+
+class BinarySink:
+    """Writes values as tagged little-endian records.
+
+    Floats are written as 8-byte doubles, complex numbers as two of them and
+    ints as 8-byte signed integers, unless they don't fit, in which case
+    they're written as a 4-byte length followed by that many bytes of two's
+    complement. Read them back with `read_binary_results`.
+    """
+    def __init__(self, file: BinaryIO, buffer_size: int = 1 << 16) -> None:
+        self.file = file
+        self.buffer = bytearray()
+        self.buffer_size = buffer_size
+        self.count: int = 0
+        """Number of values written so far."""
+
+    def __call__(self, value: Any) -> None:
+        if type(value) is float:
+            self.buffer += FLOAT_RECORD.pack(FLOAT_TAG, value)
+        elif type(value) is complex:
+            self.buffer += COMPLEX_RECORD.pack(COMPLEX_TAG, value.real, value.imag)
+        elif -(1 << 63) <= value < 1 << 63:
+            self.buffer += INT_RECORD.pack(INT_TAG, value)
+        else:
+            payload = value.to_bytes((value.bit_length() + 8) // 8, "little", signed=True)
+            self.buffer += BIG_INT_HEADER.pack(BIG_INT_TAG, len(payload))
+            self.buffer += payload
+        self.count += 1
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        self.file.write(self.buffer)
+        self.buffer.clear()
+
+    def close(self) -> None:
+        self.flush()
+        self.file.flush()
+
+    def __enter__(self) -> "BinarySink":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+def read_binary_results(file: BinaryIO) -> Generator[int | float | complex, None, None]:
+    """Reads back the values written by a `BinarySink`."""
+    while tag := file.read(1):
+        if tag == FLOAT_TAG:
+            yield struct.unpack("<d", file.read(8))[0]
+        elif tag == COMPLEX_TAG:
+            yield complex(*struct.unpack("<dd", file.read(16)))
+        elif tag == INT_TAG:
+            yield struct.unpack("<q", file.read(8))[0]
+        elif tag == BIG_INT_TAG:
+            (length,) = struct.unpack("<I", file.read(4))
+            yield int.from_bytes(file.read(length), "little", signed=True)
+        else:
+            raise RuntimeError(f"Unknown record tag {tag!r}.")
+
+
+class TextSink:
+    """Writes one value per line, like `print`, but in batches."""
+    def __init__(self, file: TextIO, buffer_lines: int = 4096) -> None:
+        self.file = file
+        self.lines: list[str] = []
+        self.buffer_lines = buffer_lines
+        self.count: int = 0
+        """Number of values written so far."""
+
+    def __call__(self, value: Any) -> None:
+        try:
+            self.lines.append(f"{value}\n")
+        except ValueError:
+            # An int too long for `str`.
+            self.lines.append(f"{format_int(value)}\n")
+        self.count += 1
+        if len(self.lines) >= self.buffer_lines:
+            self.flush()
+
+    def flush(self) -> None:
+        self.file.writelines(self.lines)
+        self.lines.clear()
+
+    def close(self) -> None:
+        self.flush()
+        self.file.flush()
+
+    def __enter__(self) -> "TextSink":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+class CSVSink:
+    """Writes one `index,value` row per statement, with a header row."""
+    def __init__(self, file: TextIO, buffer_rows: int = 4096) -> None:
+        self.file = file
+        self.writer = csv.writer(file)
+        self.writer.writerow(["statement", "value"])
+        self.rows: list[tuple[int, Any]] = []
+        self.buffer_rows = buffer_rows
+        self.count: int = 0
+        """Number of values written so far."""
+
+    def __call__(self, value: Any) -> None:
+        if type(value) is int and value.bit_length() > MAX_STR_INT_BITS:
+            value = format_int(value)
+        self.rows.append((self.count, value))
+        self.count += 1
+        if len(self.rows) >= self.buffer_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        self.writer.writerows(self.rows)
+        self.rows.clear()
+
+    def close(self) -> None:
+        self.flush()
+        self.file.flush()
+
+    def __enter__(self) -> "CSVSink":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
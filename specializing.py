@@ -0,0 +1,139 @@
+"""An interpreter that specializes its operator instructions to the types of their operands.
+
+Like CPython's quickening, each BINOP and UNARYOP starts out adaptive: the
+first time it runs, it looks at its operator and the types of its operands
+and rewrites itself, in the interpreter's method list, into a variant
+specialized for them (int-int, float-float, int-float or float-int for
+BINOP, int or float for UNARYOP) that applies the operator inline instead
+of calling its `operator` function. Operands of any other type, such as
+complex numbers, keep the generic instruction. Under `Limits.max_int_bits`,
+`*` and `**` aren't specialized for two ints, since only ints can blow up;
+they keep running the guarded generic instruction.
+
+Each specialized instruction checks the types of its operands first. If
+they aren't the ones it was specialized for, it deoptimizes: it rewrites
+itself back into the generic instruction, for good, and runs that.
+Specializations are dropped, and instructions are adaptive again, when
+`reset` loads a new program.
+"""
+from itertools import product
+from types import MethodType
+from typing import Any, Callable
+
+from compiler import Bytecode, BytecodeType
+from interpreter import BINOPS_TO_OPERATOR, UNARYOPS_TO_OPERATOR, PreallocatedInterpreter
+from profiling import instruction_key
+
+BINOP_TEMPLATE = """
+def interpret_BINOP_{name}_{left}_{right}(self, op):
+    stack = self.stack
+    items = stack.items
+    sp = stack.sp - 1
+    left = items[sp - 1]
+    right = items[sp]
+    if type(left) is not {left} or type(right) is not {right}:
+        return self.deoptimize(self.interpret_BINOP_generic, op)
+    items[sp - 1] = left {symbol} right
+    stack.sp = sp
+"""
+
+UNARYOP_TEMPLATE = """
+def interpret_UNARYOP_{name}_{operand}(self, op):
+    items = self.stack.items
+    sp = self.stack.sp - 1
+    operand = items[sp]
+    if type(operand) is not {operand}:
+        return self.deoptimize(self.interpret_UNARYOP_generic, op)
+    items[sp] = {symbol}operand
+"""
+
+BINOP_NAMES = {"+": "add", "-": "sub", "*": "mul", "/": "truediv", "%": "mod", "**": "pow"}
+UNARYOP_NAMES = {"+": "pos", "-": "neg"}
+
+SPECIALIZED_TYPES = (int, float)
+
+
+def build_specializations(
+    bytecode_type: BytecodeType, template: str, names: dict[str, str], operands: int
+) -> dict[tuple[Any, ...], Callable[..., None]]:
+    """Generates an instruction from `template` for each operator and types of operands, keyed by both."""
+    namespace: dict[str, Any] = {}
+    specializations = {}
+    for symbol, name in names.items():
+        for types in product(SPECIALIZED_TYPES, repeat=operands):
+            type_names = dict(zip(["left", "right"] if operands == 2 else ["operand"], (t.__name__ for t in types)))
+            exec(template.format(name=name, symbol=symbol, **type_names), namespace)
+            specializations[(symbol, *types)] = namespace[f"interpret_{bytecode_type.name}_{name}_{'_'.join(type_names.values())}"]
+    return specializations
+
+
+SPECIALIZED_BINOPS = build_specializations(BytecodeType.BINOP, BINOP_TEMPLATE, BINOP_NAMES, 2)
+"""Specialized BINOP instructions, by operator symbol and types of the operands."""
+SPECIALIZED_UNARYOPS = build_specializations(BytecodeType.UNARYOP, UNARYOP_TEMPLATE, UNARYOP_NAMES, 1)
+"""Specialized UNARYOP instructions, by operator symbol and type of the operand."""
+
+BINOP_SYMBOLS = {function: symbol for symbol, function in BINOPS_TO_OPERATOR.items()}
+UNARYOP_SYMBOLS = {function: symbol for symbol, function in UNARYOPS_TO_OPERATOR.items()}
+
+
+class SpecializingInterpreter(PreallocatedInterpreter):
+    """A `PreallocatedInterpreter` whose operator instructions specialize themselves as they first run.
+
+    On CPython 3.12 and 3.13, checking the types of the operands costs more
+    than the `operator` call it saves: repeated runs take about 10% longer
+    than in a `PreallocatedInterpreter`.
+    """
+    def __init__(self, bytecode: list[Bytecode], *args: Any, **kwargs: Any) -> None:
+        self.specializations: int = 0
+        """Number of instructions specialized so far."""
+        self.deoptimizations: int = 0
+        """Number of specialized instructions rewritten back into generic ones so far."""
+        super().__init__(bytecode, *args, **kwargs)
+        self.guarded_binops = {
+            function: symbol
+            for symbol, function in self.operators[BytecodeType.BINOP].items()
+            if function is not BINOPS_TO_OPERATOR[symbol]
+        }
+        """The operators that `Limits` guard, by function, with their symbols."""
+
+    interpret_BINOP_generic = PreallocatedInterpreter.interpret_BINOP
+    interpret_UNARYOP_generic = PreallocatedInterpreter.interpret_UNARYOP
+
+    def rewrite(self, method: Callable[[Any], None], arg: Any) -> None:
+        """Replaces the current instruction with `method`, and runs it.
+
+        When the interpreter is instrumented, the new method is wrapped too, so
+        that the rewritten instruction is still profiled and traced.
+        """
+        if self.profile is not None or self.trace is not None:
+            key = instruction_key(self.bytecode[self.ptr])
+            self.methods[self.ptr] = self.make_instrumented(key, method, self.profile, self.trace)
+        else:
+            self.methods[self.ptr] = method
+        method(arg)
+
+    def specialize(self, specialized: Callable[..., None] | None, generic: Callable[[Any], None], arg: Any) -> None:
+        """Replaces the current instruction with `specialized`, or with `generic` if it's None, and runs it."""
+        if specialized is None:
+            self.rewrite(generic, arg)
+        else:
+            self.specializations += 1
+            self.rewrite(MethodType(specialized, self), arg)
+
+    def deoptimize(self, generic: Callable[[Any], None], arg: Any) -> None:
+        """Called by a specialized instruction whose operands have other types: replaces it with `generic` and runs it."""
+        self.deoptimizations += 1
+        self.rewrite(generic, arg)
+
+    def interpret_BINOP(self, op: Callable[[Any, Any], Any]) -> None:
+        items = self.stack.items
+        sp = self.stack.sp
+        left, right = type(items[sp - 2]), type(items[sp - 1])
+        symbol = BINOP_SYMBOLS.get(op)
+        if symbol is None and (symbol := self.guarded_binops.get(op)) is not None and left is int and right is int:
+            symbol = None
+        self.specialize(SPECIALIZED_BINOPS.get((symbol, left, right)), self.interpret_BINOP_generic, op)
+
+    def interpret_UNARYOP(self, op: Callable[[Any], Any]) -> None:
+        operand = type(self.stack.items[self.stack.sp - 1])
+        self.specialize(SPECIALIZED_UNARYOPS.get((UNARYOP_SYMBOLS.get(op), operand)), self.interpret_UNARYOP_generic, op)
@@ -0,0 +1,242 @@
+"""Evaluates programs one statement at a time, as their source comes in.
+
+The parser pulls tokens from `tokenize_lines` as it needs them and each
+statement is compiled and run as soon as it's parsed, so memory use is
+bounded by the biggest statement rather than by the whole program, and the
+first values come out before the whole input has been read.
+
+Each statement is compiled on its own, so the bytecode offsets in error
+notes count from the start of the statement; the line numbers are those of
+the whole input.
+"""
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Generator, Iterable
+
+from tokenizer import Token, TokenType, tokenize_lines
+from Parser import BinOp, ExprStatement, Parser, TreeNode, UnaryOp
+from compiler import Bytecode, Compiler
+from interpreter import Interpreter, Limits, Sink
+from memo import ResultCache
+
+if TYPE_CHECKING:
+    from metrics import PipelineMetrics
+
+STAGES = ["tokenize", "parse", "compile", "interpret"]
+
+
+@dataclass
+class PipelineStats:
+    """What each stage of the pipeline produced, and how long it took."""
+    statements: int = 0
+    tokens: int = 0
+    nodes: int = 0
+    instructions: int = 0
+    seconds: dict[str, float] = field(default_factory=lambda: dict.fromkeys(STAGES, 0.0))
+
+    def report(self) -> str:
+        counts = [
+            f"{self.statements:,} statements",
+            f"{self.tokens:,} tokens",
+            f"{self.nodes:,} nodes",
+            f"{self.instructions:,} instructions",
+        ]
+        times = [f"{stage} {seconds:.3f}s" for stage, seconds in self.seconds.items()]
+        return ", ".join(counts) + "\n" + ", ".join(times) + f", total {sum(self.seconds.values()):.3f}s"
+
+
+def count_nodes(tree: TreeNode) -> int:
+    count = 0
+    pending = [tree]
+    while pending:
+        node = pending.pop()
+        count += 1
+        match node:
+            case ExprStatement(expr):
+                pending.append(expr)
+            case BinOp(_, left, right):
+                pending += (left, right)
+            case UnaryOp(_, value):
+                pending.append(value)
+    return count
+
+
+def timed_tokens(tokens: Iterable[Token], stats: PipelineStats) -> Generator[Token, None, None]:
+    """Counts tokens, and the time spent producing them, as they're pulled."""
+    clock = time.perf_counter
+    iterator = iter(tokens)
+    while True:
+        start = clock()
+        token = next(iterator, None)
+        stats.seconds["tokenize"] += clock() - start
+        if token is None:
+            return
+        stats.tokens += 1
+        yield token
+
+
+def evaluate_lines(
+    lines: Iterable[str],
+    sink: Sink,
+    line: int = 1,
+    limits: Limits | None = None,
+    interpreter_class: type[Interpreter] = Interpreter,
+    stats: PipelineStats | None = None,
+    cache: ResultCache | None = None,
+    metrics: "PipelineMetrics | None" = None,
+) -> int:
+    """Evaluates the statements in `lines` (which keep their line endings) one by one, as they're read.
+
+    Sends the value of each statement to `sink` and returns the number of statements.
+    `limits` apply to each statement separately. Pass `stats` to have it filled in,
+    `cache` to reuse the values of statements it has seen before and `metrics`
+    to record each statement in them.
+    """
+    if stats is not None:
+        return evaluate_lines_with_stats(lines, sink, stats, line, limits, interpreter_class, cache, metrics)
+    if metrics is not None:
+        return evaluate_lines_with_metrics(lines, sink, metrics, line, limits, interpreter_class, cache)
+
+    interpreter = None
+    statements = 0
+    for statement in Parser(tokenize_lines(lines, line)).parse_statements():
+        compiler = Compiler(statement)
+        bytecode = list(compiler.compile())
+        if interpreter is None:
+            interpreter = interpreter_class(bytecode, compiler.linetable, sink, limits)
+        else:
+            interpreter.reset(bytecode, compiler.linetable, sink)
+        if cache is None:
+            interpreter.interpret()
+        else:
+            cache.run(interpreter)
+        statements += 1
+    return statements
+
+
+def evaluate_lines_with_stats(
+    lines: Iterable[str],
+    sink: Sink,
+    stats: PipelineStats,
+    line: int = 1,
+    limits: Limits | None = None,
+    interpreter_class: type[Interpreter] = Interpreter,
+    cache: ResultCache | None = None,
+    metrics: "PipelineMetrics | None" = None,
+) -> int:
+    """Like `evaluate_lines`, but timing each stage. Kept apart so that runs without stats don't pay for it.
+
+    Tokenizing is timed for every token, which `metrics` alone don't need.
+    """
+    clock = time.perf_counter
+    seconds = stats.seconds
+    interpreter = None
+    start_statements = stats.statements
+    statements = Parser(timed_tokens(tokenize_lines(lines, line), stats)).parse_statements()
+    tokens = stats.tokens
+    bytecode: list[Bytecode] = []
+    try:
+        while True:
+            start, tokenizing, tokens, bytecode = clock(), seconds["tokenize"], stats.tokens, []
+            statement = next(statements, None)
+            parsed = clock()
+            tokenized = seconds["tokenize"] - tokenizing
+            seconds["parse"] += parsed - start - tokenized
+            if statement is None:
+                break
+            stats.nodes += count_nodes(statement)
+            compiler = Compiler(statement)
+            bytecode = list(compiler.compile())
+            compiled = clock()
+            seconds["compile"] += compiled - parsed
+            if interpreter is None:
+                interpreter = interpreter_class(bytecode, compiler.linetable, sink, limits)
+            else:
+                interpreter.reset(bytecode, compiler.linetable, sink)
+            if cache is None:
+                interpreter.interpret()
+            else:
+                cache.run(interpreter)
+            interpreted = clock()
+            seconds["interpret"] += interpreted - compiled
+            stats.instructions += len(bytecode)
+            stats.statements += 1
+            if metrics is not None:
+                metrics.record_statement(
+                    stats.tokens - tokens,
+                    len(bytecode),
+                    (tokenized, parsed - start - tokenized, compiled - parsed, interpreted - compiled),
+                )
+    except Exception as error:
+        if metrics is not None:
+            metrics.record_error(error, stats.tokens - tokens, len(bytecode))
+        raise
+    return stats.statements - start_statements
+
+
+def evaluate_lines_with_metrics(
+    lines: Iterable[str],
+    sink: Sink,
+    metrics: "PipelineMetrics",
+    line: int = 1,
+    limits: Limits | None = None,
+    interpreter_class: type[Interpreter] = Interpreter,
+    cache: ResultCache | None = None,
+) -> int:
+    """Like `evaluate_lines`, but recording each statement in `metrics`.
+
+    Reads the clock once per stage of each statement. The parser pulls all
+    the tokens of a statement before parsing it, so pulling them is timed as
+    tokenizing, without timing each token like `evaluate_lines_with_stats`.
+    """
+    clock = time.perf_counter
+    parser = Parser(tokenize_lines(lines, line))
+    interpreter = None
+    statements = 0
+    EOF = TokenType.EOF
+    while True:
+        # The time of each stage the statement has been through.
+        seconds: list[float] = []
+        bytecode: list[Bytecode] = []
+        try:
+            start = clock()
+            # Like `Parser.parse_statements`.
+            if parser.next_token_index == len(parser.tokens):
+                parser.pull_statement()
+            tokenized = clock()
+            seconds.append(tokenized - start)
+            if parser.peek() == EOF:
+                parser.eat(EOF)
+                return statements
+            statement = parser.parse_statement()
+            parsed = clock()
+            seconds.append(parsed - tokenized)
+            compiler = Compiler(statement)
+            bytecode = list(compiler.compile())
+            compiled = clock()
+            seconds.append(compiled - parsed)
+            if interpreter is None:
+                interpreter = interpreter_class(bytecode, compiler.linetable, sink, limits)
+            else:
+                interpreter.reset(bytecode, compiler.linetable, sink)
+            if cache is None:
+                interpreter.interpret()
+            else:
+                cache.run(interpreter)
+            seconds.append(clock() - compiled)
+        except Exception as error:
+            metrics.record_error(error, len(parser.tokens), len(bytecode), seconds)
+            raise
+        metrics.record_statement(len(parser.tokens), len(bytecode), seconds)
+        statements += 1
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 2:
+        print("Usage: python streaming.py [file]", file=sys.stderr)
+        sys.exit(1)
+
+    with (open(sys.argv[1]) if len(sys.argv) == 2 else sys.stdin) as source:
+        evaluate_lines(source, print)
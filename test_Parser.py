@@ -367,4 +367,13 @@ def test_parsing_multiple_statements():
         # Additional comparisons for specific cases if needed.
 
     # If you want to see the printed AST for debugging purposes, uncomment the following line.
-    # Parser.print_ast(tree)
\ No newline at end of file
+    # Parser.print_ast(tree)
+def test_parsing_statements_from_iterator():
+    code = "1 + 2\n\n-3\n4 ** 5"
+    parser = Parser(Tokenizer(code))
+    statements = []
+    for statement in parser.parse_statements():
+        assert len(parser.tokens) <= 4
+        statements.append(statement)
+    assert Program(statements) == Parser(list(Tokenizer(code))).parse()
+    assert [statement.lineno for statement in statements] == [1, 3, 4]
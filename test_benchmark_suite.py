@@ -0,0 +1,65 @@
+import copy
+
+import pytest
+
+from benchmark_suite import WORKLOADS, compare, format_results, generate_workload, run_suite
+from streaming import STAGES
+
+
+def test_workloads_are_reproducible():
+    for name in WORKLOADS:
+        assert generate_workload(name, scale=0.001, seed=3) == generate_workload(name, scale=0.001, seed=3)
+    assert generate_workload("short_statements", scale=0.001, seed=1) != generate_workload("short_statements", scale=0.001, seed=2)
+    assert generate_workload("short_statements", scale=0.001).count("\n") == 100
+
+
+@pytest.fixture(scope="module")
+def results():
+    return run_suite(scale=0.001, repeat=1, workloads=["short_statements", "floats"], memory=True)
+
+
+def test_run_suite(results):
+    assert list(results["workloads"]) == ["short_statements", "floats"]
+    short = results["workloads"]["short_statements"]
+    assert (short["statements"], short["tokens"], short["instructions"]) == (100, 401, 400)
+    assert all(short[stage] > 0 for stage in STAGES)
+    assert list(short["memory"]) == ["tokenizer", "parser", "compiler", "interpreter"]
+    assert all(measured["peak_bytes"] >= 0 for measured in short["memory"].values())
+
+
+def test_compare_flags_slower_stages(results):
+    baseline = copy.deepcopy(results)
+    slower = copy.deepcopy(results)
+    slower["workloads"]["floats"]["parse"] = baseline["workloads"]["floats"]["parse"] * 1.5
+    slower["workloads"]["floats"]["compile"] = baseline["workloads"]["floats"]["compile"] * 1.05
+    regressions = compare(slower, baseline, tolerance=0.1)
+    assert len(regressions) == 1
+    assert regressions[0].startswith("floats parse: ") and regressions[0].endswith("(+50%)")
+    assert compare(slower, baseline, tolerance=0.6) == []
+
+
+def test_compare_flags_memory_growth(results):
+    baseline = copy.deepcopy(results)
+    bigger = copy.deepcopy(results)
+    bigger["workloads"]["short_statements"]["memory"]["compiler"]["peak_bytes"] *= 2
+    baseline["workloads"]["floats"]["memory"]["interpreter"]["retained_bytes"] = 0
+    bigger["workloads"]["floats"]["memory"]["interpreter"]["retained_bytes"] = 1
+    assert compare(bigger, baseline) == [
+        f"short_statements compiler peak_bytes: {baseline['workloads']['short_statements']['memory']['compiler']['peak_bytes']:,} -> "
+        f"{bigger['workloads']['short_statements']['memory']['compiler']['peak_bytes']:,}"
+    ]
+
+
+def test_compare_skips_workloads_missing_from_baseline(results):
+    baseline = copy.deepcopy(results)
+    del baseline["workloads"]["floats"]
+    slower = copy.deepcopy(results)
+    slower["workloads"]["floats"]["interpret"] *= 10
+    assert compare(slower, baseline) == []
+
+
+def test_format_results(results):
+    lines = format_results(results).splitlines()
+    assert lines[0].split() == ["workload", *STAGES, "instructions"]
+    assert lines[1].startswith("short_statements") and lines[1].endswith("400")
+    assert len(lines) == 3
@@ -0,0 +1,94 @@
+import pytest
+
+from cli import main
+from sinks import read_binary_results
+
+CODE = "1 + 2\n\n2 ** 100\n-1.5 * 2\n"
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "program.txt"
+    path.write_text(CODE)
+    return str(path)
+
+
+@pytest.mark.parametrize("backend", ["interpreter", "preallocated", "verified", "specializing"])
+def test_backends(source, capsys, backend):
+    assert main([source, "--backend", backend]) == 0
+    assert capsys.readouterr().out == f"3\n{2**100}\n-3.0\n"
+
+
+def test_stdin(monkeypatch, capsys):
+    import io
+
+    monkeypatch.setattr("sys.stdin", io.StringIO("6 * 7\n"))
+    assert main([]) == 0
+    assert capsys.readouterr().out == "42\n"
+
+
+def test_huge_int(monkeypatch, capsys):
+    import io
+
+    monkeypatch.setattr("sys.stdin", io.StringIO("10 ** 5000\n"))
+    assert main(["-"]) == 0
+    assert capsys.readouterr().out == "1" + "0" * 5000 + "\n"
+
+
+def test_binary_output_file(source, tmp_path):
+    output = tmp_path / "values.bin"
+    assert main([source, "--format", "binary", "-o", str(output)]) == 0
+    with open(output, "rb") as file:
+        assert list(read_binary_results(file)) == [3, 2**100, -3.0]
+
+
+def test_stats(source, capsys):
+    assert main([source, "--stats"]) == 0
+    assert "3 statements, 14 tokens, 13 nodes, 13 instructions" in capsys.readouterr().err
+
+
+def test_error_stops_with_location(source, tmp_path, capsys):
+    bad = tmp_path / "bad.txt"
+    bad.write_text("7\n1 / 0\n8\n")
+    assert main([source, str(bad)]) == 1
+    captured = capsys.readouterr()
+    assert captured.out == f"3\n{2**100}\n-3.0\n7\n"
+    assert "ZeroDivisionError: division by zero\n  Raised at line 2" in captured.err
+
+
+def test_vectorized(source, capsys):
+    pytest.importorskip("numpy")
+    assert main([source, "--vectorized"]) == 0
+    assert capsys.readouterr().out == f"3\n{2**100}\n-3.0\n"
+
+
+def test_vectorized_instruction_limit(tmp_path, capsys):
+    pytest.importorskip("numpy")
+    path = tmp_path / "program.txt"
+    path.write_text("1 + 2 + 3 + 4\n" * 20)
+    assert main([str(path), "--vectorized", "--max-instructions", "3"]) == 1
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert "InstructionLimitExceeded" in captured.err
+
+
+def test_workers(source, capsys):
+    assert main([source, "--workers", "2", "--stats"]) == 0
+    captured = capsys.readouterr()
+    assert captured.out == f"3\n{2**100}\n-3.0\n"
+    assert "3 statements" in captured.err
+
+
+def test_cache(tmp_path, capsys):
+    path = tmp_path / "program.txt"
+    path.write_text("2 ** 100\n1 + 1\n2 ** 100\n")
+    assert main([str(path), "--cache-entries", "16", "--stats"]) == 0
+    captured = capsys.readouterr()
+    assert captured.out == f"{2**100}\n2\n{2**100}\n"
+    assert "cache: 1 hits, 2 misses" in captured.err
+
+
+def test_metrics(source, tmp_path, capsys):
+    metrics = tmp_path / "metrics.txt"
+    assert main([source, "--metrics", str(metrics)]) == 0
+    assert "pipeline_statements_total 3\n" in metrics.read_text()
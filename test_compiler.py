@@ -1,4 +1,4 @@
-from compiler import Bytecode, BytecodeType, Compiler
+from compiler import Bytecode, BytecodeType, Compiler, LineTable, floats_only, max_stack_depth
 from Parser import BinOp, Int, Float, UnaryOp, ExprStatement,Program
 
 def test_compile_addition():
@@ -175,4 +175,55 @@ def test_compile_program_and_expr_statement():
         Bytecode(BytecodeType.POP),
         Bytecode(BytecodeType.POP),
         Bytecode(BytecodeType.POP),
-    ]
\ No newline at end of file
+    ]
+
+def test_compile_records_statement_lines():
+    tree = Program(
+        [
+            ExprStatement(Int(1), 1),
+            ExprStatement(BinOp("+", Float(3.0), Float(4.0)), 3),
+        ]
+    )
+    compiler = Compiler(tree)
+    bytecode = list(compiler.compile())
+    assert len(bytecode) == 6
+    assert list(compiler.linetable) == [(0, 1), (2, 3)]
+    assert [compiler.linetable.lookup(offset) for offset in range(6)] == [1, 1, 3, 3, 3, 3]
+
+def test_linetable_handles_large_deltas():
+    linetable = LineTable()
+    entries = [(0, 1), (1000, 2), (1001, 700), (1002, 3), (5000, 100_000)]
+    for offset, line in entries:
+        linetable.add(offset, line)
+    assert list(linetable)[-1] == (5000, 100_000)
+    for offset, line in entries:
+        assert linetable.lookup(offset) == line
+    assert linetable.lookup(999) == 1
+    assert linetable.lookup(6000) == 100_000
+
+def test_statement_compiled_alone_starts_its_linetable_at_its_line():
+    compiler = Compiler(ExprStatement(Int(1), 100_000))
+    list(compiler.compile())
+    assert len(compiler.linetable.table) == 2
+    assert compiler.linetable.lookup(0) == 100_000
+
+def test_empty_linetable_has_no_lines():
+    assert LineTable().lookup(0) is None
+
+def test_max_stack_depth():
+    tree = Program(
+        [
+            ExprStatement(BinOp("+", Int(1), BinOp("*", Int(2), UnaryOp("-", Int(3))))),
+            ExprStatement(BinOp("+", Int(1), Int(2))),
+        ]
+    )
+    assert max_stack_depth(Compiler(tree).compile()) == 3
+    assert max_stack_depth([]) == 0
+
+def test_floats_only():
+    def compile_statement(expr):
+        return list(Compiler(Program([ExprStatement(expr)])).compile())
+
+    assert floats_only(compile_statement(BinOp("%", Float(1.0), UnaryOp("-", Float(2.0)))))
+    assert not floats_only(compile_statement(BinOp("+", Float(1.0), Int(2))))
+    assert not floats_only(compile_statement(BinOp("**", Float(-1.0), Float(0.5))))
@@ -0,0 +1,68 @@
+import random
+
+from differential import (
+    BACKENDS,
+    Backend,
+    Outcome,
+    evaluate_with_python,
+    generate_program,
+    run_harness,
+    run_program,
+    same_outcome,
+    same_value,
+)
+
+
+def test_generated_programs_are_deterministic():
+    assert generate_program(random.Random(5)) == generate_program(random.Random(5))
+
+
+def test_every_backend_agrees_with_eval():
+    rng = random.Random(0)
+    programs = [generate_program(rng, statements=10, depth=4) for _ in range(40)]
+    report = run_harness(programs)
+    assert [mismatch.describe() for mismatch in report.mismatches] == []
+    assert set(report.seconds) == {"eval", *BACKENDS}
+    assert report.statements > 0
+
+
+def test_mismatches_are_reported():
+    def off_by_one(code, sink):
+        evaluate_with_python(code, lambda value: sink(value + 1))
+
+    report = run_harness(["1 + 1\n", "1 / 0\n"], {"broken": Backend(off_by_one)})
+    assert [mismatch.describe() for mismatch in report.mismatches] == ["broken: statement 0 gave 3, eval gave 2"]
+
+
+def test_same_value_checks_types():
+    assert same_value(float("nan"), float("nan"))
+    assert not same_value(1, 1.0)
+    assert same_value(complex(0, 1), 1j)
+
+
+def test_batch_backends_may_skip_values_before_errors():
+    expected = run_program(evaluate_with_python, "1\n1 % 0\n")
+    assert expected == Outcome([1], "ZeroDivisionError")
+    assert same_outcome(expected, Outcome([], "ZeroDivisionError"), values_before_errors=False)
+    assert not same_outcome(expected, Outcome([], "ZeroDivisionError"))
+
+
+def test_every_backend_agrees_on_overflow_and_huge_ints():
+    programs = [
+        "9" * 400 + ".\n-" + "9" * 400 + ". * 0\n",
+        "2 ** 20000 - 1\n(-7) ** 15001 % 10\n",
+        "1.5 ** 2000\n",
+        "2 ** 5000 / 3\n",
+        "10 ** 400 + 0.5\n",
+    ]
+    report = run_harness(programs)
+    assert [mismatch.describe() for mismatch in report.mismatches] == []
+
+
+def test_generated_programs_reach_overflow_and_huge_ints():
+    rng = random.Random(1)
+    outcomes = [run_program(evaluate_with_python, generate_program(rng)) for _ in range(100)]
+    values = [value for outcome in outcomes for value in outcome.values]
+    assert any(value == float("inf") for value in values)
+    assert any(type(value) is int and value.bit_length() > 14_000 for value in values)
+    assert any(outcome.error == "OverflowError" for outcome in outcomes)
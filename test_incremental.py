@@ -0,0 +1,48 @@
+import pytest
+
+from incremental import IncrementalEvaluator, diff_lines
+
+
+def evaluate(evaluator, source):
+    values = []
+    evaluator.evaluate(source, values.append)
+    return values
+
+
+def test_diff_lines():
+    old = ["1\n", "2\n", "3\n", "4\n"]
+    new = ["1\n", "5\n", "3\n", "4\n", "6\n"]
+    assert diff_lines(old, new) == [
+        ("equal", 0, 1, 0, 1),
+        ("replace", 1, 2, 1, 2),
+        ("equal", 2, 4, 2, 4),
+        ("insert", 4, 4, 4, 5),
+    ]
+    assert diff_lines(old, old) == [("equal", 0, 4, 0, 4)]
+
+
+def test_only_changed_statements_are_recomputed():
+    evaluator = IncrementalEvaluator()
+    assert evaluate(evaluator, "1 + 1\n\n2 * 3\n2 ** 10\n") == [2, 6, 1024]
+    assert (evaluator.stats.recomputed, evaluator.stats.reused) == (3, 0)
+
+    assert evaluate(evaluator, "0 - 1\n1 + 1\n\n2 * 4\n2 ** 10\n") == [-1, 2, 8, 1024]
+    assert (evaluator.stats.recomputed, evaluator.stats.reused) == (2, 2)
+
+    assert evaluate(evaluator, "1 + 1\n2 ** 10\n") == [2, 1024]
+    assert (evaluator.stats.recomputed, evaluator.stats.reused) == (0, 2)
+
+
+def test_errors_are_recomputed_with_their_new_line():
+    evaluator = IncrementalEvaluator()
+    with pytest.raises(ZeroDivisionError) as excinfo:
+        evaluate(evaluator, "1\n1 / 0\n2\n")
+    assert excinfo.value.__notes__[0].startswith("Raised at line 2,")
+    assert evaluator.stats.recomputed == 1
+
+    with pytest.raises(ZeroDivisionError) as excinfo:
+        evaluate(evaluator, "0\n1\n1 / 0\n2\n")
+    assert excinfo.value.__notes__[0].startswith("Raised at line 3,")
+
+    assert evaluate(evaluator, "0\n1\n1 / 1\n2\n") == [0, 1, 1.0, 2]
+    assert (evaluator.stats.recomputed, evaluator.stats.reused) == (2, 2)
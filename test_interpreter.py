@@ -1,8 +1,18 @@
 from os import name
 from tokenizer import Tokenizer
 from Parser import Parser
-from compiler import Compiler, BytecodeType
-from interpreter import Interpreter
+from compiler import Bytecode, Compiler, BytecodeType
+from interpreter import (
+    FloatInterpreter,
+    InstructionLimitExceeded,
+    IntSizeLimitExceeded,
+    Interpreter,
+    Limits,
+    PreallocatedInterpreter,
+    TimeLimitExceeded,
+)
+
+from testutils import compile_code
 
 import pytest
 
@@ -118,4 +128,209 @@ def test_arithmetic_operator_precedence(code: str, correct_precedence: str) -> N
     ],
 )
 def test_all_arithmetic_operators(code: str, result: int | float) -> None:
-    assert run_computation(code) == result
\ No newline at end of file
+    assert run_computation(code) == result
+
+def test_errors_are_annotated_with_source_line():
+    compiler = Compiler(Parser(list(Tokenizer("1\n\n2\n-3"))).parse())
+    bytecode = list(compiler.compile())
+    bytecode[-2] = Bytecode(BytecodeType.UNARYOP, "~")
+    with pytest.raises(RuntimeError) as excinfo:
+        Interpreter(bytecode, compiler.linetable)
+    assert excinfo.value.__notes__ == ["Raised at line 4, bytecode offset 5."]
+
+def test_runtime_errors_are_annotated_with_source_line():
+    compiler = Compiler(Parser(list(Tokenizer("1\n2 * 3\n\n4 / (2 - 2)\n5"))).parse())
+    interpreter = Interpreter(list(compiler.compile()), compiler.linetable)
+    with pytest.raises(ZeroDivisionError) as excinfo:
+        interpreter.interpret()
+    assert excinfo.value.__notes__ == ["Raised at line 4, bytecode offset 10."]
+
+@pytest.mark.parametrize(
+    ["bytecode", "message"],
+    [
+        ([Bytecode(BytecodeType.BINOP, "//")], "Unknown operator //."),
+        ([Bytecode(BytecodeType.UNARYOP, "*")], "Unknown operator \\*."),
+    ],
+)
+def test_unknown_operators_are_rejected_at_load_time(bytecode: list[Bytecode], message: str):
+    with pytest.raises(RuntimeError, match=message):
+        Interpreter(bytecode)
+
+
+@pytest.mark.parametrize(
+    ["code", "result"],
+    [
+        ("1 + 2 * 3 - 4", 3),
+        ("-(2 ** 10) % 7", 5),
+        ("1\n(2 + (3 * (4 - (5 / 2))))\n3", 3),
+        ("2.5 * 4 + 1", 11.0),
+    ],
+)
+def test_preallocated_interpreter(code: str, result: int | float):
+    bytecode = list(Compiler(Parser(list(Tokenizer(code))).parse()).compile())
+    interpreter = PreallocatedInterpreter(bytecode)
+    interpreter.interpret()
+    assert interpreter.last_value_popped == result
+    assert interpreter.stack.sp == 0
+
+def test_float_interpreter():
+    bytecode = list(Compiler(Parser(list(Tokenizer("1.5 * -2.0 + 7.5 % 2. / .5"))).parse()).compile())
+    interpreter = FloatInterpreter(bytecode)
+    interpreter.interpret()
+    assert interpreter.last_value_popped == 0.0
+    assert type(interpreter.last_value_popped) is float
+
+@pytest.mark.parametrize("code", ["1.5 + 2", "2.0 ** 0.5"])
+def test_float_interpreter_rejects_code_that_may_not_produce_floats(code: str):
+    bytecode = list(Compiler(Parser(list(Tokenizer(code))).parse()).compile())
+    with pytest.raises(RuntimeError):
+        FloatInterpreter(bytecode)
+
+@pytest.mark.parametrize("interpreter_class", [Interpreter, PreallocatedInterpreter])
+def test_every_statement_value_goes_to_the_sink(interpreter_class: type[Interpreter], capsys):
+    bytecode = list(Compiler(Parser(list(Tokenizer("1 + 2\n3 * 4\n-5"))).parse()).compile())
+    results = []
+    interpreter_class(bytecode, sink=results.append).interpret()
+    assert results == [3, 12, -5]
+    assert capsys.readouterr().out == ""
+
+
+@pytest.mark.parametrize("code", ["9 ** 9 ** 9", "(2 ** 999) * (2 ** 999) * 2 ** 100", "-(7 ** 1000)"])
+def test_int_size_limit(code: str):
+    bytecode, linetable = compile_code(code)
+    with pytest.raises(IntSizeLimitExceeded):
+        Interpreter(bytecode, linetable, limits=Limits(max_int_bits=1000)).interpret()
+
+@pytest.mark.parametrize("code", ["2 ** (2 ** 1100)", "2 ** 2 ** 2 ** 2 ** 2 ** 2"])
+def test_int_size_limit_with_huge_exponents(code: str):
+    bytecode, linetable = compile_code(code)
+    with pytest.raises(IntSizeLimitExceeded):
+        Interpreter(bytecode, linetable, limits=Limits(max_int_bits=1 << 24)).interpret()
+
+@pytest.mark.parametrize("code", ["2 ** 998 * 2", "1.5 ** 100 * 2.0 ** 900", "(-1) ** 12345678901", "2 ** -5000"])
+def test_int_size_limit_allows_small_results(code: str):
+    bytecode, linetable = compile_code(code)
+    interpreter = Interpreter(bytecode, linetable, limits=Limits(max_int_bits=1000))
+    interpreter.interpret()
+    assert interpreter.last_value_popped == run_computation(code)
+
+@pytest.mark.parametrize("check_interval", [1, 3, 1024])
+def test_instruction_limit(check_interval: int):
+    bytecode, linetable = compile_code("1\n2\n3\n4")
+    results = []
+    interpreter = Interpreter(
+        bytecode, linetable, sink=results.append, limits=Limits(max_instructions=5, check_interval=check_interval)
+    )
+    with pytest.raises(InstructionLimitExceeded) as excinfo:
+        interpreter.interpret()
+    assert results == [1, 2]
+    assert excinfo.value.__notes__ == ["Raised at line 3, bytecode offset 5."]
+
+def test_instruction_limit_allows_exact_budget():
+    bytecode, linetable = compile_code("1\n2")
+    interpreter = Interpreter(bytecode, linetable, limits=Limits(max_instructions=4))
+    interpreter.interpret()
+    assert interpreter.last_value_popped == 2
+
+def test_time_limit():
+    bytecode, linetable = compile_code("1 + 1\n" * 10_000)
+    with pytest.raises(TimeLimitExceeded):
+        Interpreter(bytecode, linetable, limits=Limits(max_seconds=0, check_interval=10)).interpret()
+
+def test_profile_counts_instructions_and_pairs():
+    from profiling import Profile
+
+    bytecode, linetable = compile_code("1 + 2 * 3\n-4")
+    profile = Profile()
+    for _ in range(2):
+        Interpreter(bytecode, linetable, profile=profile).interpret()
+    assert profile.counts == {"PUSH": 8, "BINOP *": 2, "BINOP +": 2, "UNARYOP -": 2, "POP": 4}
+    assert profile.pairs["PUSH", "PUSH"] == 4
+    assert profile.pairs["POP", "PUSH"] == 3
+    assert set(profile.times) == set(profile.counts)
+    assert "BINOP *" in profile.report()
+    assert set(profile.to_dict()) == {"instructions", "pairs"}
+
+def test_trace_sees_every_instruction_in_order():
+    bytecode, linetable = compile_code("1 + 2\n3")
+    traced = []
+    results = []
+    interpreter = Interpreter(
+        bytecode, linetable, sink=results.append, trace=lambda offset, bc: traced.append((offset, bc))
+    )
+    interpreter.interpret()
+    assert traced == list(enumerate(bytecode))
+    assert results == [3, 3]
+
+def test_instrumentation_works_with_limits():
+    bytecode, linetable = compile_code("1\n2\n3")
+    traced = []
+    interpreter = Interpreter(
+        bytecode, linetable, limits=Limits(max_instructions=3), trace=lambda offset, bc: traced.append(offset)
+    )
+    with pytest.raises(InstructionLimitExceeded):
+        interpreter.interpret()
+    assert traced == [0, 1, 2]
+
+@pytest.mark.parametrize("interpreter_class", [Interpreter, PreallocatedInterpreter, FloatInterpreter])
+def test_reset_runs_new_program(interpreter_class):
+    values = []
+    interpreter = interpreter_class(*compile_code("1.5 + 2.5"), sink=values.append)
+    interpreter.interpret()
+    interpreter.reset(*compile_code("1.0 * 2.0 * (3.0 - 4.0)\n5.0"), sink=values.append)
+    interpreter.interpret()
+    assert values == [4.0, -2.0, 5.0]
+    assert interpreter.last_value_popped == 5.0
+
+def test_reset_runs_same_program_again():
+    values = []
+    interpreter = Interpreter(*compile_code("1\n2"), sink=values.append)
+    interpreter.interpret()
+    interpreter.reset(sink=values.append)
+    interpreter.interpret()
+    assert values == [1, 2, 1, 2]
+
+def test_reset_after_error_clears_stack():
+    interpreter = PreallocatedInterpreter(*compile_code("1 + 2 / 0"))
+    with pytest.raises(ZeroDivisionError):
+        interpreter.interpret()
+    interpreter.reset(*compile_code("3"))
+    interpreter.interpret()
+    assert interpreter.last_value_popped == 3
+    assert interpreter.stack.sp == 0
+
+def test_run_in_slices():
+    bytecode, linetable = compile_code("1 + 2\n3 * 4\n5")
+    values = []
+    interpreter = Interpreter(bytecode, linetable, sink=values.append)
+    assert not interpreter.run(3)
+    assert values == []
+    assert not interpreter.run(5)
+    assert values == [3, 12]
+    assert interpreter.run(100)
+    assert values == [3, 12, 5]
+    assert interpreter.run(1)
+
+def test_instruction_limit_applies_over_all_slices():
+    bytecode, linetable = compile_code("1\n2\n3")
+    interpreter = Interpreter(bytecode, linetable, limits=Limits(max_instructions=5))
+    assert not interpreter.run(2)
+    assert not interpreter.run(2)
+    with pytest.raises(InstructionLimitExceeded):
+        interpreter.run(2)
+    assert interpreter.ptr == 5
+
+def test_run_async_interleaves_programs():
+    import asyncio
+
+    order = []
+    interpreters = [
+        Interpreter(*compile_code("\n".join([str(n)] * 4)), sink=lambda value: order.append(value))
+        for n in (1, 2)
+    ]
+
+    async def main():
+        await asyncio.gather(*(interpreter.run_async(slice_size=2) for interpreter in interpreters))
+
+    asyncio.run(main())
+    assert order == [1, 2, 1, 2, 1, 2, 1, 2]
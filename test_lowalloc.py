@@ -0,0 +1,77 @@
+import gc
+
+import pytest
+
+from compiler import Compiler
+from lowalloc import (
+    AllocationStats,
+    InterningCompiler,
+    compare_modes,
+    evaluate_lines_low_alloc,
+    evaluate_source_low_alloc,
+    gc_control,
+)
+from Parser import Parser
+from tokenizer import Tokenizer
+
+CODE = "1 + 2 * 3\n\n-(4 - 5) ** 2\n7 / 2\n"
+
+
+def test_interning_compiler_shares_instructions():
+    tree = Parser(list(Tokenizer(CODE))).parse()
+    compiler = InterningCompiler(tree)
+    bytecode = list(compiler.compile())
+    assert bytecode == list(Compiler(tree).compile())
+    assert compiler.shared == 9
+    pops = [bc for bc in bytecode if bc.type.name == "POP"]
+    assert all(pop is pops[0] for pop in pops)
+    assert list(compiler.linetable) == [(0, 1), (6, 3), (13, 4)]
+
+
+@pytest.mark.parametrize("threshold", [None, 5000])
+def test_gc_control_restores_the_collector(threshold):
+    thresholds = gc.get_threshold()
+    frozen = gc.get_freeze_count()
+    with gc_control(threshold):
+        assert gc.isenabled() == (threshold is not None)
+        assert gc.get_freeze_count() > 0
+        if threshold is not None:
+            assert gc.get_threshold()[0] == threshold
+    assert gc.isenabled()
+    assert gc.get_threshold() == thresholds
+    assert gc.get_freeze_count() == frozen
+
+
+def test_gc_control_keeps_the_callers_freeze():
+    gc.freeze()
+    try:
+        frozen = gc.get_freeze_count()
+        with gc_control():
+            assert gc.get_freeze_count() == frozen
+        assert gc.get_freeze_count() == frozen
+    finally:
+        gc.unfreeze()
+
+
+def test_evaluate_lines_low_alloc():
+    values = []
+    stats = AllocationStats()
+    assert evaluate_lines_low_alloc(CODE.splitlines(keepends=True), values.append, batch_size=2, stats=stats) == 3
+    assert values == [7, -1, 3.5]
+    assert (stats.statements, stats.tokens, stats.instructions, stats.shared_instructions) == (3, 19, 17, 9)
+    assert stats.objects == 19 + 17 + 8
+    assert stats.collections[0] >= 1
+
+
+def test_errors_restore_the_collector():
+    with pytest.raises(ZeroDivisionError) as excinfo:
+        evaluate_source_low_alloc("1\n2 / 0\n", lambda value: None)
+    assert excinfo.value.__notes__ == ["Raised at line 2, bytecode offset 4."]
+    assert gc.isenabled()
+
+
+def test_compare_modes():
+    results = compare_modes(CODE * 10, batch_size=5)
+    assert list(results) == ["streaming", "streaming, low allocation", "whole", "whole, low allocation"]
+    assert {stats.statements for stats in results.values()} == {30}
+    assert results["whole, low allocation"].objects < results["whole"].objects
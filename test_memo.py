@@ -0,0 +1,85 @@
+import pytest
+
+from interpreter import InstructionLimitExceeded, Interpreter, Limits
+from memo import ResultCache
+from streaming import evaluate_lines
+from testutils import compile_code
+
+
+def run(cache, code, limits=None):
+    values = []
+    interpreter = Interpreter(*compile_code(code), values.append, limits)
+    cache.run(interpreter)
+    return values, interpreter.last_value_popped
+
+
+def test_repeated_programs_are_replayed():
+    cache = ResultCache()
+    assert run(cache, "1 + 2\n2 ** 100\n") == ([3, 2**100], 2**100)
+    assert run(cache, "1 + 2\n2 ** 100\n") == ([3, 2**100], 2**100)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert run(cache, "1.0 + 2\n") == ([3.0], 3.0)
+    assert cache.misses == 2
+
+
+def test_errors_are_replayed_with_their_location():
+    cache = ResultCache()
+    for _ in range(2):
+        values = []
+        interpreter = Interpreter(*compile_code("7\n\n1 / 0\n"), values.append)
+        with pytest.raises(ZeroDivisionError) as excinfo:
+            cache.run(interpreter)
+        assert values == [7]
+        assert excinfo.value.__notes__ == ["Raised at line 3, bytecode offset 4."]
+    assert cache.hits == 1
+
+
+def test_values_are_sent_as_they_are_produced():
+    cache = ResultCache()
+    received = []
+
+    def sink(value):
+        received.append(value)
+        if value == 2:
+            raise OSError("Disk full.")
+
+    interpreter = Interpreter(*compile_code("1\n2\n3\n4 / 0\n"), sink)
+    with pytest.raises(OSError):
+        cache.run(interpreter)
+    assert received == [1, 2]
+    assert interpreter.ptr == 3
+    assert not cache.entries
+    with pytest.raises(ZeroDivisionError):
+        run(cache, "1\n2\n3\n4 / 0\n")
+    assert (cache.hits, cache.misses, len(cache.entries)) == (0, 2, 1)
+
+
+def test_limits_are_part_of_the_key():
+    cache = ResultCache()
+    assert run(cache, "1 + 2 + 3\n") == ([6], 6)
+    with pytest.raises(InstructionLimitExceeded):
+        run(cache, "1 + 2 + 3\n", Limits(max_instructions=3))
+    assert cache.hits == 0
+
+
+def test_eviction_by_entries_and_bytes():
+    cache = ResultCache(max_entries=2)
+    for code in ["1\n", "2\n", "3\n", "1\n"]:
+        run(cache, code)
+    assert (cache.hits, cache.evictions, len(cache.entries)) == (0, 2, 2)
+
+    cache = ResultCache(max_bytes=5000)
+    run(cache, "2 ** 100000\n")
+    assert len(cache.entries) == 0
+    run(cache, "2 ** 1000\n")
+    run(cache, "3 ** 1000\n")
+    assert cache.bytes <= 5000
+    assert cache.stats()["entries"] == len(cache.entries)
+
+
+def test_evaluate_lines_with_cache():
+    cache = ResultCache()
+    values = []
+    assert evaluate_lines(["6 * 7\n", "1 - 2\n", "6 * 7\n"], values.append, cache=cache) == 3
+    assert values == [42, -1, 42]
+    assert cache.hit_rate == pytest.approx(1 / 3)
@@ -0,0 +1,19 @@
+import json
+
+from memory import format_report, measure_pipeline
+
+
+def test_measure_pipeline():
+    report = measure_pipeline("1 + 2 * 3\n-4 ** 2\n" * 200, top=3)
+    stages = report["stages"]
+    assert list(stages) == ["tokenizer", "parser", "compiler", "interpreter"]
+    assert stages["tokenizer"]["items"] == 2200 + 1
+    assert stages["parser"]["items"] == stages["compiler"]["items"] == 2200
+    for stage in ["tokenizer", "parser", "compiler"]:
+        measured = stages[stage]
+        assert measured["peak_bytes"] >= measured["retained_bytes"] > 0
+        assert measured["blocks_per_item"] >= 1
+        assert 0 < len(measured["top_allocations"]) <= 3
+    assert stages["interpreter"]["retained_bytes"] < stages["compiler"]["retained_bytes"]
+    json.dumps(report)
+    assert "tokenizer" in format_report(report)
@@ -0,0 +1,101 @@
+import urllib.request
+
+import pytest
+
+from memo import ResultCache
+from metrics import Metric, MetricsRegistry, PipelineMetrics, serve_metrics, write_metrics
+from streaming import evaluate_lines
+
+
+def test_exposition_format():
+    registry = MetricsRegistry()
+    counter = registry.counter("requests", "Requests.")
+    errors = registry.counter("errors", "Errors by type.", "type")
+    histogram = registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+    registry.gauge("ratio", "A ratio.", lambda: 0.5)
+    counter.inc(3)
+    errors.labels('Bad"Error').inc()
+    for value in [0.05, 0.1, 0.5, 2.0]:
+        histogram.observe(value)
+
+    assert registry.expose() == "\n".join([
+        "# TYPE requests counter",
+        "# HELP requests Requests.",
+        "requests_total 3",
+        "# TYPE errors counter",
+        "# HELP errors Errors by type.",
+        'errors_total{type="Bad\\"Error"} 1',
+        "# TYPE latency_seconds histogram",
+        "# HELP latency_seconds Latency.",
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="1.0"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        "latency_seconds_count 4",
+        "latency_seconds_sum 2.65",
+        "# TYPE ratio gauge",
+        "# HELP ratio A ratio.",
+        "ratio 0.5",
+        "# EOF",
+        "",
+    ])
+
+
+def test_names_are_unique():
+    registry = MetricsRegistry()
+    registry.counter("requests", "Requests.")
+    with pytest.raises(ValueError):
+        registry.gauge("requests", "Requests.", lambda: 0)
+
+
+def test_plain_metrics_have_no_samples():
+    registry = MetricsRegistry()
+    registry.register(Metric("info", "Nothing yet."))
+    assert registry.expose() == "# TYPE info unknown\n# HELP info Nothing yet.\n# EOF\n"
+
+
+def test_pipeline_metrics():
+    metrics = PipelineMetrics()
+    cache = ResultCache()
+    metrics.track_cache(cache)
+    evaluate_lines(["1 + 2\n", "\n", "1 + 2\n"], lambda value: None, cache=cache, metrics=metrics)
+    with pytest.raises(ZeroDivisionError):
+        evaluate_lines(["1 / 0\n"], lambda value: None, metrics=metrics)
+
+    # The statement that raised counts its tokens and instructions, and the time of the stages it finished.
+    assert metrics.statements.value == 2
+    assert metrics.tokens.value == 12
+    assert metrics.instructions.value == 12
+    assert metrics.errors.labels("ZeroDivisionError").value == 1
+    assert [sum(histogram.counts) for histogram in metrics.stages] == [3, 3, 3, 2]
+    exposed = metrics.registry.expose()
+    assert "pipeline_cache_hits_total 1\n" in exposed
+    assert "pipeline_cache_hit_ratio 0.5\n" in exposed
+
+
+def test_metrics_with_stats_match_metrics_alone():
+    from streaming import PipelineStats
+
+    code = ["1 + 2\n", "\n", "-3 * 4.5\n", "2 ** 3"]
+    alone, with_stats = PipelineMetrics(), PipelineMetrics()
+    evaluate_lines(code, lambda value: None, metrics=alone)
+    evaluate_lines(code, lambda value: None, stats=PipelineStats(), metrics=with_stats)
+    for metric in "statements", "tokens", "instructions":
+        assert getattr(alone, metric).value == getattr(with_stats, metric).value
+    assert [sum(histogram.counts) for histogram in alone.stages] == [3, 3, 3, 3]
+
+
+def test_write_and_serve(tmp_path):
+    metrics = PipelineMetrics()
+    evaluate_lines(["6 * 7\n"], lambda value: None, metrics=metrics)
+    path = tmp_path / "metrics.txt"
+    write_metrics(metrics.registry, str(path))
+    assert "pipeline_statements_total 1\n" in path.read_text()
+
+    server = serve_metrics(metrics.registry, port=0)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics") as response:
+            assert response.headers["Content-Type"].startswith("application/openmetrics-text")
+            assert response.read().decode() == metrics.registry.expose()
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,96 @@
+import pytest
+
+from parallel import (
+    evaluate_byte_range,
+    evaluate_file_sharded,
+    evaluate_programs,
+    evaluate_programs_in_threads,
+    evaluate_sharded,
+    shard_boundaries,
+    split_source,
+)
+from interpreter import BINOPS_TO_OPERATOR
+from tokenizer import CHARS_AS_TOKENS, TokenType
+
+
+def test_split_source_keeps_whole_lines():
+    code = "1\n2\n\n3\n4"
+    shards = list(split_source(code, 2))
+    assert shards == [("1\n2\n", 1), ("\n3\n", 3), ("4", 5)]
+    assert "".join(shard for shard, _ in shards) == code
+
+
+def test_evaluate_programs_keeps_input_order():
+    programs = [f"{n} * 2\n{n} ** 30\n{n} / 4" for n in range(20)]
+    assert evaluate_programs(programs, workers=2) == [[n * 2, n**30, n / 4] for n in range(20)]
+
+
+def test_evaluate_programs_propagates_first_error():
+    programs = ["1 + 1", "1 / 0", "2 % 0", "3"]
+    with pytest.raises(ZeroDivisionError) as excinfo:
+        evaluate_programs(programs, workers=2)
+    assert "Raised by program 1." in excinfo.value.__notes__
+
+
+def test_evaluate_programs_in_threads():
+    programs = [f"{n} * 2\n{n} ** 30\n{n} / 4" for n in range(50)]
+    assert evaluate_programs_in_threads(programs, workers=4) == evaluate_programs(programs, workers=2)
+
+
+def test_evaluate_programs_in_threads_propagates_first_error():
+    with pytest.raises(ZeroDivisionError) as excinfo:
+        evaluate_programs_in_threads(["1", "2 % 0", "3 / 0"], workers=2)
+    assert "Raised by program 1." in excinfo.value.__notes__
+
+
+def test_shared_tables_are_read_only():
+    with pytest.raises(TypeError):
+        CHARS_AS_TOKENS["^"] = TokenType.EXP  # type: ignore[index]
+    with pytest.raises(TypeError):
+        BINOPS_TO_OPERATOR["//"] = abs  # type: ignore[index]
+
+
+def test_evaluate_sharded():
+    code = "\n".join(f"{n} - 2 ** 64" for n in range(100))
+    assert evaluate_sharded(code, workers=3, lines_per_shard=7) == [n - 2**64 for n in range(100)]
+
+
+def test_evaluate_sharded_reports_lines_of_whole_file():
+    code = "1\n" * 25 + "1 / 0\n" + "1\n" * 10
+    with pytest.raises(ZeroDivisionError) as excinfo:
+        evaluate_sharded(code, workers=2, lines_per_shard=10)
+    assert any(note.startswith("Raised at line 26,") for note in excinfo.value.__notes__)
+
+
+def test_shard_boundaries_follow_newlines(tmp_path):
+    path = tmp_path / "program.txt"
+    path.write_bytes(b"1 + 2\n\n\n33\n4")
+    assert shard_boundaries(str(path), 1) == [0, 6, 7, 8, 11, 12]
+    assert shard_boundaries(str(path), 7) == [0, 7, 12]
+    assert shard_boundaries(str(path), 100) == [0, 12]
+
+
+@pytest.mark.parametrize("shard_bytes", [1, 5, 13, 64, 1 << 20])
+def test_evaluate_file_sharded_matches_whole_file(tmp_path, shard_bytes):
+    lines = [f"{n} * 3 - 1" if n % 4 else "   " for n in range(60)]
+    path = tmp_path / "program.txt"
+    path.write_text("\n\n" + "\n".join(lines) + "\n\n")
+    expected = [n * 3 - 1 for n in range(60) if n % 4]
+    assert list(evaluate_file_sharded(str(path), workers=2, shard_bytes=shard_bytes)) == expected
+
+
+def test_evaluate_file_sharded_reports_lines_of_whole_file(tmp_path):
+    path = tmp_path / "program.txt"
+    path.write_text("1\n" * 25 + "1 / 0\n" + "1\n" * 10)
+    with pytest.raises(ZeroDivisionError) as excinfo:
+        list(evaluate_file_sharded(str(path), workers=2, shard_bytes=16))
+    assert any(note.startswith("Raised at line 26,") for note in excinfo.value.__notes__)
+    assert "Raised by shard 3, bytes 48 to 64." in excinfo.value.__notes__
+
+
+def test_evaluate_byte_range_shifts_error_lines(tmp_path):
+    path = tmp_path / "program.txt"
+    path.write_text("1\n" * 25 + "1 / 0\n" + "1\n" * 10)
+    with pytest.raises(ZeroDivisionError) as excinfo:
+        evaluate_byte_range(str(path), 48, 64)
+    assert excinfo.value.__notes__ == ["Raised at line 26, bytecode offset 2."]
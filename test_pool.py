@@ -0,0 +1,45 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from interpreter import FloatInterpreter
+from pool import InterpreterPool
+from testutils import compile_code
+
+import pytest
+
+def test_pool_reuses_interpreters():
+    pool = InterpreterPool()
+    values = []
+    assert pool.run(compile_code("1 + 2")[0], sink=values.append) == 3
+    assert pool.run(compile_code("3 * 4\n5")[0], sink=values.append) == 5
+    assert values == [3, 12, 5]
+    assert (pool.created, pool.reused) == (1, 1)
+
+def test_released_interpreters_drop_their_program():
+    pool = InterpreterPool()
+    pool.run(compile_code("1")[0], sink=print)
+    [interpreter] = pool.idle
+    assert interpreter.bytecode == []
+    assert interpreter.sink is None
+
+def test_pool_keeps_at_most_max_idle_interpreters():
+    pool = InterpreterPool(max_idle=1)
+    with pool.interpreter(compile_code("1")[0]), pool.interpreter(compile_code("2")[0]):
+        pass
+    assert len(pool.idle) == 1
+
+def test_rejected_bytecode_returns_interpreter_to_pool():
+    pool = InterpreterPool(FloatInterpreter)
+    pool.run(compile_code("1.0")[0])
+    with pytest.raises(RuntimeError):
+        pool.acquire(compile_code("1")[0])
+    assert len(pool.idle) == 1
+    assert pool.run(compile_code("2.0 * 2.0")[0]) == 4.0
+
+def test_pool_from_many_threads():
+    pool = InterpreterPool()
+    programs = [compile_code(f"{i} * 2\n{i} + 1")[0] for i in range(200)]
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(pool.run, programs))
+    assert results == [i + 1 for i in range(200)]
+    assert pool.created + pool.reused == 200
+    assert pool.created <= 8
@@ -0,0 +1,116 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from server import EvaluationServer, connect, request
+
+
+async def with_server(client, **limits):
+    server = EvaluationServer(ThreadPoolExecutor(2), **limits)
+    listener = await server.start(port=0)
+    port = listener.sockets[0].getsockname()[1]
+    try:
+        reader, writer = await connect(port=port)
+        try:
+            return await client(reader, writer)
+        finally:
+            writer.close()
+    finally:
+        listener.close()
+        await listener.wait_closed()
+        server.close()
+
+
+def test_server_evaluates_programs():
+    async def client(reader, writer):
+        return [
+            await request(reader, writer, "1 + 2\n2 ** 100\n1 / 4"),
+            await request(reader, writer, "-3"),
+        ]
+
+    assert asyncio.run(with_server(client)) == [
+        {"ok": True, "values": [3, 2**100, 0.25]},
+        {"ok": True, "values": [-3]},
+    ]
+
+
+def test_server_sends_huge_ints_and_complex_numbers_as_strings():
+    async def client(reader, writer):
+        return [
+            await request(reader, writer, "10 ** 5000\n(-1) ** 0.5"),
+            await request(reader, writer, "1"),
+        ]
+
+    huge, following = asyncio.run(with_server(client))
+    assert huge["ok"] is True
+    assert huge["values"][0] == "1" + "0" * 5000
+    assert complex(huge["values"][1]) == (-1) ** 0.5
+    assert following == {"ok": True, "values": [1]}
+
+
+def test_server_limits_int_size_by_default():
+    async def client(reader, writer):
+        return await request(reader, writer, "2 ** 2 ** 30")
+
+    response = asyncio.run(with_server(client))
+    assert response["error"] == "IntSizeLimitExceeded"
+
+
+def test_server_reports_errors():
+    async def client(reader, writer):
+        return await request(reader, writer, "1\n1 / 0")
+
+    response = asyncio.run(with_server(client))
+    assert response["ok"] is False
+    assert response["error"] == "ZeroDivisionError"
+    assert response["notes"] == ["Raised at line 2, bytecode offset 4."]
+
+
+def test_server_rejects_big_requests():
+    async def client(reader, writer):
+        response = await request(reader, writer, "1 + 1\n" * 100)
+        return response, await reader.read()
+
+    response, rest = asyncio.run(with_server(client, max_request_size=64))
+    assert response["ok"] is False
+    assert response["error"] == "ValueError"
+    assert rest == b""
+
+
+def test_unix_socket(tmp_path):
+    async def main():
+        server = EvaluationServer(ThreadPoolExecutor(1))
+        path = str(tmp_path / "eval.sock")
+        listener = await server.start(unix=path)
+        try:
+            reader, writer = await connect(unix=path)
+            response = await request(reader, writer, "6 * 7")
+            writer.close()
+            return response
+        finally:
+            listener.close()
+            await listener.wait_closed()
+            server.close()
+
+    assert asyncio.run(main()) == {"ok": True, "values": [42]}
+
+
+def test_server_metrics():
+    async def main():
+        server = EvaluationServer(ThreadPoolExecutor(1))
+        listener = await server.start(port=0)
+        try:
+            reader, writer = await connect(port=listener.sockets[0].getsockname()[1])
+            await request(reader, writer, "1\n2\n")
+            await request(reader, writer, "1 / 0")
+            writer.close()
+        finally:
+            listener.close()
+            await listener.wait_closed()
+            server.close()
+        return server.metrics.expose()
+
+    exposed = asyncio.run(main())
+    assert "server_requests_total 2\n" in exposed
+    assert "server_statements_total 2\n" in exposed
+    assert 'server_errors_total{type="ZeroDivisionError"} 1\n' in exposed
+    assert "server_request_seconds_count 2\n" in exposed
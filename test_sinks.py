@@ -0,0 +1,93 @@
+import csv
+import io
+
+from tokenizer import Tokenizer
+from Parser import Parser
+from compiler import Compiler
+from interpreter import Interpreter
+from sinks import BinarySink, CSVSink, TextSink, format_int, read_binary_results
+
+import pytest
+
+CODE = "1 + 2\n2 ** 100\n-(2 ** 70)\n1 / 4\n-3"
+VALUES = [3, 2**100, -(2**70), 0.25, -3]
+
+
+def run_into(sink) -> None:
+    bytecode = list(Compiler(Parser(list(Tokenizer(CODE))).parse()).compile())
+    Interpreter(bytecode, sink=sink).interpret()
+
+
+def test_list_sink():
+    results = []
+    run_into(results.append)
+    assert results == VALUES
+
+
+def test_binary_sink_round_trip():
+    file = io.BytesIO()
+    with BinarySink(file, buffer_size=8) as sink:
+        run_into(sink)
+    assert sink.count == len(VALUES)
+    file.seek(0)
+    values = list(read_binary_results(file))
+    assert values == VALUES
+    assert [type(value) for value in values] == [type(value) for value in VALUES]
+
+
+def test_binary_sink_round_trips_complex_numbers_and_special_floats():
+    values = [(-1) ** 0.5, complex(float("inf"), -0.0), float("inf"), -0.0, 2**64, -(2**63)]
+    file = io.BytesIO()
+    with BinarySink(file) as sink:
+        for value in values:
+            sink(value)
+    file.seek(0)
+    read = list(read_binary_results(file))
+    assert read == values
+    assert [type(value) for value in read] == [type(value) for value in values]
+    assert str(read[1].imag) == "-0.0"
+
+
+def test_csv_sink():
+    file = io.StringIO()
+    with CSVSink(file, buffer_rows=2) as sink:
+        run_into(sink)
+    rows = list(csv.reader(io.StringIO(file.getvalue())))
+    assert rows == [["statement", "value"]] + [[str(i), str(value)] for i, value in enumerate(VALUES)]
+
+
+def test_text_sink_writes_in_batches():
+    file = io.StringIO()
+    sink = TextSink(file, buffer_lines=2)
+    run_into(sink)
+    assert file.getvalue().count("\n") == 4
+    sink.close()
+    assert file.getvalue() == "".join(f"{value}\n" for value in VALUES)
+    assert sink.count == len(VALUES)
+
+
+@pytest.mark.parametrize(
+    "value",
+    [0, -7, 10**4299, 10**5000, -(3**20_000), 2**100_000 - 1],
+    ids=["zero", "negative", "just under the limit", "power of ten", "negative power", "ones"],
+)
+def test_format_int_past_str_digit_limit(value):
+    import sys
+
+    limit = sys.get_int_max_str_digits()
+    sys.set_int_max_str_digits(0)
+    try:
+        expected = str(value)
+    finally:
+        sys.set_int_max_str_digits(limit)
+    assert format_int(value) == expected
+
+
+def test_text_and_csv_sinks_write_huge_ints():
+    text, table = io.StringIO(), io.StringIO()
+    with TextSink(text) as text_sink, CSVSink(table) as csv_sink:
+        for sink in text_sink, csv_sink:
+            sink(10**5000)
+            sink(-1)
+    assert text.getvalue() == "1" + "0" * 5000 + "\n-1\n"
+    assert list(csv.reader(io.StringIO(table.getvalue())))[1:] == [["0", "1" + "0" * 5000], ["1", "-1"]]
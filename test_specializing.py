@@ -0,0 +1,117 @@
+from interpreter import IntSizeLimitExceeded, Interpreter, Limits
+from profiling import Profile
+from specializing import SpecializingInterpreter
+from testutils import compile_code
+
+import pytest
+
+def run(interpreter_class, code, **kwargs):
+    values = []
+    interpreter_class(*compile_code(code), sink=values.append, **kwargs).interpret()
+    return values
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        "1 + 2 * 3 - 4 / 5 % 6 ** 2",
+        "1.5 + 2.5 * 3.5 - 4.5 / 5.5 % 6.5",
+        "1 + 2.5\n3.5 ** 2 - -4\n+7 % 2.5",
+        "2 ** -1\n-(2 ** 3)",
+        "(-8) ** 0.5 * 2\n-((-1) ** 0.5)",
+    ],
+)
+def test_specialized_results_match_interpreter(code):
+    values = run(SpecializingInterpreter, code)
+    expected = run(Interpreter, code)
+    assert values == expected
+    assert list(map(type, values)) == list(map(type, expected))
+
+def test_instructions_stay_specialized_across_runs():
+    bytecode, linetable = compile_code("1.5 * 2 + -3")
+    values = []
+    interpreter = SpecializingInterpreter(bytecode, linetable, sink=values.append)
+    interpreter.interpret()
+    assert interpreter.specializations == 3
+    interpreter.reset(sink=values.append)
+    interpreter.interpret()
+    assert interpreter.specializations == 3
+    assert values == [0.0, 0.0]
+
+def test_loading_new_program_specializes_again():
+    interpreter = SpecializingInterpreter(*compile_code("1 + 2"))
+    interpreter.interpret()
+    interpreter.reset(*compile_code("3 - 4"))
+    interpreter.interpret()
+    assert interpreter.last_value_popped == -1
+    assert interpreter.specializations == 2
+
+def test_guarded_operators_only_specialize_for_floats():
+    limits = Limits(max_int_bits=100)
+    bytecode, linetable = compile_code("2.0 ** 500\n2 ** 50\n2 * 3.0")
+    interpreter = SpecializingInterpreter(bytecode, linetable, limits=limits)
+    interpreter.interpret()
+    assert interpreter.specializations == 2
+    with pytest.raises(IntSizeLimitExceeded):
+        run(SpecializingInterpreter, "2 ** 500", limits=limits)
+
+def test_errors_in_specialized_instructions_have_locations():
+    bytecode, linetable = compile_code("1\n2 / 0")
+    interpreter = SpecializingInterpreter(bytecode, linetable)
+    with pytest.raises(ZeroDivisionError) as error:
+        interpreter.interpret()
+    assert error.value.__notes__ == ["Raised at line 2, bytecode offset 4."]
+
+def test_instructions_specialize_to_operand_types():
+    bytecode, linetable = compile_code("1 + 2\n1.5 + 2.5\n1 + 2.5\n1.5 + 2\n-1.5\n(-1) ** 0.5 + 1")
+    interpreter = SpecializingInterpreter(bytecode, linetable)
+    interpreter.interpret()
+    names = [method.__name__ for method in interpreter.methods if "OP_" in method.__name__]
+    assert names == [
+        "interpret_BINOP_add_int_int",
+        "interpret_BINOP_add_float_float",
+        "interpret_BINOP_add_int_float",
+        "interpret_BINOP_add_float_int",
+        "interpret_UNARYOP_neg_float",
+        "interpret_UNARYOP_neg_int",
+        "interpret_BINOP_pow_int_float",
+    ]
+    # Complex numbers keep the generic instruction.
+    assert interpreter.methods[-2].__func__ is SpecializingInterpreter.interpret_BINOP_generic
+
+def test_instructions_deoptimize_when_operand_types_change():
+    bytecode, linetable = compile_code("1 + 2\n-3")
+    values = []
+    interpreter = SpecializingInterpreter(bytecode, linetable, sink=values.append)
+    interpreter.interpret()
+    interpreter.args[0] = 1.5
+    interpreter.args[4] = 3.5
+    interpreter.reset(sink=values.append)
+    interpreter.interpret()
+    assert values == [3, -3, 3.5, -3.5]
+    assert interpreter.deoptimizations == 2
+    assert interpreter.methods[2].__func__ is SpecializingInterpreter.interpret_BINOP_generic
+    interpreter.reset(sink=values.append)
+    interpreter.interpret()
+    assert values[-2:] == [3.5, -3.5]
+    assert interpreter.deoptimizations == 2
+
+def test_guarded_operators_deoptimize_to_the_guarded_instruction():
+    bytecode, linetable = compile_code("2.0 ** 500")
+    interpreter = SpecializingInterpreter(bytecode, linetable, limits=Limits(max_int_bits=100))
+    interpreter.interpret()
+    interpreter.args[0] = 2
+    interpreter.reset()
+    with pytest.raises(IntSizeLimitExceeded):
+        interpreter.interpret()
+
+def test_specialized_instructions_stay_instrumented():
+    bytecode, linetable = compile_code("1.5 * 2 + -3")
+    profile = Profile()
+    traced = []
+    interpreter = SpecializingInterpreter(bytecode, linetable, profile=profile, trace=lambda offset, bc: traced.append(offset))
+    for _ in range(2):
+        interpreter.interpret()
+        interpreter.reset()
+    assert interpreter.specializations == 3
+    assert profile.counts == {"PUSH": 6, "BINOP *": 2, "UNARYOP -": 2, "BINOP +": 2, "POP": 2}
+    assert traced == list(range(len(bytecode))) * 2
@@ -0,0 +1,40 @@
+import io
+
+import pytest
+
+from interpreter import PreallocatedInterpreter
+from streaming import evaluate_lines
+
+
+def test_evaluate_lines():
+    values = []
+    assert evaluate_lines(io.StringIO("1 + 2\n\n2 ** 100\n-1.5 * 2\n"), values.append) == 3
+    assert values == [3, 2**100, -3.0]
+
+
+def test_values_come_out_before_input_is_read():
+    values = []
+    read = []
+
+    def lines():
+        for line in ["1\n", "2\n", "3\n"]:
+            read.append(line)
+            yield line
+            assert len(values) == len(read)
+
+    evaluate_lines(lines(), values.append)
+    assert values == [1, 2, 3]
+
+
+def test_evaluate_lines_with_other_interpreter():
+    values = []
+    evaluate_lines(["1 + 1\n", "2 * 3"], values.append, interpreter_class=PreallocatedInterpreter)
+    assert values == [2, 6]
+
+
+def test_errors_report_line_of_input():
+    values = []
+    with pytest.raises(ZeroDivisionError) as excinfo:
+        evaluate_lines(io.StringIO("1\n\n2 / 0\n3\n"), values.append, line=10)
+    assert values == [1]
+    assert excinfo.value.__notes__ == ["Raised at line 12, bytecode offset 2."]
@@ -0,0 +1,124 @@
+from interpreter import IntSizeLimitExceeded, Interpreter, Limits
+from testutils import compile_code
+from tiered import TieredExecutor, generate_source, program_key, promote
+
+import pytest
+
+def interpret(code):
+    values = []
+    Interpreter(*compile_code(code), sink=values.append).interpret()
+    return values
+
+@pytest.mark.parametrize(
+    "code",
+    ["1 + 2 * 3", "-2 ** 2\n+-3 % 2", "2 ** -1\n(1 - 2) - 3", "1.5 / 3\n2 ** 0.5 * -1", "1\n2.0\n3 - -4"],
+)
+def test_promoted_program_matches_interpreter(code):
+    bytecode, _ = compile_code(code)
+    values = []
+    program = promote(bytecode)
+    assert program is not None
+    program.function(values.append, None)
+    expected = interpret(code)
+    assert values == expected
+    assert list(map(type, values)) == list(map(type, expected))
+
+@pytest.mark.parametrize("code", ["9" * 400 + ".", "-" + "9" * 400 + ".\n1", "2 ** 5000\n10 ** 5000 - 1"])
+def test_promoted_program_binds_constants_without_literals(code):
+    bytecode, _ = compile_code(code)
+    values = []
+    promote(bytecode).function(values.append, None)
+    assert values == interpret(code)
+
+def test_program_key_tells_ints_and_floats_apart():
+    assert program_key(compile_code("1")[0]) != program_key(compile_code("1.0")[0])
+    assert program_key(compile_code("1 + 2")[0]) == program_key(compile_code("1+2")[0])
+
+def test_programs_are_promoted_after_threshold():
+    executor = TieredExecutor(threshold=3)
+    bytecode, linetable = compile_code("1 + 2\n3 * 4")
+    for _ in range(5):
+        values = []
+        assert executor.run(bytecode, linetable, values.append) == 12
+        assert values == [3, 12]
+    assert executor.stats() == {
+        "promotions": 1,
+        "evictions": 0,
+        "promoted": 1,
+        "interpreted_runs": 2,
+        "promoted_runs": 3,
+    }
+
+def test_least_recently_used_program_is_evicted():
+    executor = TieredExecutor(threshold=1, max_promoted=2)
+    programs = [compile_code(code)[0] for code in ["1", "2", "3"]]
+    for bytecode in programs[:2] + programs[:1] + programs[2:]:
+        executor.run(bytecode)
+    assert executor.evictions == 1
+    assert list(executor.promoted) == [program_key(programs[0]), program_key(programs[2])]
+
+def test_promoted_program_raises_like_interpreter():
+    executor = TieredExecutor(threshold=1)
+    bytecode, linetable = compile_code("1\n2\n3 / (1 - 1)")
+    values = []
+    with pytest.raises(ZeroDivisionError) as error:
+        executor.run(bytecode, linetable, values.append)
+    assert executor.promoted_runs == 1
+    assert values == [1, 2]
+    assert error.value.__notes__ == ["Raised at line 3, bytecode offset 8."]
+
+def test_promoted_program_passes_on_sink_errors():
+    executor = TieredExecutor(threshold=1)
+    bytecode, linetable = compile_code("1\n2\n3 / 0")
+    values = []
+
+    def sink(value):
+        values.append(value)
+        if value == 2:
+            raise OSError("Disk full.")
+
+    with pytest.raises(OSError) as error:
+        executor.run(bytecode, linetable, sink)
+    assert values == [1, 2]
+    assert not hasattr(error.value, "__notes__")
+
+def test_promoted_program_enforces_int_size_limit():
+    executor = TieredExecutor(threshold=1, limits=Limits(max_int_bits=100))
+    bytecode, linetable = compile_code("2 ** 50\n2 ** 500")
+    with pytest.raises(IntSizeLimitExceeded):
+        executor.run(bytecode, linetable)
+    assert executor.promoted_runs == 1
+
+def test_programs_over_instruction_limit_stay_interpreted():
+    executor = TieredExecutor(threshold=1, limits=Limits(max_instructions=2))
+    bytecode, _ = compile_code("1 + 2")
+    assert promote(bytecode, executor.limits) is None
+
+def test_deeply_nested_program_stays_interpreted():
+    executor = TieredExecutor(threshold=1)
+    bytecode, _ = compile_code("-" * 300 + "1 + 1")
+    assert executor.run(bytecode) == 2
+    assert executor.stats()["promoted"] == 0
+    assert executor.interpreted_runs == 1
+
+def test_generated_source_has_one_line_per_statement():
+    source, _, statement_offsets = generate_source(compile_code("1 + 2\n3")[0])
+    assert "(1 + 2)" in source
+    assert list(statement_offsets.values()) == [0, 4]
+
+def test_callers_may_pass_their_own_key():
+    executor = TieredExecutor(threshold=2)
+    bytecode, _ = compile_code("6 * 7")
+    assert [executor.run(bytecode, key=b"answer") for _ in range(3)] == [42, 42, 42]
+    assert list(executor.promoted) == [b"answer"]
+
+def test_executor_shared_between_threads():
+    from concurrent.futures import ThreadPoolExecutor
+
+    executor = TieredExecutor(threshold=5)
+    programs = [compile_code(f"{i % 4} + 1")[0] for i in range(200)]
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(executor.run, programs))
+    assert results == [i % 4 + 1 for i in range(200)]
+    assert executor.interpreted_runs + executor.promoted_runs == 200
+    assert executor.promotions == 4
@@ -166,4 +166,26 @@ def test_tokenizer_ignores_extra_newlines(code: str):
         Token(TokenType.INT, 4),
         Token(TokenType.NEWLINE),
         Token(TokenType.EOF),
-    ]
\ No newline at end of file
+    ]
+
+def test_tokenizer_tracks_lines():
+    tokens = list(Tokenizer("1 + 2\n\n\n3\n4"))
+    assert [(token.type, token.line) for token in tokens] == [
+        (TokenType.INT, 1),
+        (TokenType.PLUS, 1),
+        (TokenType.INT, 1),
+        (TokenType.NEWLINE, 1),
+        (TokenType.INT, 4),
+        (TokenType.NEWLINE, 4),
+        (TokenType.INT, 5),
+        (TokenType.EOF, 5),
+    ]
+
+@pytest.mark.parametrize("code", ["1 + 2\n\n  \n3 * .5\n", "1\n2", "\n\n(1)\n", ""])
+def test_tokenize_lines_matches_tokenizer(code):
+    from tokenizer import tokenize_lines
+
+    expected = list(Tokenizer(code))
+    tokens = list(tokenize_lines(code.splitlines(keepends=True)))
+    assert tokens == expected
+    assert [token.line for token in tokens] == [token.line for token in expected]
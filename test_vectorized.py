@@ -0,0 +1,85 @@
+import math
+import random
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from compiler import split_statements
+from testutils import compile_code
+from vectorized import evaluate_batch, evaluate_program, statement_shape
+
+
+def compile_statements(code: str):
+    return list(split_statements(compile_code(code)[0]))
+
+
+def run_scalar(statement):
+    from interpreter import Interpreter
+
+    interpreter = Interpreter(statement)
+    interpreter.interpret()
+    return interpreter.last_value_popped
+
+
+def assert_same_values(actual: list, expected: list):
+    assert len(actual) == len(expected)
+    for a, e in zip(actual, expected):
+        assert type(a) is type(e)
+        assert a == e or (isinstance(a, float) and math.isnan(a) and math.isnan(e))
+
+
+def test_statements_with_different_constants_share_a_shape():
+    statements = compile_statements("1 * 2 + 3 ** 2\n4 * 5 + 6 ** 2\n1.5 * 2 + 3 ** 2")
+    assert statement_shape(statements[0]) == statement_shape(statements[1])
+    assert statement_shape(statements[0]) != statement_shape(statements[2])
+
+
+@pytest.mark.parametrize(
+    "template",
+    [
+        "{a} * {b} + {c} ** 2",
+        "-{a} % {b} - {c} / {b}",
+        "({a} + {b}) ** {c}",
+        "{a}.5 ** {c} - {b}. * {a}",
+        "{a}.25 % -{b}. / ({c} + 1.5) - {c}. % 0.3",
+        "(-{a}.5) ** ({c}.5)",
+    ],
+)
+def test_vectorized_results_match_scalar_interpreter(template: str):
+    rng = random.Random(template)
+    lines = [
+        template.format(a=rng.randint(0, 40), b=rng.randint(1, 9) * rng.choice([1, 10**9]), c=rng.randint(0, 30))
+        for _ in range(200)
+    ]
+    statements = compile_statements("\n".join(lines))
+    assert_same_values(evaluate_batch(statements, min_group_size=1), [run_scalar(s) for s in statements])
+
+
+def test_big_ints_fall_back_to_scalar_interpreter():
+    code = "\n".join(["2 ** 70 + 1", "12345678901234567890123 * 3", "3 ** 40 * 3 ** 40", "2 ** -1"] * 5)
+    statements = compile_statements(code)
+    assert evaluate_batch(statements, min_group_size=1) == [2**70 + 1, 12345678901234567890123 * 3, 3**80, 0.5] * 5
+
+
+def test_first_error_is_propagated():
+    code = "\n".join(f"{n} / ({n} - 5)" for n in range(10))
+    statements = compile_statements(code)
+    with pytest.raises(ZeroDivisionError) as excinfo:
+        evaluate_batch(statements, min_group_size=1)
+    assert excinfo.value.__notes__[-1] == "Raised by statement 5."
+
+
+def test_instruction_limit_applies_to_vectorized_statements():
+    from interpreter import InstructionLimitExceeded, Limits
+
+    statements = compile_statements("\n".join(["1 + 2 + 3 + 4"] * 20))
+    assert evaluate_batch(statements, min_group_size=1, limits=Limits(max_instructions=8)) == [10] * 20
+    with pytest.raises(InstructionLimitExceeded) as excinfo:
+        evaluate_batch(statements, min_group_size=1, limits=Limits(max_instructions=3))
+    assert excinfo.value.__notes__[-1] == "Raised by statement 0."
+
+
+def test_evaluate_program():
+    bytecode, _ = compile_code("1 + 2\n3 * 4\n5 - 6")
+    assert evaluate_program(bytecode) == [3, 12, -1]
@@ -0,0 +1,64 @@
+from compiler import Bytecode, BytecodeType, max_stack_depth
+from interpreter import InstructionLimitExceeded, Limits
+from testutils import compile_code
+from verifier import VerificationError, VerifiedInterpreter, verify
+
+import pytest
+
+@pytest.mark.parametrize("code", ["1", "1 + 2 * 3", "-(1 - 2) ** 3\n4 % 5\n6.0 / 7"])
+def test_verify_returns_max_stack_depth(code):
+    bytecode, _ = compile_code(code)
+    assert verify(bytecode) == max_stack_depth(bytecode)
+
+@pytest.mark.parametrize(
+    ["bytecode", "message"],
+    [
+        ([Bytecode(BytecodeType.PUSH, 1), Bytecode(BytecodeType.BINOP, "//")], "Unknown operator //"),
+        ([Bytecode(BytecodeType.PUSH, 1), Bytecode(BytecodeType.UNARYOP, "*")], "Unknown operator \\*"),
+        ([Bytecode("JUMP", 1)], "Unknown instruction"),
+        ([Bytecode(BytecodeType.PUSH, 1), Bytecode(BytecodeType.BINOP, "+")], "offset 1 would pop from an empty stack"),
+        ([Bytecode(BytecodeType.POP)], "offset 0 would pop from an empty stack"),
+        ([Bytecode(BytecodeType.PUSH, 1)] * 2 + [Bytecode(BytecodeType.POP)], "leaves 1 values on the stack"),
+        ([Bytecode(BytecodeType.PUSH, 1)], "doesn't end with a POP"),
+    ],
+)
+def test_verify_rejects_malformed_bytecode(bytecode, message):
+    with pytest.raises(VerificationError, match=message):
+        verify(bytecode)
+
+def test_verified_interpreter_refuses_unverified_bytecode():
+    with pytest.raises(VerificationError):
+        VerifiedInterpreter([Bytecode(BytecodeType.BINOP, "+"), Bytecode(BytecodeType.POP)])
+
+def test_verified_interpreter():
+    bytecode, linetable = compile_code("1 + 2\n-3.5 * 2\n2 ** 10")
+    values = []
+    interpreter = VerifiedInterpreter(bytecode, linetable, sink=values.append)
+    interpreter.interpret()
+    assert values == [3, -7.0, 1024]
+    assert interpreter.ptr == len(bytecode)
+
+def test_verified_interpreter_reports_error_location():
+    bytecode, linetable = compile_code("1\n2 / 0")
+    interpreter = VerifiedInterpreter(bytecode, linetable)
+    with pytest.raises(ZeroDivisionError) as error:
+        interpreter.interpret()
+    assert error.value.__notes__ == ["Raised at line 2, bytecode offset 4."]
+    assert interpreter.ptr == 4
+
+def test_verified_interpreter_with_limits():
+    bytecode, linetable = compile_code("1 + 2\n3 * 4")
+    values = []
+    VerifiedInterpreter(bytecode, linetable, sink=values.append, limits=Limits(max_instructions=100)).interpret()
+    assert values == [3, 12]
+
+    interpreter = VerifiedInterpreter(bytecode, linetable, limits=Limits(max_instructions=5))
+    with pytest.raises(InstructionLimitExceeded):
+        interpreter.interpret()
+    assert interpreter.ptr == 5
+
+def test_verified_interpreter_traces_every_offset():
+    bytecode, linetable = compile_code("1+2\n3")
+    traced = []
+    VerifiedInterpreter(bytecode, linetable, trace=lambda offset, bc: traced.append((offset, bc))).interpret()
+    assert traced == list(enumerate(bytecode))
@@ -0,0 +1,10 @@
+"""Helpers shared by the tests."""
+from tokenizer import Tokenizer
+from Parser import Parser
+from compiler import Bytecode, Compiler, LineTable
+
+
+def compile_code(code: str) -> tuple[list[Bytecode], LineTable]:
+    """Compiles `code` as a whole program, returning its bytecode and line table."""
+    compiler = Compiler(Parser(list(Tokenizer(code))).parse())
+    return list(compiler.compile()), compiler.linetable
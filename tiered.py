@@ -0,0 +1,225 @@
+"""Tiered execution: programs that run often are promoted from the interpreter to generated Python.
+
+A `TieredExecutor` counts how many times it has run each program, keyed by
+a hash of its bytecode. Cold programs run in the plain `Interpreter`; once a
+program has run `threshold` times, it's translated into a Python function
+whose statements are plain Python expressions, and that function is run
+instead. Promoted functions are kept in an LRU cache.
+
+Promoted programs behave like interpreted ones: they send the same values
+to the sink, enforce the same `Limits` and raise the same errors, with the
+same location notes, because a failing statement is re-run in the
+interpreter to report the error. Errors raised by the sink are passed on
+as they are.
+"""
+import hashlib
+import marshal
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from compiler import Bytecode, BytecodeType, LineTable
+from interpreter import BINOPS_TO_OPERATOR, Interpreter, Limits, Sink, TimeLimitExceeded, operator_tables
+
+PROMOTED_FILENAME = "<promoted>"
+
+MAX_INLINE_INT_BITS = 1024
+"""Ints with more bits are bound in the namespace: their `repr` is slow, and raises past 4300 digits."""
+
+
+def program_key(bytecode: list[Bytecode]) -> bytes:
+    """Hashes a program's bytecode; `1` and `1.0` hash differently."""
+    # `_value_` is a plain attribute, unlike the `value` property.
+    description = marshal.dumps([(bc.type._value_, bc.value) for bc in bytecode])
+    return hashlib.blake2b(description, digest_size=16).digest()
+
+
+@dataclass
+class PromotedProgram:
+    function: Callable[[Sink | None, float | None], Any]
+    """Runs the program; takes the sink and the deadline (a `time.monotonic` value) if there's a time limit."""
+    statement_offsets: dict[int, int]
+    """Maps the line of each statement in the generated code to the offset of its first instruction."""
+
+
+def constant_source(value: int | float, namespace: dict[str, Any]) -> str:
+    """Returns the source of a constant, or binds it in `namespace` if it has no literal, like `inf`, or a huge one."""
+    if type(value) is float and not math.isfinite(value) or type(value) is int and value.bit_length() > MAX_INLINE_INT_BITS:
+        name = f"const_{len(namespace)}"
+        namespace[name] = value
+        return name
+    return repr(value) if value >= 0 else f"({value!r})"
+
+
+def generate_source(bytecode: list[Bytecode], limits: Limits | None = None) -> tuple[str, dict[str, Any], dict[int, int]]:
+    """Translates a program to the source of a Python function `program(sink, deadline)`.
+
+    Returns the source, the globals it needs and the line of each statement.
+    Raises `ValueError` if the program can't be translated.
+    """
+    binops = operator_tables(limits)[BytecodeType.BINOP]
+    namespace: dict[str, Any] = {"clock": time.monotonic, "TimeLimitExceeded": TimeLimitExceeded}
+    lines = ["def program(sink, deadline):", "    last = None"]
+    statement_offsets: dict[int, int] = {}
+    stack: list[str] = []
+    start = 0
+    for offset, bc in enumerate(bytecode):
+        match bc.type, bc.value:
+            case BytecodeType.PUSH, int() | float() as value if type(value) in {int, float}:
+                stack.append(constant_source(value, namespace))
+            case BytecodeType.UNARYOP, "+" | "-" as op:
+                stack.append(f"({op}{stack.pop()})")
+            case BytecodeType.BINOP, op if op in BINOPS_TO_OPERATOR:
+                right, left = stack.pop(), stack.pop()
+                if binops[op] is BINOPS_TO_OPERATOR[op]:
+                    stack.append(f"({left} {op} {right})")
+                else:
+                    # A guarded operator, from `Limits.max_int_bits`.
+                    name = f"binop_{len(namespace)}"
+                    namespace[name] = binops[op]
+                    stack.append(f"{name}({left}, {right})")
+            case BytecodeType.POP, _:
+                if limits is not None and limits.max_seconds is not None:
+                    lines.append("    if clock() > deadline:")
+                    lines.append(f"        raise TimeLimitExceeded('Ran for longer than {limits.max_seconds}s.')")
+                statement_offsets[len(lines) + 1] = start
+                lines.append(f"    last = {stack.pop()}; sink is None or sink(last)")
+                start = offset + 1
+            case _:
+                raise ValueError(f"Can't translate {bc}.")
+    if stack or start != len(bytecode):
+        raise ValueError("The program doesn't end with a complete statement.")
+    lines.append("    return last")
+    return "\n".join(lines) + "\n", namespace, statement_offsets
+
+
+def promote(bytecode: list[Bytecode], limits: Limits | None = None) -> PromotedProgram | None:
+    """Builds the fast version of a program, or returns None if it can't be built."""
+    if limits is not None and limits.max_instructions is not None and len(bytecode) > limits.max_instructions:
+        # Let the interpreter run the program up to its limit, and raise.
+        return None
+    try:
+        source, namespace, statement_offsets = generate_source(bytecode, limits)
+        exec(compile(source, PROMOTED_FILENAME, "exec"), namespace)
+    except (ValueError, IndexError, SyntaxError, RecursionError, MemoryError):
+        # Not a well-formed program, or nested too deeply for Python's parser.
+        return None
+    return PromotedProgram(namespace["program"], statement_offsets)
+
+
+def failing_line(error: BaseException) -> int | None:
+    """Returns the line of the generated code that raised `error`."""
+    line = None
+    traceback = error.__traceback__
+    while traceback is not None:
+        if traceback.tb_frame.f_code.co_filename == PROMOTED_FILENAME:
+            line = traceback.tb_lineno
+        traceback = traceback.tb_next
+    return line
+
+
+class TieredExecutor:
+    def __init__(
+        self,
+        threshold: int = 100,
+        max_promoted: int = 256,
+        limits: Limits | None = None,
+        max_tracked: int = 1 << 16,
+    ) -> None:
+        self.threshold = threshold
+        """Number of runs after which a program is promoted."""
+        self.max_promoted = max_promoted
+        self.limits = limits
+        self.max_tracked = max_tracked
+        """Number of programs whose runs are counted; the counts are reset when there are more."""
+        self.counts: dict[bytes, int] = {}
+        self.promoted: OrderedDict[bytes, PromotedProgram | None] = OrderedDict()
+        """Promoted programs, least recently used first. None marks programs that can't be promoted."""
+        self.promotions: int = 0
+        self.evictions: int = 0
+        self.interpreted_runs: int = 0
+        self.promoted_runs: int = 0
+        self.lock = threading.Lock()
+        """Guards the counts, the cache and the counters, so that threads can share an executor."""
+
+    def run(
+        self,
+        bytecode: list[Bytecode],
+        linetable: LineTable | None = None,
+        sink: Sink | None = None,
+        key: bytes | None = None,
+    ) -> Any:
+        """Runs a program in the tier it has earned, and returns the value of its last statement.
+
+        Hashing the bytecode takes longer than running a promoted program, so callers
+        that already have a key that identifies the program may pass it instead.
+        """
+        if key is None:
+            key = program_key(bytecode)
+        with self.lock:
+            if key in self.promoted:
+                self.promoted.move_to_end(key)
+                program = self.promoted[key]
+            else:
+                program = self.count_run(key, bytecode)
+            if program is None:
+                self.interpreted_runs += 1
+            else:
+                self.promoted_runs += 1
+        if program is None:
+            interpreter = Interpreter(bytecode, linetable, sink, self.limits)
+            interpreter.interpret()
+            return interpreter.last_value_popped
+        return self.run_promoted(program, bytecode, linetable, sink)
+
+    def count_run(self, key: bytes, bytecode: list[Bytecode]) -> PromotedProgram | None:
+        """Counts a run of a program that isn't promoted, and promotes it if it's hot. Call with the lock held."""
+        count = self.counts.get(key, 0) + 1
+        if count < self.threshold:
+            if len(self.counts) >= self.max_tracked:
+                self.counts.clear()
+            self.counts[key] = count
+            return None
+        self.counts.pop(key, None)
+        program = promote(bytecode, self.limits)
+        self.promotions += program is not None
+        self.promoted[key] = program
+        if len(self.promoted) > self.max_promoted:
+            self.promoted.popitem(last=False)
+            self.evictions += 1
+        return program
+
+    def run_promoted(
+        self,
+        program: PromotedProgram,
+        bytecode: list[Bytecode],
+        linetable: LineTable | None,
+        sink: Sink | None,
+    ) -> Any:
+        limits = self.limits
+        deadline = time.monotonic() + limits.max_seconds if limits is not None and limits.max_seconds is not None else None
+        try:
+            return program.function(sink, deadline)
+        except Exception as error:
+            start = program.statement_offsets.get(failing_line(error))  # type: ignore[arg-type]
+            if start is None or isinstance(error, TimeLimitExceeded):
+                raise
+            # Re-run the failing statement in the interpreter, which raises the same error, with its location.
+            # If the statement runs, the error came from the sink.
+            end = min((offset for offset in program.statement_offsets.values() if offset > start), default=len(bytecode))
+            interpreter = Interpreter(bytecode, linetable, limits=limits)
+            interpreter.ptr = start
+            interpreter.run(end - start)
+            raise
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "promotions": self.promotions,
+            "evictions": self.evictions,
+            "promoted": sum(program is not None for program in self.promoted.values()),
+            "interpreted_runs": self.interpreted_runs,
+            "promoted_runs": self.promoted_runs,
+        }
@@ -1,6 +1,7 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import Enum, auto
-from typing import Any, Generator, Optional
+from types import MappingProxyType
+from typing import Any, Generator, Iterable, Optional
 from string import digits
 
 class TokenType(Enum):
@@ -20,7 +21,7 @@ class TokenType(Enum):
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}.{self.name}"
 
-CHARS_AS_TOKENS = {
+CHARS_AS_TOKENS = MappingProxyType({
     "+": TokenType.PLUS,
     "-": TokenType.MINUS,
     "*": TokenType.MUL,
@@ -31,18 +32,23 @@ CHARS_AS_TOKENS = {
     "**": TokenType.EXP,
     "/n": TokenType.EOF,
     "\n": TokenType.NEWLINE,  # Corrected the typo here
-}
+})
+"""Read-only, so that threads can share it safely."""
 
 @dataclass
 class Token:
     type: TokenType
     value: Any = None
+    line: int = field(default=0, compare=False, repr=False)
+    """1-based source line the token starts on, 0 if unknown."""
 
 class Tokenizer:
-    def __init__(self, code: str)-> None:
+    def __init__(self, code: str, line: int = 1)-> None:
         self.code = code 
         self.ptr: int = 0
         self.beginning_of_line = True
+        self.line: int = line
+        """Current source line; pass `line` when `code` is a piece of a bigger file."""
 
     def peek(self, length: int = 1) -> str:
         """Returns the substring that will be tokenized next."""
@@ -55,14 +61,15 @@ class Tokenizer:
             self.ptr += 1
 
         if self.ptr == len(self.code):
-            return Token(TokenType.EOF)
+            return Token(TokenType.EOF, line=self.line)
 
         char = self.code[self.ptr]
         if char == "\n":
             self.ptr += 1
+            self.line += 1
             if not self.beginning_of_line:
                 self.beginning_of_line = True
-                return Token(TokenType.NEWLINE)
+                return Token(TokenType.NEWLINE, line=self.line - 1)
             else:
                 return self.next_token()
 
@@ -70,15 +77,15 @@ class Tokenizer:
 
         if self.peek(length=2) == "**":
             self.ptr += 2
-            return Token(TokenType.EXP)
+            return Token(TokenType.EXP, line=self.line)
 
         char = self.code[self.ptr]
 
         if char in CHARS_AS_TOKENS:
             self.ptr += 1
-            return Token(CHARS_AS_TOKENS[char])
+            return Token(CHARS_AS_TOKENS[char], line=self.line)
 
-        if char in digits or (char == "." and self.peek(2)[1] in digits):
+        if char in digits or (char == "." and len(self.peek(2)) == 2 and self.peek(2)[1] in digits):
             integer = self.consume_int()
             if self.ptr < len(self.code) and self.code[self.ptr] == ".":
                 self.ptr += 1
@@ -87,41 +94,21 @@ class Tokenizer:
                     float_str = f"{integer}.{decimal}"
                 else:
                     float_str = f"{integer}."
-                return Token(TokenType.FLOAT, float(float_str))
-            return Token(TokenType.INT, int(integer))
+                return Token(TokenType.FLOAT, float(float_str), line=self.line)
+            return Token(TokenType.INT, int(integer), line=self.line)
 
         raise RuntimeError(f"Can't tokenize {char!r}.")
 
-    def consume_decimal(self) -> float:
-        """Reads a decimal part that starts with a . and returns it as a float."""
-        start = self.ptr
+    def consume_decimal(self) -> str:
+        """Reads the digits of a decimal part, after its ".", as a string.
 
-        # Check if there are any digits after the decimal point
-        has_digits = False
+        The digits are kept as a string so that leading zeros (as in `0.005`) survive.
+        """
+        start = self.ptr
         while self.ptr < len(self.code) and self.code[self.ptr] in digits:
-            has_digits = True
             self.ptr += 1
+        return self.code[start:self.ptr]
 
-        # If no digits are found, return 0.0 as the decimal part
-        if not has_digits:
-            return 0.0
-
-        decimal = self.code[start:self.ptr]
-
-        # Handle the case of multiple consecutive dots
-        dot_count = decimal.count(".")
-        if dot_count > 1:
-            raise RuntimeError(f"Invalid float format: {decimal}")
-
-        # Handle the case where the decimal is at the end of the string
-        if decimal.endswith("."):
-            raise RuntimeError(f"Invalid float format: {decimal}")
-
-        return float(decimal)
-
-
-
-        
     def __iter__(self) -> Generator[Token, None, None]:
         while (token := self.next_token()).type != TokenType.EOF:
             yield token
@@ -135,6 +122,21 @@ class Tokenizer:
         return self.code[start:self.ptr]
 
 
+def tokenize_lines(lines: Iterable[str], line: int = 1) -> Generator[Token, None, None]:
+    """Tokenizes code one line at a time, e.g. straight from a file object.
+
+    Lines must keep their line endings. Tokens never span lines, so this
+    yields the same tokens as tokenizing the whole code at once.
+    """
+    for text in lines:
+        tokenizer = Tokenizer(text, line)
+        for token in tokenizer:
+            if token.type == TokenType.EOF:
+                break
+            yield token
+        line = tokenizer.line
+    yield Token(TokenType.EOF, line=line)
+
 
 if __name__ == "__main__":
     code = "1 + .2 + 0.005 + 123.456 - .12 - 73. - 456 - 789"
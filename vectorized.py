@@ -0,0 +1,236 @@
+"""Evaluates many statements at once, running statements of the same shape as NumPy array operations.
+
+Two statements have the same shape when their bytecode only differs in the
+values of their constants (not in the types of those constants). Each group
+of statements with the same shape runs its bytecode once, with every PUSH
+pushing an array that holds that constant for every statement of the group.
+
+Rows that NumPy can't evaluate exactly like Python (ints that may not fit in
+an int64, divisions by zero, complex powers, ...) are flagged and
+re-evaluated one by one by the scalar `Interpreter`.
+
+Requires NumPy.
+"""
+from itertools import accumulate, chain
+from operator import attrgetter
+from typing import Any
+
+import numpy as np
+
+from compiler import Bytecode, BytecodeType
+from interpreter import Interpreter, Limits
+
+INT_LIMIT = 2 ** 62
+"""Ints are only evaluated with NumPy while their magnitude stays below this."""
+EXACT_INT_LIMIT = 2 ** 53
+"""Ints above this can't be converted to float64 exactly."""
+
+type Shape = tuple[Any, ...]
+
+
+def shape_keys(types: list[BytecodeType], values: list[Any]) -> list[Any]:
+    """Returns a key per instruction that identifies it, ignoring the values of constants.
+
+    PUSH keys are the types of the constants, BINOP keys their operators and
+    UNARYOP keys their operators wrapped in a tuple, to tell `-x` from `x - y`.
+    """
+    return [
+        type(value) if bc_type is BytecodeType.PUSH
+        else value if bc_type is not BytecodeType.UNARYOP
+        else ("unary", value)
+        for bc_type, value in zip(types, values)
+    ]
+
+
+def statement_shape(statement: list[Bytecode]) -> Shape:
+    """Returns the bytecode of a statement with its constants replaced by their types."""
+    return tuple(shape_keys([bc.type for bc in statement], [bc.value for bc in statement]))
+
+
+def push_column(values: list[Any], unsafe: np.ndarray) -> np.ndarray:
+    """Builds the array pushed by a PUSH, flagging ints too big for an int64 as unsafe."""
+    if type(values[0]) is float:
+        return np.array(values, dtype=np.float64)
+    too_big = np.array([not -INT_LIMIT < value < INT_LIMIT for value in values])
+    unsafe |= too_big
+    if too_big.any():
+        values = [0 if big else value for value, big in zip(values, too_big.tolist())]
+    return np.array(values, dtype=np.int64)
+
+
+def magnitude(array: np.ndarray) -> np.ndarray:
+    return np.abs(array.astype(np.float64))
+
+
+def float_power(left: np.ndarray, right: np.ndarray, unsafe: np.ndarray) -> np.ndarray:
+    """Raises floats to powers one by one with Python's own `**`.
+
+    NumPy's SIMD `power` doesn't round exactly like the C library's `pow`
+    that Python uses, so it can't be used if results must match. Rows that
+    are already unsafe are skipped.
+    """
+    result = np.full(len(left), np.inf)
+    skip = unsafe.tolist()
+    for index, (base, exponent) in enumerate(zip(left.tolist(), right.tolist())):
+        if not skip[index]:
+            try:
+                result[index] = base ** exponent
+            except OverflowError:
+                pass
+    return result
+
+
+def apply_binop(op: str, left: np.ndarray, right: np.ndarray, unsafe: np.ndarray) -> np.ndarray:
+    """Applies a binary operator to two arrays, flagging the rows Python would compute differently."""
+    ints = left.dtype.kind == "i" and right.dtype.kind == "i"
+    match op:
+        case "+" | "-":
+            if ints:
+                unsafe |= magnitude(left) + magnitude(right) >= INT_LIMIT
+            return left + right if op == "+" else left - right
+        case "*":
+            if ints:
+                unsafe |= magnitude(left) * magnitude(right) >= INT_LIMIT
+            return left * right
+        case "/":
+            unsafe |= right == 0
+            if ints:
+                # Python divides ints exactly, NumPy converts them to floats first.
+                unsafe |= (magnitude(left) > EXACT_INT_LIMIT) | (magnitude(right) > EXACT_INT_LIMIT)
+            return left / right
+        case "%":
+            unsafe |= right == 0
+            if not ints:
+                unsafe |= ~(np.isfinite(left) & np.isfinite(right))
+            return np.remainder(left, right)
+        case "**":
+            if ints:
+                # Negative exponents give floats in Python and are an error in NumPy.
+                unsafe |= (right < 0) | (magnitude(left) ** magnitude(right) >= INT_LIMIT)
+                return np.power(left, np.where(right < 0, 0, right))
+            # Python raises on 0.0 to a negative power, and returns a complex
+            # number for negative bases and fractional exponents.
+            unsafe |= ((left < 0) & (right != np.floor(right))) | ((left == 0) & (right < 0))
+            result = float_power(left, right, unsafe)
+            # Python raises on overflow where NumPy returns inf.
+            unsafe |= ~np.isfinite(result) & np.isfinite(left) & np.isfinite(right)
+            return result
+    raise RuntimeError(f"Unknown operator {op}.")
+
+
+def apply_unaryop(op: str, value: np.ndarray) -> np.ndarray:
+    match op:
+        case "+":
+            return value
+        case "-":
+            return -value
+    raise RuntimeError(f"Unknown operator {op}.")
+
+
+def evaluate_group(bytecode: list[Bytecode], values: list[Any], starts: list[int], length: int) -> tuple[list[Any], list[bool]]:
+    """Evaluates statements of the same shape together.
+
+    `starts` are the offsets where the statements start in `bytecode` (and in
+    `values`, its constants) and `length` is their common length. Returns the
+    value of each statement and whether it was flagged as unsafe, in which
+    case its value must be discarded and the statement re-evaluated.
+    """
+    unsafe = np.zeros(len(starts), dtype=bool)
+    stack: list[np.ndarray] = []
+    result: np.ndarray | None = None
+    first = starts[0]
+    with np.errstate(all="ignore"):
+        for offset, bc in enumerate(bytecode[first : first + length]):
+            match bc.type:
+                case BytecodeType.PUSH:
+                    stack.append(push_column([values[start + offset] for start in starts], unsafe))
+                case BytecodeType.POP:
+                    result = stack.pop()
+                case BytecodeType.BINOP:
+                    right = stack.pop()
+                    stack.append(apply_binop(bc.value, stack.pop(), right, unsafe))
+                case BytecodeType.UNARYOP:
+                    stack.append(apply_unaryop(bc.value, stack.pop()))
+                case _:
+                    raise RuntimeError(f"Can't vectorize {bc.type}.")
+
+    values = result.tolist() if result is not None else [None] * len(starts)
+    return values, unsafe.tolist()
+
+
+def evaluate_statement(statement: list[Bytecode], limits: Limits | None = None) -> Any:
+    """Evaluates a single statement with the scalar interpreter."""
+    interpreter = Interpreter(statement, limits=limits)
+    interpreter.interpret()
+    return interpreter.last_value_popped
+
+
+def evaluate_spans(
+    bytecode: list[Bytecode],
+    ends: list[int],
+    min_group_size: int = 16,
+    limits: Limits | None = None,
+) -> list[Any]:
+    """Evaluates each statement of `bytecode`, the i-th one ending at `ends[i]`, and returns their values.
+
+    Groups with fewer than `min_group_size` statements aren't worth
+    vectorizing and use the scalar interpreter. If any statement raises, the
+    error of the first one that does is propagated. `limits` apply to each
+    statement: the ones longer than `limits.max_instructions` fall back to
+    the scalar interpreter, which raises, and the vectorized ones are
+    otherwise bounded by construction.
+    """
+    types = list(map(attrgetter("type"), bytecode))
+    values = list(map(attrgetter("value"), bytecode))
+    keys = shape_keys(types, values)
+    starts = [0, *ends[:-1]]
+
+    groups: dict[Shape, list[int]] = {}
+    for index, (start, end) in enumerate(zip(starts, ends)):
+        groups.setdefault(tuple(keys[start:end]), []).append(index)
+
+    max_instructions = limits.max_instructions if limits is not None else None
+    results: list[Any] = [None] * len(ends)
+    scalar: list[int] = []
+    for indices in groups.values():
+        group_starts = [starts[index] for index in indices]
+        length = ends[indices[0]] - group_starts[0]
+        if len(indices) < min_group_size or (max_instructions is not None and length > max_instructions):
+            scalar.extend(indices)
+            continue
+        group_values, unsafe = evaluate_group(bytecode, values, group_starts, length)
+        for index, value, is_unsafe in zip(indices, group_values, unsafe):
+            if is_unsafe:
+                scalar.append(index)
+            else:
+                results[index] = value
+
+    for index in sorted(scalar):
+        try:
+            results[index] = evaluate_statement(bytecode[starts[index] : ends[index]], limits)
+        except Exception as error:
+            error.add_note(f"Raised by statement {index}.")
+            raise
+    return results
+
+
+def evaluate_batch(
+    statements: list[list[Bytecode]],
+    min_group_size: int = 16,
+    limits: Limits | None = None,
+) -> list[Any]:
+    """Evaluates the bytecode of each statement, returning their values in order."""
+    bytecode = list(chain.from_iterable(statements))
+    return evaluate_spans(bytecode, list(accumulate(map(len, statements))), min_group_size, limits)
+
+
+def evaluate_program(
+    bytecode: list[Bytecode],
+    min_group_size: int = 16,
+    limits: Limits | None = None,
+) -> list[Any]:
+    """Evaluates the bytecode of a whole program, returning the value of each statement."""
+    ends = [offset + 1 for offset, bc in enumerate(bytecode) if bc.type is BytecodeType.POP]
+    if bytecode and (not ends or ends[-1] != len(bytecode)):
+        ends.append(len(bytecode))
+    return evaluate_spans(bytecode, ends, min_group_size, limits)
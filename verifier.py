@@ -0,0 +1,82 @@
+"""Checks bytecode once, up front, so that it can be run by an interpreter that doesn't check anything.
+
+`verify` proves that a program only uses known instructions and operators,
+never pops from an empty stack and leaves the stack empty after each
+statement. `VerifiedInterpreter` only runs verified programs, and relies on
+that to run them without bounds checks.
+"""
+from compiler import Bytecode, BytecodeType
+from interpreter import BINOPS_TO_OPERATOR, UNARYOPS_TO_OPERATOR, PreallocatedInterpreter, PreallocatedStack
+
+
+class VerificationError(RuntimeError):
+    """Raised for bytecode that can't be run safely."""
+
+
+def verify(bytecode: list[Bytecode]) -> int:
+    """Checks that `bytecode` is a well-formed program and returns its maximum stack depth.
+
+    Raises `VerificationError` for the first faulty instruction.
+    """
+    # Compares types with `is`, because hashing enum members is slow.
+    PUSH, POP, BINOP, UNARYOP = BytecodeType.PUSH, BytecodeType.POP, BytecodeType.BINOP, BytecodeType.UNARYOP
+    depth = max_depth = 0
+    for offset, bc in enumerate(bytecode):
+        bc_type = bc.type
+        if bc_type is PUSH:
+            depth += 1
+            if depth > max_depth:
+                max_depth = depth
+            continue
+        if bc_type is BINOP:
+            if bc.value not in BINOPS_TO_OPERATOR:
+                raise VerificationError(f"Unknown operator {bc.value} at bytecode offset {offset}.")
+            inputs = 2
+        elif bc_type is UNARYOP:
+            if bc.value not in UNARYOPS_TO_OPERATOR:
+                raise VerificationError(f"Unknown operator {bc.value} at bytecode offset {offset}.")
+            inputs = 1
+        elif bc_type is POP:
+            inputs = 1
+        else:
+            raise VerificationError(f"Unknown instruction type {bc_type!r} at bytecode offset {offset}.")
+        if depth < inputs:
+            raise VerificationError(f"{bc} at bytecode offset {offset} would pop from an empty stack.")
+        if bc_type is not UNARYOP:
+            depth -= 1
+        if bc_type is POP and depth:
+            raise VerificationError(f"Statement ending at bytecode offset {offset} leaves {depth} values on the stack.")
+    if depth:
+        raise VerificationError("The last statement doesn't end with a POP.")
+    return max_depth
+
+
+class VerifiedInterpreter(PreallocatedInterpreter):
+    """A `PreallocatedInterpreter` for verified bytecode.
+
+    Its main loop keeps the instruction pointer in a local variable and
+    doesn't check the stack, so it refuses bytecode that `verify` rejects.
+    """
+    def make_stack(self, bytecode: list[Bytecode]) -> PreallocatedStack:
+        return PreallocatedStack(verify(bytecode))
+
+    def clear_stack(self, bytecode: list[Bytecode]) -> None:
+        self.stack.clear(verify(bytecode))
+
+    def interpret(self) -> None:
+        if self.limits is not None:
+            return self.interpret_with_limits(self.limits, len(self.methods))
+        if self.profile is not None or self.trace is not None:
+            # The instrumented instructions read the instruction pointer off the interpreter.
+            return self.interpret_until(len(self.methods))
+
+        methods, args = self.methods, self.args
+        ptr = self.ptr
+        try:
+            for ptr in range(self.ptr, len(methods)):
+                methods[ptr](args[ptr])
+        except Exception as error:
+            self.ptr = ptr
+            self.add_location_note(error, ptr)
+            raise
+        self.ptr = len(methods)